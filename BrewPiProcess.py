@@ -15,20 +15,116 @@
 # along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import errno
+import glob
 import pprint
 import os
+import signal
+import socket
+import stat
 import sys
+import tempfile
+import urllib
 from time import sleep
 
-try:
-    import psutil
-except ImportError:
-    print "BrewPi requires psutil to run, please install it with 'sudo apt-get install python-psutil"
-    sys.exit(1)
+import simplejson as json
 
 import BrewPiSocket
 import BrewPiUtil as util
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows has no flock, instances are not registered there
+
+# Every running BrewPi process holds an flock on a lock file for its config file, for each serial port it uses and
+# for its socket. The lock is released by the kernel when the process exits, also when it crashes, so a lock file that
+# can be locked belongs to a process that is no longer running.
+registryPath = os.path.join(tempfile.gettempdir(), 'brewpi-instances')
+
+conflictMessages = {'cfg': "Conflict: same config file as another BrewPi instance already running.",
+                    'port': "Conflict: same serial port as another BrewPi instance already running.",
+                    'socket': "Conflict: same socket as another BrewPi instance already running."}
+
+
+def lockFileName(kind, value):
+    """
+    Returns the path of the lock file for a config file, serial port or socket
+
+    Params:
+    kind: 'cfg', 'port' or 'socket'
+    value: path of the config file, name of the serial port or address of the socket
+    """
+    return os.path.join(registryPath, kind + '-' + urllib.quote(str(value), safe='') + '.lock')
+
+
+def checkRegistryPath():
+    """
+    Creates the registry directory when it does not exist yet. All users can add lock files to it, like /tmp.
+
+    Returns: True when the registry can be used, False when it is not a directory, or when another user owns it and
+    could replace the lock files in it.
+    """
+    try:
+        os.makedirs(registryPath)
+        os.chmod(registryPath, 01777)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    info = os.lstat(registryPath)
+    if not stat.S_ISDIR(info.st_mode):
+        return False
+    return info.st_uid in (0, os.getuid()) or bool(info.st_mode & stat.S_ISVTX)
+
+
+def openLockFile(fileName, create):
+    """
+    Opens a lock file without following symlinks, so nobody can make this process write to another file through the
+    shared registry directory.
+
+    Params:
+    create: create the file and open it for writing. When the file belongs to another user, it is opened read only,
+    which is enough to lock it.
+
+    Returns: file object
+    """
+    if create:
+        try:
+            fd = os.open(fileName, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0644)
+            return os.fdopen(fd, 'r+')
+        except OSError as e:
+            if e.errno != errno.EACCES:
+                raise
+    fd = os.open(fileName, os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK)
+    return os.fdopen(fd, 'r')
+
+
+def readInfo(lockFile):
+    """
+    Reads the info a BrewPi process wrote in its lock file
+
+    Returns: dict, None when the file is empty or being written
+    """
+    lockFile.seek(0)
+    try:
+        return json.loads(lockFile.read())
+    except ValueError:
+        return None
+
+
+def isLocked(lockFile):
+    """
+    Returns: True when another process holds the lock on lockFile
+    """
+    try:
+        fcntl.flock(lockFile, fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except IOError as e:
+        if e.errno in (errno.EAGAIN, errno.EACCES):
+            return True
+        raise
+    fcntl.flock(lockFile, fcntl.LOCK_UN)
+    return False
+
 
 class BrewPiProcess:
     """
@@ -39,21 +135,128 @@ class BrewPiProcess:
     def __init__(self):
         self.pid = None  # pid of process
         self.cfg = None  # config file of process, full path
-        self.port = None  # serial port the process is connected to
-        self.sock = None  # BrewPiSocket object which the process is connected to
+        self.ports = []  # serial ports the process is connected to, one for each chamber
+        self.sock = None  # dict with the type, file, host and port of the socket the process listens on
+        self.lockFiles = []  # open lock files of this process, while it is registered
+
+    @classmethod
+    def fromConfig(cls, configFile, config, ports):
+        """
+        Creates a BrewPiProcess object for this process
+
+        Params:
+        configFile: full path of the config file
+        config: ConfigObj of the config file
+        ports: list of serial ports the process will use
+        """
+        bp = cls()
+        bp.pid = os.getpid()
+        bp.cfg = configFile
+        bp.ports = list(ports)
+        sock = BrewPiSocket.BrewPiSocket(config)
+        bp.sock = {'type': sock.type, 'file': sock.file, 'host': sock.host, 'port': sock.port}
+        return bp
+
+    @classmethod
+    def fromInfo(cls, info):
+        """
+        Creates a BrewPiProcess object from the info another process wrote in its lock file
+        """
+        bp = cls()
+        bp.pid = info['pid']
+        bp.cfg = info['cfg']
+        bp.ports = info['ports']
+        bp.sock = info['sock']
+        return bp
 
     def as_dict(self):
         """
         Returns: member variables as a dictionary
         """
-        return self.__dict__
+        return {'pid': self.pid, 'cfg': self.cfg, 'ports': self.ports, 'sock': self.sock}
+
+    def socketAddress(self):
+        if self.sock['type'] == 'i':
+            return '%s:%s' % (self.sock['host'], self.sock['port'])
+        return self.sock['file']
+
+    def register(self):
+        """
+        Locks the lock files of the config file, the serial ports and the socket of this process and writes the info
+        of this process in them, so other instances can find it. The locks are kept until the process exits or
+        unregister is called.
+
+        Returns: True when registered, False when another instance of BrewPi holds one of the locks
+        """
+        if fcntl is None:
+            util.logMessage("Warning: file locking is not available on this platform, conflicts with other " +
+                            "instances of BrewPi are not detected")
+            return True
+        if not checkRegistryPath():
+            util.logMessage("Warning: %s is not a directory or is owned by another user, conflicts with other " %
+                            registryPath + "instances of BrewPi are not detected")
+            return True
+        info = json.dumps(self.as_dict())
+        keys = [('cfg', self.cfg)] + [('port', port) for port in self.ports] + [('socket', self.socketAddress())]
+        for kind, value in keys:
+            fileName = lockFileName(kind, value)
+            try:
+                lockFile = openLockFile(fileName, True)
+            except (IOError, OSError) as e:
+                print "Cannot open lock file %s: %s" % (fileName, e)
+                self.unregister()
+                return False
+            try:
+                fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+                other = readInfo(lockFile)
+                print conflictMessages[kind] + (" Its pid is %s." % other['pid'] if other else "")
+                lockFile.close()
+                self.unregister()
+                return False
+            # do not pass the lock on to a new program started with exec, like the script restarting itself
+            flags = fcntl.fcntl(lockFile, fcntl.F_GETFD)
+            fcntl.fcntl(lockFile, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+            if lockFile.mode == 'r+':  # a lock file of another user can only be locked, not written
+                lockFile.truncate(0)
+                lockFile.write(info)
+                lockFile.flush()
+            self.lockFiles.append(lockFile)
+        return True
+
+    def unregister(self):
+        """
+        Releases the locks of this process
+        """
+        for lockFile in self.lockFiles:
+            lockFile.close()
+        self.lockFiles = []
+
+    def connect(self):
+        """
+        Connects to the socket this process registered, the config file could have been changed since it started.
+
+        Returns: the connected socket, None when connecting failed
+        """
+        try:
+            if self.sock['type'] == 'i':
+                conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                conn.connect((self.sock['host'], int(self.sock['port'])))
+            else:
+                conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                conn.connect(self.sock['file'])
+        except socket.error:
+            return None
+        return conn
 
     def quit(self):
         """
         Sends a friendly quit message to this BrewPi process over its socket to aks the process to exit.
         """
         if self.sock is not None:
-            conn = self.sock.connect()
+            conn = self.connect()
             if conn:
                 conn.send('quit')
                 conn.close()  # do not shutdown the socket, other processes are still connected to it.
@@ -66,29 +269,15 @@ class BrewPiProcess:
         """
         Kills this BrewPiProcess with force, use when quit fails.
         """
-        process = psutil.Process(self.pid)  # get psutil process my pid
         try:
-            process.kill()
+            os.kill(self.pid, signal.SIGKILL)
             print "SIGKILL sent to BrewPi instance with pid %d!" % self.pid
-        except psutil.error.AccessDenied:
+        except OSError as e:
+            if e.errno == errno.ESRCH:
+                return  # it has exited already
             print >> sys.stderr, "Cannot kill process %d, you need root permission to do that." % self.pid
             print >> sys.stderr, "Is the process running under the same user?"
 
-    def conflict(self, otherProcess):
-        if self.pid == otherProcess.pid:
-            return 0  # this is me! I don't have a conflict with myself
-        if otherProcess.cfg == self.cfg:
-            print "Conflict: same config file as another BrewPi instance already running."
-            return 1
-        if otherProcess.port == self.port:
-            print "Conflict: same serial port as another BrewPi instance already running."
-            return 1
-        if [otherProcess.sock.type, otherProcess.sock.file, otherProcess.sock.host, otherProcess.sock.port] == \
-                [self.sock.type, self.sock.file, self.sock.host, self.sock.port]:
-            print "Conflict: same socket as another BrewPi instance already running."
-            return 1
-        return 0
-
 
 class BrewPiProcesses():
     """
@@ -99,66 +288,35 @@ class BrewPiProcesses():
 
     def update(self):
         """
-        Update the list of BrewPi processes by receiving them from the system with psutil.
+        Update the list of BrewPi processes from the lock files of their config files. Only lock files that are
+        locked belong to a running process.
         Returns: list of BrewPiProcess objects
         """
         bpList = []
-        matching = [p for p in psutil.process_iter() if any('python' in p.name and 'brewpi.py'in s for s in p.cmdline)]
-        for p in matching:
-            bp = self.parseProcess(p)
-            bpList.append(bp)
+        if fcntl is None:
+            self.list = bpList
+            return self.list
+        for fileName in glob.glob(os.path.join(registryPath, 'cfg-*.lock')):
+            try:
+                lockFile = openLockFile(fileName, False)
+            except (IOError, OSError):
+                continue
+            try:
+                if isLocked(lockFile):
+                    info = readInfo(lockFile)
+                    if info is not None:
+                        bpList.append(BrewPiProcess.fromInfo(info))
+            finally:
+                lockFile.close()
         self.list = bpList
         return self.list
 
-    def parseProcess(self, process):
-        """
-        Converts a psutil process into a BrewPiProcess object by parsing the config file it has been called with.
-        Params: a psutil.Process object
-        Returns: BrewPiProcess object
-        """
-        bp = BrewPiProcess()
-        bp.pid = process._pid
-
-        cfg = [s for s in process.cmdline if '.cfg' in s]  # get config file argument
-        if cfg:
-            cfg = cfg[0]  # add full path to config file
-        bp.cfg = util.readCfgWithDefaults(cfg)
-
-        bp.port = bp.cfg['port']
-        bp.sock = BrewPiSocket.BrewPiSocket(bp.cfg)
-        return bp
-
     def get(self):
         """
         Returns a non-updated list of BrewPiProcess objects
         """
         return self.list
 
-    def me(self):
-        """
-        Get a BrewPiProcess object of the process this function is called from
-        """
-        myPid = os.getpid()
-        myProcess = psutil.Process(myPid)
-        return self.parseProcess(myProcess)
-
-    def findConflicts(self, process):
-        """
-        Finds out if the process given as argument will conflict with other running instances of BrewPi
-
-        Params:
-        process: a BrewPiProcess object that will be compared with other running instances
-
-        Returns:
-        bool: True means there are conflicts, False means no conflict
-        """
-        for p in self.list:
-            if process.pid == p.pid:  # skip the process itself
-                continue
-            elif process.conflict(p):
-                return 1
-        return 0
-
     def as_dict(self):
         """
         Returns the list of BrewPiProcesses as a list of dicts, except for the process calling this function
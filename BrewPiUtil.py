@@ -97,7 +97,14 @@ def removeDontRunFile(path='/var/www/do_not_run_brewpi'):
 	else:
 		print "File do_not_run_brewpi does not exist at "+path
 	
-def setupSerial(config):
+def setupSerial(config, exitOnError=True, useAltPort=True):
+    """
+    Opens the serial port of the config, or the alternative port when that fails
+
+    Params:
+    exitOnError: exit the script when neither port can be opened, otherwise raise the serial.SerialException
+    useAltPort: try altport when port cannot be opened
+    """
     ser = None
     conn = None
     port = config['port']
@@ -106,11 +113,20 @@ def setupSerial(config):
     try:
         ser = serial.Serial(port, 57600, timeout=0.1)  # use non blocking serial.
     except serial.SerialException as e:
+        if not useAltPort:
+            if not exitOnError:
+                logMessage("Error opening serial port: %s." % str(e))
+                raise
+            logMessage("Error opening serial port: %s. Script will exit." % str(e))
+            exit(1)
         logMessage("Error opening serial port: %s. Trying alternative serial port %s." % (str(e), config['altport']))
         try:
             port = config['altport']
             ser = serial.Serial(port, 57600, timeout=0.1)  # use non blocking serial.
         except serial.SerialException as e:
+            if not exitOnError:
+                logMessage("Error opening alternative serial port: %s." % str(e))
+                raise
             logMessage("Error opening alternative serial port: %s. Script will exit." % str(e))
             exit(1)
 
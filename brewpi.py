@@ -27,8 +27,8 @@ import socket
 import os
 import getopt
 from pprint import pprint
-import shutil
-import traceback
+import signal
+from collections import OrderedDict
 
 # load non standard packages, exit when they are not installed
 try:
@@ -49,38 +49,14 @@ except ImportError:
 
 
 #local imports
-import temperatureProfile
-import programArduino as programmer
-import brewpiJson
 import BrewPiUtil as util
-import brewpiVersion
-import pinList
-import expandLogMessage
 import BrewPiProcess
-
-
-# Settings will be read from Arduino, initialize with same defaults as Arduino
-# This is mainly to show what's expected. Will all be overwritten on the first update from the arduino
-
-compatibleHwVersion = "0.2.4"
-
-# Control Settings
-cs = dict(mode='b', beerSet=20.0, fridgeSet=20.0, heatEstimator=0.2, coolEstimator=5)
-
-# Control Constants
-cc = dict(tempFormat="C", tempSetMin=1.0, tempSetMax=30.0, pidMax=10.0, Kp=20.000, Ki=0.600, Kd=-3.000, iMaxErr=0.500,
-          idleRangeH=1.000, idleRangeL=-1.000, heatTargetH=0.301, heatTargetL=-0.199, coolTargetH=0.199,
-          coolTargetL=-0.301, maxHeatTimeForEst="600", maxCoolTimeForEst="1200", fridgeFastFilt="1", fridgeSlowFilt="4",
-          fridgeSlopeFilt="3", beerFastFilt="3", beerSlowFilt="5", beerSlopeFilt="4", lah=0, hs=0)
-
-# Control variables
-cv = dict(beerDiff=0.000, diffIntegral=0.000, beerSlope=0.000, p=0.000, i=0.000, d=0.000, estPeak=0.000,
-          negPeakEst=0.000, posPeakEst=0.000, negPeak=0.000, posPeak=0.000)
-
-# listState = "", "d", "h", "dh" to reflect whether the list is up to date for installed (d) and available (h)
-deviceList = dict(listState="", installed=[], available=[])
-
-lcdText = ['Script starting up', ' ', ' ', ' ']
+import brewpiCompress
+import brewpiEventLoop
+import brewpiSocketServer
+import brewpiChamber
+import brewpiStats
+import brewpiMetrics
 
 
 def logMessage(message):
@@ -99,7 +75,6 @@ configFile = None
 checkDontRunFile = False
 checkStartupOnly = False
 logToFiles = False
-serialRestoreTimeOut = None  # used to temporarily increase the serial timeout
 
 for o, a in opts:
     # print help message for command line options
@@ -147,10 +122,10 @@ for o, a in opts:
     if o in ('-f', '--force'):
         logMessage("Closing all existing processes of BrewPi and keeping this one")
         allProcesses = BrewPiProcess.BrewPiProcesses()
-        if len(allProcesses.update()) > 1:  # if I am not the only one running
+        if allProcesses.update():  # if I am not the only one running
             allProcesses.quitAll()
             time.sleep(2)
-            if len(allProcesses.update()) > 1:
+            if allProcesses.update():
                 print "Asking the other processes to quit nicely did not work. Killing them with force!"
     # redirect output of stderr and stdout to files in log directory
     if o in ('-l', '--log'):
@@ -173,11 +148,15 @@ if checkDontRunFile:
         # do not print anything, this will flood the logs
         exit(0)
 
-# check for other running instances of BrewPi that will cause conflicts with this instance
-allProcesses = BrewPiProcess.BrewPiProcesses()
-allProcesses.update()
-myProcess = allProcesses.me()
-if allProcesses.findConflicts(myProcess):
+# register this instance with lock files for its config file, the serial port of each chamber and its socket. This
+# fails when another running instance of BrewPi holds one of them, which would conflict with this instance.
+if 'chambers' in config:
+    ports = [util.readCfgWithDefaults(os.path.abspath(chamberConfigFile))['port']
+             for chamberConfigFile in config['chambers'].values()]
+else:
+    ports = [config['port']]
+myProcess = BrewPiProcess.BrewPiProcess.fromConfig(configFile, config, ports)
+if not myProcess.register():
     if not checkDontRunFile:
         logMessage("Another instance of BrewPi is already running, which will conflict with this instance. " +
                    "This instance will exit")
@@ -186,13 +165,6 @@ if allProcesses.findConflicts(myProcess):
 if checkStartupOnly:
     exit(1)
 
-localJsonFileName = ""
-localCsvFileName = ""
-wwwJsonFileName = ""
-wwwCsvFileName = ""
-lastDay = ""
-day = ""
-
 if logToFiles:
     logPath = util.addSlash(config['scriptPath']) + 'logs/'
     print logPath
@@ -200,153 +172,67 @@ if logToFiles:
     sys.stderr = open(logPath + 'stderr.txt', 'a', 0)  # append to stderr file, unbuffered
     sys.stdout = open(logPath + 'stdout.txt', 'w', 0)  # overwrite stdout file on script start, unbuffered
 
+# Time spent in each stage of the main loop, for the loopStats message
+stats = brewpiStats.LoopStats()
+startTime = time.time()
+
+# The event loop waits for data on the socket and serial ports and runs the time driven work in between
+loop = brewpiEventLoop.EventLoop(stats)
+
+# Completed daily files are gzip compressed in the background, unless precompressData is false.
+compressor = None
+if config.get('precompressData', 'true') == 'true':
+    compressor = brewpiCompress.BackgroundCompressor()
+
+
+def closeChambers():
+    for chamber in chambers.values():
+        chamber.close()
+    if compressor:
+        compressor.stop()  # finish compressing files
+
+
+def restartScript():
+    """
+    Restarts the script after a new program has been uploaded to an Arduino. This replaces this process with the
+    new one.
+    """
+    closeChambers()
+    time.sleep(5)  # give the Arduino time to reboot
+    python = sys.executable
+    os.execl(python, python, *sys.argv)
+
+# A config file with a [chambers] section runs one chamber for each entry in it: the id of the chamber, which is
+# used in socket messages, = the config file of the chamber. Without it, the config file is the config of the only
+# chamber. The socket and the log files are set up with the settings of the main config file.
+chambers = OrderedDict()
+if 'chambers' in config:
+    for chamberId, chamberConfigFile in config['chambers'].items():
+        chambers[chamberId] = brewpiChamber.Chamber(chamberId, os.path.abspath(chamberConfigFile), loop, compressor,
+                                                    chamberId + '/', restartScript, stats)
+else:
+    chambers[None] = brewpiChamber.Chamber(None, configFile, loop, compressor, '', restartScript, stats)
+defaultChamber = chambers.values()[0]  # receives the messages that do not name a chamber
+sharedPathErrors = brewpiChamber.sharedPaths(chambers.values())
+if sharedPathErrors:
+    for error in sharedPathErrors:
+        logMessage("Error: " + error)
+    logMessage("Every chamber needs its own scriptPath, wwwPath and port in its config file. Script will exit.")
+    exit(1)
 
-# userSettings.json is a copy of some of the settings that are needed by the web server.
-# This allows the web server to load properly, even when the script is not running.
-def changeWwwSetting(settingName, value):
-    wwwSettingsFileName = util.addSlash(config['wwwPath']) + 'userSettings.json'
-    if os.path.exists(wwwSettingsFileName):
-        wwwSettingsFile = open(wwwSettingsFileName, 'r+b')
-        try:
-            wwwSettings = json.load(wwwSettingsFile)  # read existing settings
-        except json.JSONDecodeError:
-            logMessage("Error in decoding userSettings.json, creating new empty json file")
-            wwwSettings = {}  # start with a fresh file when the json is corrupt.
-    else:
-        wwwSettingsFile = open(wwwSettingsFileName, 'w+b')  # create new file
-        wwwSettings = {}
-
-    wwwSettings[settingName] = str(value)
-    wwwSettingsFile.seek(0)
-    wwwSettingsFile.write(json.dumps(wwwSettings))
-    wwwSettingsFile.truncate()
-    wwwSettingsFile.close()
-
-
-def startBeer(beerName):
-    global config
-    global localJsonFileName
-    global localCsvFileName
-    global wwwJsonFileName
-    global wwwCsvFileName
-    global lastDay
-    global day
-
-    if config['dataLogging'] == 'active':
-        # create directory for the data if it does not exist
-        dataPath = util.addSlash(util.addSlash(config['scriptPath']) + 'data/' + beerName)
-        wwwDataPath = util.addSlash(util.addSlash(config['wwwPath']) + 'data/' + beerName)
-
-        if not os.path.exists(dataPath):
-            os.makedirs(dataPath)
-            os.chmod(dataPath, 0775)  # give group all permissions
-        if not os.path.exists(wwwDataPath):
-            os.makedirs(wwwDataPath)
-            os.chmod(wwwDataPath, 0775)  # give group all permissions
-
-        # Keep track of day and make new data file for each day
-        day = time.strftime("%Y-%m-%d")
-        lastDay = day
-        # define a JSON file to store the data
-        jsonFileName = config['beerName'] + '-' + day
-        #if a file for today already existed, add suffix
-        if os.path.isfile(dataPath + jsonFileName + '.json'):
-            i = 1
-            while os.path.isfile(dataPath + jsonFileName + '-' + str(i) + '.json'):
-                i += 1
-            jsonFileName = jsonFileName + '-' + str(i)
-        localJsonFileName = dataPath + jsonFileName + '.json'
-        brewpiJson.newEmptyFile(localJsonFileName)
-
-        # Define a location on the web server to copy the file to after it is written
-        wwwJsonFileName = wwwDataPath + jsonFileName + '.json'
-
-        # Define a CSV file to store the data as CSV (might be useful one day)
-        localCsvFileName = (dataPath + config['beerName'] + '.csv')
-        wwwCsvFileName = (wwwDataPath + config['beerName'] + '.csv')
-
-    changeWwwSetting('beerName', beerName)
-
-
-def startNewBrew(newName):
-    global config
-    if len(newName) > 1:     # shorter names are probably invalid
-        config = util.configSet(configFile, 'beerName', newName)
-        config = util.configSet(configFile, 'dataLogging', 'active')
-        startBeer(newName)
-        logMessage("Notification: Restarted logging for beer '%s'." % newName)
-        return {'status': 0, 'statusMessage': "Successfully started switched to new brew '%s'. " % newName +
-                                              "Please reload the page."}
-    else:
-        return {'status': 1, 'statusMessage': "Invalid new brew name '%s', "
-                                              "please enter a name with at least 2 characters" % newName}
-
-
-def stopLogging():
-    global config
-    logMessage("Stopped data logging, as requested in web interface. " +
-               "BrewPi will continue to control temperatures, but will not log any data.")
-    config = util.configSet(configFile, 'beerName', None)
-    config = util.configSet(configFile, 'dataLogging', 'stopped')
-    changeWwwSetting('beerName', None)
-    return {'status': 0, 'statusMessage': "Successfully stopped logging"}
-
-
-def pauseLogging():
-    global config
-    logMessage("Paused logging data, as requested in web interface. " +
-               "BrewPi will continue to control temperatures, but will not log any data until resumed.")
-    if config['dataLogging'] == 'active':
-        config = util.configSet(configFile, 'dataLogging', 'paused')
-        return {'status': 0, 'statusMessage': "Successfully paused logging."}
-    else:
-        return {'status': 1, 'statusMessage': "Logging already paused or stopped."}
-
-
-def resumeLogging():
-    global config
-    logMessage("Continued logging data, as requested in web interface.")
-    if config['dataLogging'] == 'paused':
-        config = util.configSet(configFile, 'dataLogging', 'active')
-        return {'status': 0, 'statusMessage': "Successfully continued logging."}
-    else:
-        return {'status': 1, 'statusMessage': "Logging was not paused."}
-
-port = config['port']
-ser, conn = util.setupSerial(config)
-
-logMessage("Notification: Script started for beer '" + config['beerName'] + "'")
+for chamber in chambers.values():
+    try:
+        # with several chambers, a chamber without Arduino is opened again later instead of stopping the script
+        chamber.openSerial(exitOnError=chamber.id is None)
+    except serial.SerialException as e:
+        chamber.serialFailed(e)
+    chamber.logMessage("Notification: Script started for beer '" + chamber.config['beerName'] + "'")
 # wait for 10 seconds to allow an Uno to reboot (in case an Uno is being used)
 time.sleep(float(config.get('startupDelay', 10)))
 
-ser.flush()
-
-hwVersion = brewpiVersion.getVersionFromSerial(ser)
-if hwVersion is None:
-    logMessage("Warning: Cannot receive version number from Arduino. " +
-               "Your Arduino is either not programmed or running a very old version of BrewPi. " +
-               "Please upload a new version of BrewPi to your Arduino.")
-    # script will continue so you can at least program the Arduino
-    lcdText = ['Could not receive', 'version from Arduino', 'Please (re)program', 'your Arduino']
-else:
-    logMessage("Found " + hwVersion.toExtendedString() + \
-               " on port " + port + "\n")
-    if hwVersion.toString() != compatibleHwVersion:
-        logMessage("Warning: BrewPi version compatible with this script is " +
-                   compatibleHwVersion +
-                   " but version number received is " + hwVersion.toString())
-    if int(hwVersion.log) != int(expandLogMessage.getVersion()):
-        logMessage("Warning: version number of local copy of logMessages.h " +
-                   "does not match log version number received from Arduino." +
-                   "Arduino version = " + str(hwVersion.log) +
-                   ", local copy version = " + str(expandLogMessage.getVersion()))
-
-if hwVersion is not None:
-    ser.flush()
-    # request settings from Arduino, processed later when reply is received
-    ser.write('s')  # request control settings cs
-    ser.write('c')  # request control constants cc
-    # answer from Arduino is received asynchronously later.
+for chamber in chambers.values():
+    if chamber.serialFailure is None:
+        chamber.connect()
 
 # create a listening socket to communicate with PHP
 is_windows = sys.platform.startswith('win')
@@ -368,428 +254,107 @@ else:
     # set all permissions for socket
     os.chmod(socketFile, 0777)
 
-serialCheckInterval = 0.5
-s.setblocking(1)  # set socket functions to be blocking
-s.listen(10)  # Create a backlog queue for up to 10 connections
-# blocking socket functions wait 'serialCheckInterval' seconds
-s.settimeout(serialCheckInterval)
-
-prevDataTime = 0.0  # keep track of time between new data requests
-prevTimeOut = time.time()
-
-run = 1
-
-startBeer(config['beerName'])
-outputTemperature = True
-
-prevTempJson = {
-    "BeerTemp": 0,
-    "FridgeTemp": 0,
-    "BeerAnn": None,
-    "FridgeAnn": None,
-    "RoomTemp": None,
-    "State": None,
-    "BeerSet": 0,
-    "FridgeSet": 0}
-
-
-def renameTempKey(key):
-    rename = {
-        "bt": "BeerTemp",
-        "bs": "BeerSet",
-        "ba": "BeerAnn",
-        "ft": "FridgeTemp",
-        "fs": "FridgeSet",
-        "fa": "FridgeAnn",
-        "rt": "RoomTemp",
-        "s": "State",
-        "t": "Time"}
-    return rename.get(key, key)
-
-while run:
-    if config['dataLogging'] == 'active':
-        # Check whether it is a new day
-        lastDay = day
-        day = time.strftime("%Y-%m-%d")
-        if lastDay != day:
-            logMessage("Notification: New day, dropping data table and creating new JSON file.")
-            jsonFileName = config['beerName'] + '/' + config['beerName'] + '-' + day
-            localJsonFileName = util.addSlash(config['scriptPath']) + 'data/' + jsonFileName + '.json'
-            wwwJsonFileName = util.addSlash(config['wwwPath']) + 'data/' + jsonFileName + '.json'
-            # create new empty json file
-            brewpiJson.newEmptyFile(localJsonFileName)
-
-    # Wait for incoming socket connections.
-    # When nothing is received, socket.timeout will be raised after
-    # serialCheckInterval seconds. Serial receive will be done then.
-    # When messages are expected on serial, the timeout is raised 'manually'
-    try:
-        conn, addr = s.accept()
-        conn.setblocking(1)
-        # blocking receive, times out in serialCheckInterval
-        message = conn.recv(4096)
-        if "=" in message:
-            messageType, value = message.split("=", 1)
-        else:
-            messageType = message
-            value = ""
-        if messageType == "ack":  # acknowledge request
-            conn.send('ack')
-        elif messageType == "lcd":  # lcd contents requested
-            conn.send(json.dumps(lcdText))
-        elif messageType == "getMode":  # echo cs['mode'] setting
-            conn.send(cs['mode'])
-        elif messageType == "getFridge":  # echo fridge temperature setting
-            conn.send(str(cs['fridgeSet']))
-        elif messageType == "getBeer":  # echo fridge temperature setting
-            conn.send(str(cs['beerSet']))
-        elif messageType == "getControlConstants":
-            conn.send(json.dumps(cc))
-        elif messageType == "getControlSettings":
-            if cs['mode'] == "p":
-                profileFile = util.addSlash(config['scriptPath']) + 'settings/tempProfile.csv'
-                with file(profileFile, 'r') as prof:
-                    cs['profile'] = prof.readline().split(",")[-1].rstrip("\n")
-            cs['dataLogging'] = config['dataLogging']
-            conn.send(json.dumps(cs))
-        elif messageType == "getControlVariables":
-            conn.send(json.dumps(cv))
-        elif messageType == "refreshControlConstants":
-            ser.write("c")
-            raise socket.timeout
-        elif messageType == "refreshControlSettings":
-            ser.write("s")
-            raise socket.timeout
-        elif messageType == "refreshControlVariables":
-            ser.write("v")
-            raise socket.timeout
-        elif messageType == "loadDefaultControlSettings":
-            ser.write("S")
-            raise socket.timeout
-        elif messageType == "loadDefaultControlConstants":
-            ser.write("C")
-            raise socket.timeout
-        elif messageType == "setBeer":  # new constant beer temperature received
-            try:
-                newTemp = float(value)
-            except ValueError:
-                logMessage("Cannot convert temperature '" + value + "' to float")
-                continue
-            if cc['tempSetMin'] <= newTemp <= cc['tempSetMax']:
-                cs['mode'] = 'b'
-                # round to 2 dec, python will otherwise produce 6.999999999
-                cs['beerSet'] = round(newTemp, 2)
-                ser.write("j{mode:b, beerSet:" + str(cs['beerSet']) + "}")
-                logMessage("Notification: Beer temperature set to " +
-                           str(cs['beerSet']) +
-                           " degrees in web interface")
-                raise socket.timeout  # go to serial communication to update Arduino
-            else:
-                logMessage("Beer temperature setting " + str(newTemp) +
-                           " is outside of allowed range " +
-                           str(cc['tempSetMin']) + " - " + str(cc['tempSetMax']) +
-                           ". These limits can be changed in advanced settings.")
-        elif messageType == "setFridge":  # new constant fridge temperature received
-            try:
-                newTemp = float(value)
-            except ValueError:
-                logMessage("Cannot convert temperature '" + value + "' to float")
-                continue
-
-            if cc['tempSetMin'] <= newTemp <= cc['tempSetMax']:
-                cs['mode'] = 'f'
-                cs['fridgeSet'] = round(newTemp, 2)
-                ser.write("j{mode:f, fridgeSet:" + str(cs['fridgeSet']) + "}")
-                logMessage("Notification: Fridge temperature set to " +
-                           str(cs['fridgeSet']) +
-                           " degrees in web interface")
-                raise socket.timeout  # go to serial communication to update Arduino
-            else:
-                logMessage("Fridge temperature setting " + str(newTemp) +
-                           " is outside of allowed range " +
-                           str(cc['tempSetMin']) + " - " + str(cc['tempSetMax']) +
-                           ". These limits can be changed in advanced settings.")
-        elif messageType == "setOff":  # cs['mode'] set to OFF
-            cs['mode'] = 'o'
-            ser.write("j{mode:o}")
-            logMessage("Notification: Temperature control disabled")
-            raise socket.timeout
-        elif messageType == "setParameters":
-            # receive JSON key:value pairs to set parameters on the Arduino
-            try:
-                decoded = json.loads(value)
-                ser.write("j" + json.dumps(decoded))
-                if 'tempFormat' in decoded:
-                    changeWwwSetting('tempFormat', decoded['tempFormat'])  # change in web interface settings too.
-            except json.JSONDecodeError:
-                logMessage("Error: invalid JSON parameter string received: " + value)
-            raise socket.timeout
-        elif messageType == "stopScript":  # exit instruction received. Stop script.
-            # voluntary shutdown.
-            # write a file to prevent the cron job from restarting the script
-            logMessage("stopScript message received on socket. " +
-                       "Stopping script and writing dontrunfile to prevent automatic restart")
-            run = 0
-            dontrunfile = open(dontRunFilePath, "w")
-            dontrunfile.write("1")
-            dontrunfile.close()
-            continue
-        elif messageType == "quit":  # quit instruction received. Probably sent by another brewpi script instance
-            logMessage("quit message received on socket. Stopping script.")
-            run = 0
-            # Leave dontrunfile alone.
-            # This instruction is meant to restart the script or replace it with another instance.
-            continue
-        elif messageType == "eraseLogs":
-            # erase the log files for stderr and stdout
-            open(util.scriptPath() + '/logs/stderr.txt', 'wb').close()
-            open(util.scriptPath() + '/logs/stdout.txt', 'wb').close()
-            logMessage("Fresh start! Log files erased.")
-            continue
-        elif messageType == "interval":  # new interval received
-            newInterval = int(value)
-            if 5 < newInterval < 5000:
-                try:
-                    config = util.configSet(configFile, 'interval', float(newInterval))
-                except ValueError:
-                    logMessage("Cannot convert interval '" + value + "' to float")
-                    continue
-                logMessage("Notification: Interval changed to " +
-                           str(newInterval) + " seconds")
-        elif messageType == "startNewBrew":  # new beer name
-            newName = value
-            result = startNewBrew(newName)
-            conn.send(json.dumps(result))
-        elif messageType == "pauseLogging":
-            result = pauseLogging()
-            conn.send(json.dumps(result))
-        elif messageType == "stopLogging":
-            result = stopLogging()
-            conn.send(json.dumps(result))
-        elif messageType == "resumeLogging":
-            result = resumeLogging()
-            conn.send(json.dumps(result))
-        elif messageType == "dateTimeFormatDisplay":
-            config = util.configSet(configFile, 'dateTimeFormatDisplay', value)
-            changeWwwSetting('dateTimeFormatDisplay', value)
-            logMessage("Changing date format config setting: " + value)
-        elif messageType == "setActiveProfile":
-            # copy the profile CSV file to the working directory
-            logMessage("Setting profile '%s' as active profile" % value)
-            config = util.configSet(configFile, 'profileName', value)
-            changeWwwSetting('profileName', value)
-            profileSrcFile = util.addSlash(config['wwwPath']) + "/data/profiles/" + value + ".csv"
-            profileDestFile = util.addSlash(config['scriptPath']) + 'settings/tempProfile.csv'
-            profileDestFileOld = profileDestFile + '.old'
-            try:
-                if os.path.isfile(profileDestFile):
-                    if os.path.isfile(profileDestFileOld):
-                        os.remove(profileDestFileOld)
-                    os.rename(profileDestFile, profileDestFileOld)
-                shutil.copy(profileSrcFile, profileDestFile)
-                # for now, store profile name in header row (in an additional column)
-                with file(profileDestFile, 'r') as original:
-                    line1 = original.readline().rstrip("\n")
-                    rest = original.read()
-                with file(profileDestFile, 'w') as modified:
-                    modified.write(line1 + "," + value + "\n" + rest)
-            except IOError as e:  # catch all exceptions and report back an error
-                conn.send("I/O Error(%d) updating profile: %s " % (e.errno, e.strerror))
-            else:
-                conn.send("Profile successfully updated")
-                if cs['mode'] is not 'p':
-                    cs['mode'] = 'p'
-                    ser.write("j{mode:p}")
-                    logMessage("Notification: Profile mode enabled")
-                    raise socket.timeout  # go to serial communication to update Arduino
-        elif messageType == "programArduino":
-            ser.close()  # close serial port before programming
-            del ser  # Arduino won't reset when serial port is not completely removed
-            try:
-                programParameters = json.loads(value)
-                hexFile = programParameters['fileName']
-                boardType = programParameters['boardType']
-                restoreSettings = programParameters['restoreSettings']
-                restoreDevices = programParameters['restoreDevices']
-                programmer.programArduino(config, boardType, hexFile,
-                                          {'settings': restoreSettings, 'devices': restoreDevices})
-                logMessage("New program uploaded to Arduino, script will restart")
-            except json.JSONDecodeError:
-                logMessage("Error: cannot decode programming parameters: " + value)
-                logMessage("Restarting script without programming.")
-
-            # restart the script when done. This replaces this process with the new one
-            time.sleep(5)  # give the Arduino time to reboot
-            python = sys.executable
-            os.execl(python, python, *sys.argv)
-        elif messageType == "refreshDeviceList":
-            deviceList['listState'] = ""  # invalidate local copy
-            if value.find("readValues") != -1:
-                ser.write("d{r:1}")  # request installed devices
-                serialRestoreTimeOut = ser.getTimeout()
-                ser.setTimeout(2)  # set timeOut to 2 seconds because retreiving values takes a while
-                ser.write("h{u:-1,v:1}")  # request available, but not installed devices
-            else:
-                ser.write("d{}")  # request installed devices
-                ser.write("h{u:-1}")  # request available, but not installed devices
-        elif messageType == "getDeviceList":
-            if deviceList['listState'] in ["dh", "hd"]:
-                response = dict(board=hwVersion.board,
-                                shield=hwVersion.shield,
-                                deviceList=deviceList,
-                                pinList=pinList.getPinList(hwVersion.board, hwVersion.shield))
-                conn.send(json.dumps(response))
-            else:
-                conn.send("device-list-not-up-to-date")
-        elif messageType == "applyDevice":
-            try:
-                configStringJson = json.loads(value)  # load as JSON to check syntax
-            except json.JSONDecodeError:
-                logMessage("Error: invalid JSON parameter string received: " + value)
-                continue
-            ser.write("U" + value)
-            deviceList['listState'] = ""  # invalidate local copy
-        else:
-            logMessage("Error: Received invalid message on socket: " + message)
 
-        if (time.time() - prevTimeOut) < serialCheckInterval:
-            continue
-        else:
-            # raise exception to check serial for data immediately
-            raise socket.timeout
-
-    except socket.timeout:
-        # Do serial communication and update settings every SerialCheckInterval
-        prevTimeOut = time.time()
-
-        if hwVersion is None:
-            continue  # do nothing with the serial port when the arduino has not been recognized
-
-        # request new LCD text
-        ser.write('l')
-        # request Settings from Arduino to stay up to date
-        ser.write('s')
-
-        # if no new data has been received for serialRequestInteval seconds
-        if (time.time() - prevDataTime) >= float(config['interval']):
-            ser.write("t")  # request new from arduino
-
-        elif (time.time() - prevDataTime) > float(config['interval']) + 2 * float(config['interval']):
-            #something is wrong: arduino is not responding to data requests
-            logMessage("Error: Arduino is not responding to new data requests")
-
-        for line in ser:  # read all lines on serial interface
-            try:
-                if line[0] == 'T':
-                    # print it to stdout
-                    if outputTemperature:
-                        print time.strftime("%b %d %Y %H:%M:%S  ") + line[2:]
-
-                    # store time of last new data for interval check
-                    prevDataTime = time.time()
-
-                    if config['dataLogging'] == 'paused' or config['dataLogging'] == 'stopped':
-                        continue  # skip if logging is paused or stopped
-
-                    # process temperature line
-                    newData = json.loads(line[2:])
-                    # copy/rename keys
-                    for key in newData:
-                        prevTempJson[renameTempKey(key)] = newData[key]
-
-                    newRow = prevTempJson
-                    # add to JSON file
-                    brewpiJson.addRow(localJsonFileName, newRow)
-                    # copy to www dir.
-                    # Do not write directly to www dir to prevent blocking www file.
-                    shutil.copyfile(localJsonFileName, wwwJsonFileName)
-                    #write csv file too
-                    csvFile = open(localCsvFileName, "a")
-                    try:
-                        lineToWrite = (time.strftime("%b %d %Y %H:%M:%S;") +
-                                       str(newRow['BeerTemp']) + ';' +
-                                       str(newRow['BeerSet']) + ';' +
-                                       str(newRow['BeerAnn']) + ';' +
-                                       str(newRow['FridgeTemp']) + ';' +
-                                       str(newRow['FridgeSet']) + ';' +
-                                       str(newRow['FridgeAnn']) + ';' +
-                                       str(newRow['State']) + ';' +
-                                       str(newRow['RoomTemp']) + '\n')
-                        csvFile.write(lineToWrite)
-                    except KeyError, e:
-                        logMessage("KeyError in line from Arduino: %s" % str(e))
-
-                    csvFile.close()
-                    shutil.copyfile(localCsvFileName, wwwCsvFileName)
-
-                elif line[0] == 'D':
-                    # debug message received
-                    try:
-                        expandedMessage = expandLogMessage.expandLogMessage(line[2:])
-                        logMessage("Arduino debug message: " + expandedMessage)
-                    except Exception, e:  # catch all exceptions, because out of date file could cause errors
-                        logMessage("Error while expanding log message '" + line[2:] + "'" + str(e))
-
-                elif line[0] == 'L':
-                    # lcd content received
-                    lcdTextReplaced = line[2:].replace('\xb0', '&deg')  # replace degree sign with &deg
-                    lcdText = json.loads(lcdTextReplaced)
-                elif line[0] == 'C':
-                    # Control constants received
-                    cc = json.loads(line[2:])
-                elif line[0] == 'S':
-                    # Control settings received
-                    cs = json.loads(line[2:])
-                # do not print this to the log file. This is requested continuously.
-                elif line[0] == 'V':
-                    # Control settings received
-                    cv = json.loads(line[2:])
-                elif line[0] == 'N':
-                    pass  # version number received. Do nothing, just ignore
-                elif line[0] == 'h':
-                    deviceList['available'] = json.loads(line[2:])
-                    oldListState = deviceList['listState']
-                    deviceList['listState'] = oldListState.strip('h') + "h"
-                    logMessage("Available devices received: " + str(deviceList['available']))
-                    if serialRestoreTimeOut:
-                        ser.setTimeout(serialRestoreTimeOut)
-                        serialRestoreTimeOut = None
-                elif line[0] == 'd':
-                    deviceList['installed'] = json.loads(line[2:])
-                    oldListState = deviceList['listState']
-                    deviceList['listState'] = oldListState.strip('d') + "d"
-                    logMessage("Installed devices received: " + str(deviceList['installed']))
-                elif line[0] == 'U':
-                    logMessage("Device updated to: " + line[2:])
-                else:
-                    logMessage("Cannot process line from Arduino: " + line)
-                # end or processing a line
-            except json.decoder.JSONDecodeError, e:
-                logMessage("JSON decode error: %s" % str(e))
-                logMessage("Line received was: " + line)
-            except UnicodeDecodeError as e:
-                logMessage("Unicode decode error: %s" % str(e))
-                logMessage("Line received was: " + line)
-
-        # Check for update from temperature profile
-        if cs['mode'] == 'p':
-            newTemp = temperatureProfile.getNewTemp(config['scriptPath'])
-            if newTemp != cs['beerSet']:
-                cs['beerSet'] = newTemp
-                if cc['tempSetMin'] < newTemp < cc['tempSetMax']:
-                    # if temperature has to be updated send settings to arduino
-                    ser.write("j{beerSet:" + str(cs['beerSet']) + "}")
-                elif newTemp is None:
-                    # temperature control disabled by profile
-                    logMessage("Temperature control disabled by empty cell in profile.")
-                    ser.write("j{beerSet:-99999}")  # send as high negative value that will result in INT_MIN on Arduino
-
-    except socket.error as e:
-        logMessage("Socket error(%d): %s" % (e.errno, e.strerror))
-        traceback.print_exc()
-
-if ser:
-    ser.close()  # close port
-if conn:
-    conn.shutdown(socket.SHUT_RDWR)  # close socket
-    conn.close()
+def stopOnSignal(signum, frame):
+    """
+    Stops the main loop, so buffered data is written before the script exits
+    """
+    logMessage("Received signal %d, stopping script." % signum)
+    loop.stop()
+
+signal.signal(signal.SIGTERM, stopOnSignal)
+signal.signal(signal.SIGINT, stopOnSignal)
+
+
+def handleMessage(conn, message):
+    """
+    Handles a message received on the socket. Messages for a chamber start with the id of the chamber and a slash,
+    like fridge2/setBeer=20.0. Messages without chamber id are for the first chamber.
+
+    Params:
+    conn: brewpiSocketServer.Connection the message was received on
+    message: the message, the message type optionally followed by = and a value
+
+    Returns: the reply, as string or as object that is sent as JSON. None when there is no reply.
+    """
+    chamber = defaultChamber
+    if "/" in message.split("=", 1)[0]:
+        chamberId, message = message.split("/", 1)
+        chamber = chambers.get(chamberId)
+        if chamber is None:
+            logMessage("Error: Received message for unknown chamber on socket: " + chamberId)
+            return {'status': 1, 'statusMessage': "Unknown chamber '%s'" % chamberId}
+    messageType = message.split("=", 1)[0]
+
+    if messageType == "stopScript":  # exit instruction received. Stop script.
+        # voluntary shutdown.
+        # write a file to prevent the cron job from restarting the script
+        logMessage("stopScript message received on socket. " +
+                   "Stopping script and writing dontrunfile to prevent automatic restart")
+        loop.stop()
+        dontrunfile = open(dontRunFilePath, "w")
+        dontrunfile.write("1")
+        dontrunfile.close()
+    elif messageType == "quit":  # quit instruction received. Probably sent by another brewpi script instance
+        logMessage("quit message received on socket. Stopping script.")
+        loop.stop()
+        # Leave dontrunfile alone.
+        # This instruction is meant to restart the script or replace it with another instance.
+    elif messageType == "eraseLogs":
+        # erase the log files for stderr and stdout
+        open(util.scriptPath() + '/logs/stderr.txt', 'wb').close()
+        open(util.scriptPath() + '/logs/stdout.txt', 'wb').close()
+        logMessage("Fresh start! Log files erased.")
+    elif messageType == "getChambers":
+        return [name for name in chambers if name is not None]
+    elif messageType == "loopStats":
+        # histograms of the time spent in each stage of the main loop, loopStats=reset starts new histograms
+        reply = stats.asDict()
+        if message.split("=", 1)[1:] == ['reset']:
+            reply = brewpiSocketServer.RawJson(json.dumps(reply))  # encode before the histograms are reset
+            stats.reset()
+        return reply
+    else:
+        return chamber.handleMessage(conn, message)
+
+
+# socket connections are accepted and read without blocking, handleMessage is called for each message
+server = brewpiSocketServer.SocketServer(loop, s, stats.timed('dispatch', handleMessage))
+for chamber in chambers.values():
+    chamber.start(server)
+
+# write the loop stats to the log every loopStatsLogInterval seconds
+loopStatsLogInterval = float(config.get('loopStatsLogInterval', 0))
+if loopStatsLogInterval > 0:
+    loop.callEvery(loopStatsLogInterval, lambda: logMessage("Loop stats: " + stats.summary()))
+
+
+def formatMetrics():
+    return brewpiMetrics.collect(chambers.values(), stats, startTime).format()
+
+
+def writeMetricsFile():
+    try:
+        brewpiMetrics.writeFile(metricsFile, formatMetrics())
+    except IOError as e:
+        logMessage("Error writing metrics file %s: %s" % (metricsFile, e))
+
+# Metrics in the Prometheus text format, served over HTTP on localhost:metricsPort and/or written to metricsFile
+# every metricsInterval seconds for a textfile collector
+metricsServer = None
+if config.get('metricsPort'):
+    metricsSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    metricsSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    metricsSocket.bind(('127.0.0.1', int(config['metricsPort'])))
+    metricsServer = brewpiSocketServer.SocketServer(
+        loop, metricsSocket, lambda conn, request: brewpiMetrics.httpResponse(request, formatMetrics))
+metricsFile = config.get('metricsFile')
+if metricsFile:
+    loop.callEvery(float(config.get('metricsInterval', 15)), writeMetricsFile)
+
+loop.run()
+
+server.closeAll()
+if metricsServer:
+    metricsServer.closeAll()
+closeChambers()
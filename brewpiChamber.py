@@ -0,0 +1,1152 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import time
+
+import serial
+import simplejson as json
+
+import temperatureProfile
+import programArduino as programmer
+import BrewPiUtil as util
+import brewpiVersion
+import pinList
+import expandLogMessage
+import brewpiQuery
+import brewpiDataLog
+import brewpiStore
+import brewpiRingBuffer
+import brewpiSerial
+import brewpiSocketServer
+import brewpiState
+import brewpiPoller
+import brewpiCommands
+import brewpiStats
+
+compatibleHwVersion = "0.2.4"
+
+serialCheckInterval = 0.5
+serialRetryInterval = 30  # seconds between attempts to open the serial port again after it failed
+
+# topics sessions can subscribe to: lcd text, data rows, control settings/constants/variables and debug messages
+pushTopics = ('lcd', 'temps', 'settings', 'debug')
+# topics of sessions that keep a poll request at the fast rate
+pollTopics = {'l': ['lcd'], 's': ['settings'], 'v': ['settings'], 't': ['temps']}
+# poll requests of the data socket messages and getState fields ask for
+pollDemand = {'lcd': 'l', 'getMode': 's', 'getFridge': 's', 'getBeer': 's', 'getControlSettings': 's',
+              'getControlVariables': 'v'}
+stateFieldPolls = {'lcd': 'l', 'cs': 's', 'cv': 'v'}
+
+
+def renameTempKey(key):
+    rename = {
+        "bt": "BeerTemp",
+        "bs": "BeerSet",
+        "ba": "BeerAnn",
+        "ft": "FridgeTemp",
+        "fs": "FridgeSet",
+        "fa": "FridgeAnn",
+        "rt": "RoomTemp",
+        "s": "State",
+        "t": "Time"}
+    return rename.get(key, key)
+
+
+def parameterError(query, numbers=(), integers=(), lists=()):
+    """
+    Checks the types of the parameters of a data request, because a wrong type would return wrong data or raise an
+    exception in the event loop. Parameters that are left out are fine, they are optional.
+
+    Params:
+    query: the decoded JSON parameters of the request
+    numbers: names of the parameters that have to be a number
+    integers: names of the parameters that have to be an integer
+    lists: names of the parameters that have to be a list of strings
+
+    Returns: status dict with the error for the reply, None when the parameters are valid
+    """
+    if not isinstance(query, dict):
+        return {'status': 1, 'statusMessage': "Parameters should be a JSON object"}
+    for name in numbers + integers + lists:
+        if name not in query:
+            continue
+        value = query[name]
+        if name in lists:
+            valid = isinstance(value, list) and all(isinstance(item, basestring) for item in value)
+        else:
+            valid = isinstance(value, (int, long) if name in integers else (int, long, float)) and \
+                not isinstance(value, bool)
+        if not valid:
+            return {'status': 1, 'statusMessage': "Invalid %s: %s" % (name, json.dumps(value))}
+    return None
+
+
+def sharedPaths(chambers):
+    """
+    Finds chambers that share a scriptPath, wwwPath or serial port. Each chamber needs its own paths, because its data
+    files, temperature profile and userSettings.json are stored in them, and its own Arduino.
+
+    Params:
+    chambers: list of Chamber objects
+
+    Returns: list of error messages, empty when every chamber has its own paths and port
+    """
+    errors = []
+    for setting in ('scriptPath', 'wwwPath', 'port'):
+        owners = {}
+        for chamber in chambers:
+            path = chamber.config[setting]
+            if setting != 'port':
+                path = os.path.normpath(os.path.abspath(path))
+            if path in owners:
+                errors.append("Chambers '%s' and '%s' have the same %s %s" % (owners[path], chamber.id, setting, path))
+            else:
+                owners[path] = chamber.id
+    return errors
+
+
+class Chamber:
+    """
+    A fermentation chamber: an Arduino on a serial port, with its own config file, control settings, data files and
+    temperature profile. All chambers of the script run on one event loop and share one socket server.
+    """
+
+    def __init__(self, chamberId, configFile, loop, compressor=None, topicPrefix='', restart=None, stats=None):
+        """
+        Params:
+        chamberId: name of the chamber in socket messages and log messages, None when it is the only chamber
+        configFile: path of the config file of the chamber
+        loop: brewpiEventLoop.EventLoop to run on
+        compressor: brewpiCompress.BackgroundCompressor for completed daily files, None to not compress them
+        topicPrefix: prepended to the topics the chamber publishes, so sessions can tell the chambers apart
+        restart: function that restarts the script, called after a new program has been uploaded to the Arduino
+        stats: brewpiStats.LoopStats the time spent in the serial, data logging and profile stages is added to
+        """
+        self.id = chamberId
+        self.configFile = configFile
+        self.config = util.readCfgWithDefaults(configFile)
+        self.loop = loop
+        self.server = None
+        self.topicPrefix = topicPrefix
+        self.restart = restart
+        self.stats = stats if stats is not None else brewpiStats.LoopStats()
+        self.serialStats = brewpiStats.SerialStats()  # traffic with the Arduino and its round trip times
+        self.ser = None
+        self.serialReader = None
+        self.serialFailure = None  # the error when the serial port failed, until it has been opened again
+        self.reconnectTimer = None
+        self.profileTimer = None
+        self.hwVersion = None
+        self.outputTemperature = True
+
+        # Settings will be read from Arduino, initialize with same defaults as Arduino
+        # This is mainly to show what's expected. Will all be overwritten on the first update from the arduino
+
+        # Control Settings
+        self.cs = dict(mode='b', beerSet=20.0, fridgeSet=20.0, heatEstimator=0.2, coolEstimator=5)
+
+        # Control Constants
+        self.cc = dict(tempFormat="C", tempSetMin=1.0, tempSetMax=30.0, pidMax=10.0, Kp=20.000, Ki=0.600, Kd=-3.000,
+                       iMaxErr=0.500, idleRangeH=1.000, idleRangeL=-1.000, heatTargetH=0.301, heatTargetL=-0.199,
+                       coolTargetH=0.199, coolTargetL=-0.301, maxHeatTimeForEst="600", maxCoolTimeForEst="1200",
+                       fridgeFastFilt="1", fridgeSlowFilt="4", fridgeSlopeFilt="3", beerFastFilt="3",
+                       beerSlowFilt="5", beerSlopeFilt="4", lah=0, hs=0)
+
+        # Control variables
+        self.cv = dict(beerDiff=0.000, diffIntegral=0.000, beerSlope=0.000, p=0.000, i=0.000, d=0.000, estPeak=0.000,
+                       negPeakEst=0.000, posPeakEst=0.000, negPeak=0.000, posPeak=0.000)
+
+        # listState = "", "d", "h", "dh" to reflect whether the list is up to date for installed (d) and available (h)
+        self.deviceList = dict(listState="", installed=[], available=[])
+
+        self.lcdText = ['Script starting up', ' ', ' ', ' ']
+
+        # versions of the state that clients request, so getState can leave out the parts a client already has
+        self.stateVersions = brewpiState.StateVersions(['lcd', 'cs', 'cc', 'cv', 'deviceList'])
+
+        # functions that return the fields of getState
+        self.stateFields = {
+            'lcd': lambda: self.lcdText,
+            'cs': self.controlSettings,
+            'cc': lambda: self.cc,
+            'cv': lambda: self.cv,
+            'deviceList': self.deviceListReply}
+
+        # JSON of the fields, encoded once after each change instead of for every request
+        self.responseCache = brewpiState.ResponseCache(self.stateVersions, self.stateFields,
+                                                       lambda value: brewpiSocketServer.RawJson(json.dumps(value)))
+
+        # handlers of the lines received from the Arduino, by the first character of the line
+        self.lineHandlers = {
+            'T': self.temperaturesReceived,
+            'D': self.debugMessageReceived,
+            'L': self.lcdTextReceived,
+            'C': self.controlConstantsReceived,
+            'S': self.controlSettingsReceived,
+            'V': self.controlVariablesReceived,
+            'N': self.versionReceived,
+            'h': self.availableDevicesReceived,
+            'd': self.installedDevicesReceived,
+            'U': self.deviceUpdated}
+
+        self.localJsonFileName = ""
+        self.localCsvFileName = ""
+        self.wwwJsonFileName = ""
+        self.wwwCsvFileName = ""
+        # Writes the data to the JSON, CSV and other data files. Rows are buffered in memory and written every
+        # logFlushRows rows or logFlushInterval seconds, whichever comes first. logFsync is 'never', 'flush' or a
+        # number of rows
+        self.dataLogger = brewpiDataLog.DataLogger(self.config.get('logFlushInterval', 0.0),
+                                                   self.config.get('logFlushRows', 1),
+                                                   self.config.get('logFsync', 'never'), compressor, self.stats)
+        self.compressor = compressor
+        self.brewIndex = None  # brewpiQuery.BrewIndex over the daily JSON files of the current beer
+        self.lastDay = ""
+        self.day = ""
+
+        self.prevDataTime = 0.0  # keep track of time between new data requests
+        self.prevLoggedTime = 0.0  # time of the last data row that was logged
+        self.prevTempJson = {
+            "BeerTemp": 0,
+            "FridgeTemp": 0,
+            "BeerAnn": None,
+            "FridgeAnn": None,
+            "RoomTemp": None,
+            "State": None,
+            "BeerSet": 0,
+            "FridgeSet": 0}
+
+        # Recent samples kept in memory for the live chart. Defaults to 24 hours at the current interval.
+        self.recentSamples = brewpiRingBuffer.SampleRingBuffer(
+            self.config.get('recentSamples', 24 * 3600 / float(self.config['interval']) + 1))
+
+        # read once instead of for every request for the control settings, updated when another profile is activated
+        self.activeProfileName = self.readProfileName()
+
+        # The Arduino is polled for new data at a fast rate while clients use the data and at a slow rate otherwise.
+        # Policies are the fast and the slow interval in seconds, 0 to not poll at that rate. Temperatures are logged
+        # every interval seconds, also when they are polled faster.
+        interval = float(self.config['interval'])
+        pollPolicies = {
+            'l': brewpiPoller.parsePolicy(self.config.get('pollLcd'), (serialCheckInterval, 30.0)),
+            's': brewpiPoller.parsePolicy(self.config.get('pollSettings'), (serialCheckInterval, 5.0)),
+            'v': brewpiPoller.parsePolicy(self.config.get('pollVariables'), (0.0, 0.0)),
+            't': brewpiPoller.parsePolicy(self.config.get('pollTemperatures'), (interval, interval))}
+        self.poller = brewpiPoller.Poller(loop, self.pollArduino, pollPolicies,
+                                          self.config.get('pollActiveTime', 10.0), self.isWatched)
+        # settings are sent to the Arduino combined and at most once every commandInterval seconds
+        self.commandQueue = brewpiCommands.CommandQueue(loop, lambda data: self.ser.write(data), self.settingEcho,
+                                                        self.config.get('commandInterval', 0.25))
+
+    def logMessage(self, message):
+        if self.id is None:
+            util.logMessage(message)
+        else:
+            util.logMessage("[%s] %s" % (self.id, message))
+
+    def openSerial(self, exitOnError=True):
+        # with several chambers, altport could be the Arduino of another chamber, so only port is used
+        self.ser, conn = util.setupSerial(self.config, exitOnError, useAltPort=self.id is None)
+        timedWrite = self.stats.timed('serialWrite', self.ser.write)
+
+        def write(data):
+            if self.serialFailure is not None:
+                return  # nothing is sent until the port has been opened again
+            self.serialStats.written(data)
+            try:
+                return timedWrite(data)
+            except (serial.SerialException, OSError, IOError) as e:
+                self.serialFailed(e)
+        self.ser.write = write
+        # lines from the Arduino are read in a background thread, started when the Arduino has been recognized
+        self.serialReader = brewpiSerial.SerialReader(self.ser)
+
+    def connect(self):
+        """
+        Asks the Arduino for its version and its settings. Call after the Arduino has had time to reboot when the
+        serial port was opened.
+        """
+        ser = self.ser
+        ser.flush()
+
+        self.hwVersion = hwVersion = brewpiVersion.getVersionFromSerial(ser)
+        if hwVersion is None:
+            self.logMessage("Warning: Cannot receive version number from Arduino. " +
+                            "Your Arduino is either not programmed or running a very old version of BrewPi. " +
+                            "Please upload a new version of BrewPi to your Arduino.")
+            # script will continue so you can at least program the Arduino
+            self.lcdText = ['Could not receive', 'version from Arduino', 'Please (re)program', 'your Arduino']
+            self.stateVersions.changed('lcd')
+        else:
+            self.logMessage("Found " + hwVersion.toExtendedString() +
+                            " on port " + ser.port + "\n")
+            if hwVersion.toString() != compatibleHwVersion:
+                self.logMessage("Warning: BrewPi version compatible with this script is " +
+                                compatibleHwVersion +
+                                " but version number received is " + hwVersion.toString())
+            if int(hwVersion.log) != int(expandLogMessage.getVersion()):
+                self.logMessage("Warning: version number of local copy of logMessages.h " +
+                                "does not match log version number received from Arduino." +
+                                "Arduino version = " + str(hwVersion.log) +
+                                ", local copy version = " + str(expandLogMessage.getVersion()))
+
+        if hwVersion is not None:
+            ser.flush()
+            # request settings from Arduino, processed later when reply is received
+            ser.write('s')  # request control settings cs
+            ser.write('c')  # request control constants cc
+            # answer from Arduino is received asynchronously later.
+
+    def start(self, server):
+        """
+        Starts logging and talking to the Arduino on the event loop
+
+        Params:
+        server: brewpiSocketServer.SocketServer the chamber publishes its updates on
+        """
+        self.server = server
+        self.startBeer(self.config['beerName'])
+        self.checkNewDay()
+        # write buffered data rows when they have been buffered for logFlushInterval seconds
+        self.loop.callEvery(serialCheckInterval, self.dataLogger.flushIfDue)
+        if self.hwVersion is not None:  # do nothing with the serial port when the arduino has not been recognized
+            self.startSerial()
+
+    def startSerial(self):
+        """
+        Starts reading and polling the Arduino, after it has been recognized
+        """
+        self.serialReader.start()
+        self.loop.addReader(self.serialReader, self.readSerial, lambda: not self.serialReader.lines.empty())
+        self.poller.start()
+        if self.profileTimer is None:
+            self.profileTimer = self.loop.callEvery(serialCheckInterval, self.checkProfile)
+
+    def closeSerial(self):
+        if self.serialReader:
+            self.loop.removeReader(self.serialReader)
+            self.serialReader.stop()
+        if self.ser:
+            try:
+                self.ser.close()  # close port
+            except (serial.SerialException, OSError, IOError):
+                pass  # the port is gone already
+
+    def serialFailed(self, error):
+        """
+        Closes the serial port after reading or writing it failed, like when the Arduino was unplugged, and tries to
+        open it again every serialRetryInterval seconds. The other chambers keep running.
+        """
+        if self.serialFailure is not None:
+            return
+        self.serialFailure = error
+        self.logMessage("Error: serial port failed: %s. Trying to open it again every %d seconds." %
+                        (error, serialRetryInterval))
+        self.poller.stop()
+        self.closeSerial()
+        self.lcdText = ['Serial port failed', 'Reconnecting to', 'the Arduino...', ' ']
+        self.stateVersions.changed('lcd')
+        self.publish('lcd', self.lcdText)
+        self.reconnectTimer = self.loop.callLater(serialRetryInterval, self.reopenSerial)
+
+    def reopenSerial(self):
+        self.reconnectTimer = None
+        try:
+            self.openSerial(False)
+        except serial.SerialException:
+            self.reconnectTimer = self.loop.callLater(serialRetryInterval, self.reopenSerial)
+            return
+        startupDelay = float(self.config.get('startupDelay', 10))
+        self.logMessage("Serial port opened again, connecting to the Arduino in %d seconds" % startupDelay)
+        # give an Uno time to reboot
+        self.reconnectTimer = self.loop.callLater(startupDelay, self.reconnectArduino)
+
+    def reconnectArduino(self):
+        self.reconnectTimer = None
+        self.serialFailure = None
+        try:
+            self.connect()
+        except (serial.SerialException, OSError, IOError) as e:
+            self.serialFailed(e)
+            return
+        if self.hwVersion is not None and self.serialFailure is None:
+            self.startSerial()
+
+    def close(self):
+        """
+        Writes buffered data and closes the serial port
+        """
+        self.poller.stop()
+        if self.reconnectTimer is not None:
+            self.reconnectTimer.cancel()
+            self.reconnectTimer = None
+        self.dataLogger.close()  # write buffered data
+        self.closeSerial()
+        self.ser = None
+
+    def publish(self, topic, data):
+        if self.server is not None:  # None until the chamber is started
+            self.server.publish(self.topicPrefix + topic, data)
+
+    def subscribed(self, topic):
+        return self.server.subscribed(self.topicPrefix + topic)
+
+    # userSettings.json is a copy of some of the settings that are needed by the web server.
+    # This allows the web server to load properly, even when the script is not running.
+    def changeWwwSetting(self, settingName, value):
+        wwwSettingsFileName = util.addSlash(self.config['wwwPath']) + 'userSettings.json'
+        if os.path.exists(wwwSettingsFileName):
+            wwwSettingsFile = open(wwwSettingsFileName, 'r+b')
+            try:
+                wwwSettings = json.load(wwwSettingsFile)  # read existing settings
+            except json.JSONDecodeError:
+                self.logMessage("Error in decoding userSettings.json, creating new empty json file")
+                wwwSettings = {}  # start with a fresh file when the json is corrupt.
+        else:
+            wwwSettingsFile = open(wwwSettingsFileName, 'w+b')  # create new file
+            wwwSettings = {}
+
+        wwwSettings[settingName] = str(value)
+        wwwSettingsFile.seek(0)
+        wwwSettingsFile.write(json.dumps(wwwSettings))
+        wwwSettingsFile.truncate()
+        wwwSettingsFile.close()
+
+    def startBeer(self, beerName):
+        config = self.config
+        if config['dataLogging'] == 'active':
+            # create directory for the data if it does not exist
+            dataPath = util.addSlash(util.addSlash(config['scriptPath']) + 'data/' + beerName)
+            wwwDataPath = util.addSlash(util.addSlash(config['wwwPath']) + 'data/' + beerName)
+
+            if not os.path.exists(dataPath):
+                os.makedirs(dataPath)
+                os.chmod(dataPath, 0775)  # give group all permissions
+            if not os.path.exists(wwwDataPath):
+                os.makedirs(wwwDataPath)
+                os.chmod(wwwDataPath, 0775)  # give group all permissions
+
+            # Keep track of day and make new data file for each day
+            self.day = time.strftime("%Y-%m-%d")
+            self.lastDay = self.day
+            # define a JSON file to store the data
+            jsonFileName = config['beerName'] + '-' + self.day
+            #if a file for today already existed, add suffix
+            if os.path.isfile(dataPath + jsonFileName + '.json'):
+                i = 1
+                while os.path.isfile(dataPath + jsonFileName + '-' + str(i) + '.json'):
+                    i += 1
+                jsonFileName = jsonFileName + '-' + str(i)
+            self.localJsonFileName = dataPath + jsonFileName + '.json'
+
+            # Define a location on the web server to copy the file to after it is written
+            self.wwwJsonFileName = wwwDataPath + jsonFileName + '.json'
+            self.dataLogger.newChartFile(self.localJsonFileName, self.wwwJsonFileName)
+
+            # Define a CSV file to store the data as CSV (might be useful one day)
+            self.localCsvFileName = (dataPath + config['beerName'] + '.csv')
+            self.wwwCsvFileName = (wwwDataPath + config['beerName'] + '.csv')
+
+            # Chart files for the whole beer, with at most a few rows per bucket of chartResolutions seconds
+            resolutions = config.get('chartResolutions', ['600', '3600'])
+            if not isinstance(resolutions, list):
+                resolutions = [resolutions]
+            self.dataLogger.startBeer(dataPath, wwwDataPath, beerName, self.localCsvFileName, self.wwwCsvFileName,
+                                      [int(r) for r in resolutions if r.strip()])
+
+            # Index of the rows in all daily files, to answer getData requests
+            self.brewIndex = brewpiQuery.BrewIndex(dataPath, config['beerName'])
+
+        self.changeWwwSetting('beerName', beerName)
+
+    def startNewBrew(self, newName):
+        if len(newName) > 1:     # shorter names are probably invalid
+            self.config = util.configSet(self.configFile, 'beerName', newName)
+            self.config = util.configSet(self.configFile, 'dataLogging', 'active')
+            self.startBeer(newName)
+            self.controlSettingsChanged()  # dataLogging is sent with the control settings
+            self.logMessage("Notification: Restarted logging for beer '%s'." % newName)
+            return {'status': 0, 'statusMessage': "Successfully started switched to new brew '%s'. " % newName +
+                                                  "Please reload the page."}
+        else:
+            return {'status': 1, 'statusMessage': "Invalid new brew name '%s', "
+                                                  "please enter a name with at least 2 characters" % newName}
+
+    def stopLogging(self):
+        self.logMessage("Stopped data logging, as requested in web interface. " +
+                        "BrewPi will continue to control temperatures, but will not log any data.")
+        self.config = util.configSet(self.configFile, 'beerName', None)
+        self.config = util.configSet(self.configFile, 'dataLogging', 'stopped')
+        self.controlSettingsChanged()
+        self.changeWwwSetting('beerName', None)
+        return {'status': 0, 'statusMessage': "Successfully stopped logging"}
+
+    def pauseLogging(self):
+        self.logMessage("Paused logging data, as requested in web interface. " +
+                        "BrewPi will continue to control temperatures, but will not log any data until resumed.")
+        if self.config['dataLogging'] == 'active':
+            self.config = util.configSet(self.configFile, 'dataLogging', 'paused')
+            self.controlSettingsChanged()
+            return {'status': 0, 'statusMessage': "Successfully paused logging."}
+        else:
+            return {'status': 1, 'statusMessage': "Logging already paused or stopped."}
+
+    def resumeLogging(self):
+        self.logMessage("Continued logging data, as requested in web interface.")
+        if self.config['dataLogging'] == 'paused':
+            self.config = util.configSet(self.configFile, 'dataLogging', 'active')
+            self.controlSettingsChanged()
+            # the day is not checked while logging is paused, so data is not added to the file of the day it paused
+            self.startNewDay()
+            return {'status': 0, 'statusMessage': "Successfully continued logging."}
+        else:
+            return {'status': 1, 'statusMessage': "Logging was not paused."}
+
+    def handleMessage(self, conn, message):
+        """
+        Handles a message received on the socket for this chamber
+
+        Params:
+        conn: brewpiSocketServer.Connection the message was received on
+        message: the message, the message type optionally followed by = and a value
+
+        Returns: the reply, as string or as object that is sent as JSON. None when there is no reply.
+        """
+        cs = self.cs
+        cc = self.cc
+        ser = self.ser
+        if "=" in message:
+            messageType, value = message.split("=", 1)
+        else:
+            messageType = message
+            value = ""
+        if messageType in pollDemand:
+            self.poller.demand(pollDemand[messageType])
+        if messageType == "ack":  # acknowledge request
+            return 'ack'
+        elif messageType == "lcd":  # lcd contents requested
+            return self.cachedReply('lcd', value)
+        elif messageType == "getMode":  # echo cs['mode'] setting
+            return cs['mode']
+        elif messageType == "getFridge":  # echo fridge temperature setting
+            return str(cs['fridgeSet'])
+        elif messageType == "getBeer":  # echo fridge temperature setting
+            return str(cs['beerSet'])
+        elif messageType == "getControlConstants":
+            return self.cachedReply('cc', value)
+        elif messageType == "getControlSettings":
+            return self.cachedReply('cs', value)
+        elif messageType == "getControlVariables":
+            return self.cachedReply('cv', value)
+        elif messageType == "refreshControlConstants":
+            ser.write("c")
+        elif messageType == "refreshControlSettings":
+            ser.write("s")
+        elif messageType == "refreshControlVariables":
+            ser.write("v")
+        elif messageType == "loadDefaultControlSettings":
+            ser.write("S")
+        elif messageType == "loadDefaultControlConstants":
+            ser.write("C")
+        elif messageType == "setBeer":  # new constant beer temperature received
+            try:
+                newTemp = float(value)
+            except ValueError:
+                self.logMessage("Cannot convert temperature '" + value + "' to float")
+                return
+            if cc['tempSetMin'] <= newTemp <= cc['tempSetMax']:
+                cs['mode'] = 'b'
+                # round to 2 dec, python will otherwise produce 6.999999999
+                cs['beerSet'] = round(newTemp, 2)
+                self.controlSettingsChanged()
+                self.commandQueue.send([('mode', 'b'), ('beerSet', cs['beerSet'])])
+                self.logMessage("Notification: Beer temperature set to " +
+                                str(cs['beerSet']) +
+                                " degrees in web interface")
+            else:
+                self.logMessage("Beer temperature setting " + str(newTemp) +
+                                " is outside of allowed range " +
+                                str(cc['tempSetMin']) + " - " + str(cc['tempSetMax']) +
+                                ". These limits can be changed in advanced settings.")
+        elif messageType == "setFridge":  # new constant fridge temperature received
+            try:
+                newTemp = float(value)
+            except ValueError:
+                self.logMessage("Cannot convert temperature '" + value + "' to float")
+                return
+
+            if cc['tempSetMin'] <= newTemp <= cc['tempSetMax']:
+                cs['mode'] = 'f'
+                cs['fridgeSet'] = round(newTemp, 2)
+                self.controlSettingsChanged()
+                self.commandQueue.send([('mode', 'f'), ('fridgeSet', cs['fridgeSet'])])
+                self.logMessage("Notification: Fridge temperature set to " +
+                                str(cs['fridgeSet']) +
+                                " degrees in web interface")
+            else:
+                self.logMessage("Fridge temperature setting " + str(newTemp) +
+                                " is outside of allowed range " +
+                                str(cc['tempSetMin']) + " - " + str(cc['tempSetMax']) +
+                                ". These limits can be changed in advanced settings.")
+        elif messageType == "setOff":  # cs['mode'] set to OFF
+            cs['mode'] = 'o'
+            self.controlSettingsChanged()
+            self.commandQueue.send([('mode', 'o')])
+            self.logMessage("Notification: Temperature control disabled")
+        elif messageType == "setParameters":
+            # receive JSON key:value pairs to set parameters on the Arduino
+            try:
+                decoded = json.loads(value)
+                error = parameterError(decoded)  # send needs an object of parameter names and values
+                if error is not None:
+                    return error
+                self.commandQueue.send(decoded)
+                if 'tempFormat' in decoded:
+                    # change in web interface settings too.
+                    self.changeWwwSetting('tempFormat', decoded['tempFormat'])
+            except json.JSONDecodeError:
+                self.logMessage("Error: invalid JSON parameter string received: " + value)
+        elif messageType == "waitConfirmed":
+            # replies when the Arduino confirmed all settings sent until now, or after value seconds (default 5)
+            try:
+                timeout = float(value) if value else 5.0
+            except ValueError:
+                self.logMessage("Cannot convert timeout '" + value + "' to float")
+                return
+            return self.waitConfirmed(timeout)
+        elif messageType == "interval":  # new interval received
+            newInterval = int(value)
+            if 5 < newInterval < 5000:
+                try:
+                    self.config = util.configSet(self.configFile, 'interval', float(newInterval))
+                except ValueError:
+                    self.logMessage("Cannot convert interval '" + value + "' to float")
+                    return
+                self.logMessage("Notification: Interval changed to " +
+                                str(newInterval) + " seconds")
+                if self.config.get('pollTemperatures') is None:
+                    self.poller.setPolicy('t', (float(newInterval), float(newInterval)))
+        elif messageType == "startNewBrew":  # new beer name
+            return self.startNewBrew(value)
+        elif messageType == "pauseLogging":
+            return self.pauseLogging()
+        elif messageType == "stopLogging":
+            return self.stopLogging()
+        elif messageType == "resumeLogging":
+            return self.resumeLogging()
+        elif messageType == "dateTimeFormatDisplay":
+            self.config = util.configSet(self.configFile, 'dateTimeFormatDisplay', value)
+            self.changeWwwSetting('dateTimeFormatDisplay', value)
+            self.logMessage("Changing date format config setting: " + value)
+        elif messageType == "setActiveProfile":
+            # copy the profile CSV file to the working directory
+            self.logMessage("Setting profile '%s' as active profile" % value)
+            self.config = util.configSet(self.configFile, 'profileName', value)
+            self.changeWwwSetting('profileName', value)
+            profileSrcFile = util.addSlash(self.config['wwwPath']) + "/data/profiles/" + value + ".csv"
+            profileDestFile = util.addSlash(self.config['scriptPath']) + 'settings/tempProfile.csv'
+            profileDestFileOld = profileDestFile + '.old'
+            try:
+                if os.path.isfile(profileDestFile):
+                    if os.path.isfile(profileDestFileOld):
+                        os.remove(profileDestFileOld)
+                    os.rename(profileDestFile, profileDestFileOld)
+                shutil.copy(profileSrcFile, profileDestFile)
+                # for now, store profile name in header row (in an additional column)
+                with file(profileDestFile, 'r') as original:
+                    line1 = original.readline().rstrip("\n")
+                    rest = original.read()
+                with file(profileDestFile, 'w') as modified:
+                    modified.write(line1 + "," + value + "\n" + rest)
+            except IOError as e:  # catch all exceptions and report back an error
+                return "I/O Error(%d) updating profile: %s " % (e.errno, e.strerror)
+            else:
+                self.activeProfileName = self.readProfileName()
+                self.controlSettingsChanged()  # the profile name is sent with the control settings
+                if cs['mode'] is not 'p':
+                    cs['mode'] = 'p'
+                    self.commandQueue.send([('mode', 'p')])
+                    self.logMessage("Notification: Profile mode enabled")
+                return "Profile successfully updated"
+        elif messageType == "programArduino":
+            self.loop.removeReader(self.serialReader)
+            self.serialReader.stop()
+            ser.close()  # close serial port before programming
+            # Arduino won't reset when serial port is not completely removed
+            self.ser = ser = self.serialReader = None
+            try:
+                programParameters = json.loads(value)
+                hexFile = programParameters['fileName']
+                boardType = programParameters['boardType']
+                restoreSettings = programParameters['restoreSettings']
+                restoreDevices = programParameters['restoreDevices']
+                programmer.programArduino(self.config, boardType, hexFile,
+                                          {'settings': restoreSettings, 'devices': restoreDevices})
+                self.logMessage("New program uploaded to Arduino, script will restart")
+            except json.JSONDecodeError:
+                self.logMessage("Error: cannot decode programming parameters: " + value)
+                self.logMessage("Restarting script without programming.")
+
+            # restart the script when done. This replaces this process with the new one
+            self.restart()
+        elif messageType == "refreshDeviceList":
+            self.deviceList['listState'] = ""  # invalidate local copy
+            self.stateVersions.changed('deviceList')
+            if value.find("readValues") != -1:
+                ser.write("d{r:1}")  # request installed devices
+                ser.write("h{u:-1,v:1}")  # request available, but not installed devices
+            else:
+                ser.write("d{}")  # request installed devices
+                ser.write("h{u:-1}")  # request available, but not installed devices
+        elif messageType == "getDeviceList":
+            return self.deviceListReply()
+        elif messageType == "getState":
+            # lcd, control settings, constants, variables and device list in one reply
+            # value is JSON with optional keys: fields (list of field names, defaults to all fields) and since (the
+            # state version of the last reply the client received, only fields that changed after it are included)
+            try:
+                query = json.loads(value) if value else {}
+            except json.JSONDecodeError:
+                self.logMessage("Error: invalid JSON parameter string received: " + value)
+                return
+            error = parameterError(query, ('since',), lists=('fields',))
+            if error is not None:
+                return error
+            fields = query.get('fields')
+            if fields is not None and not set(fields) <= set(self.stateFields):
+                return {'status': 1,
+                        'statusMessage': "Invalid field, valid fields are " + ", ".join(sorted(self.stateFields))}
+            for field in fields or self.stateFields:
+                if field in stateFieldPolls:
+                    self.poller.demand(stateFieldPolls[field])
+            return self.getState(fields, query.get('since'))
+        elif messageType == "getData":
+            # logged data of a time range, from all daily files of the current beer
+            # value is JSON with optional keys: from, to (seconds since epoch), columns (list of ids), maxPoints (> 0)
+            try:
+                query = json.loads(value) if value else {}
+            except json.JSONDecodeError:
+                self.logMessage("Error: invalid JSON parameter string received: " + value)
+                return
+            error = parameterError(query, ('from', 'to'), ('maxPoints',), ('columns',))
+            if error is not None:
+                return error
+            if query.get('maxPoints', 1) <= 0:
+                return {'status': 1, 'statusMessage': "Invalid maxPoints: %d" % query['maxPoints']}
+            if self.brewIndex is None:
+                return {'cols': [], 'rows': []}
+            else:
+                return self.brewIndex.query(query.get('from'), query.get('to'), query.get('columns'),
+                                            query.get('maxPoints'))
+        elif messageType == "getRecent":
+            # samples kept in memory, value is the time stamp of the last sample the client already has (optional)
+            try:
+                since = float(value) if value else None
+            except ValueError:
+                self.logMessage("Cannot convert time stamp '" + value + "' to float")
+                return
+            return brewpiSocketServer.RawJson(self.recentSamples.toJson(since))
+        elif messageType == "getRollup":
+            # aggregated data of the current beer
+            # value is JSON with keys: resolution (minute, hour or day) and optional from, to (seconds since epoch)
+            try:
+                query = json.loads(value) if value else {}
+            except json.JSONDecodeError:
+                self.logMessage("Error: invalid JSON parameter string received: " + value)
+                return
+            error = parameterError(query, ('from', 'to'))
+            if error is not None:
+                return error
+            rollups = self.dataLogger.rollups
+            if rollups is None:
+                return []
+            elif not isinstance(query.get('resolution', 'hour'), basestring) or \
+                    query.get('resolution', 'hour') not in rollups.buckets:
+                return {'status': 1, 'statusMessage': "Invalid resolution"}
+            else:
+                return rollups.get(query.get('resolution', 'hour'), query.get('from'), query.get('to'))
+        elif messageType == "exportData":
+            # writes the data of the current beer from the data store to a file in the www dir
+            # value is JSON with optional keys: format (json or csv, defaults to json), from, to (seconds since epoch)
+            try:
+                query = json.loads(value) if value else {}
+            except json.JSONDecodeError:
+                self.logMessage("Error: invalid JSON parameter string received: " + value)
+                return
+            error = parameterError(query, ('from', 'to'))
+            if error is not None:
+                return error
+            if query.get('format', 'json') not in ('json', 'csv'):
+                return {'status': 1, 'statusMessage': "Invalid format, valid formats are json, csv"}
+            return self.exportData(query.get('format', 'json'), query.get('from'), query.get('to'))
+        elif messageType in ("subscribe", "unsubscribe"):
+            # value is a JSON list of topics, messages are pushed on the session as the Arduino sends new data
+            # unsubscribe without a value unsubscribes from all topics of the chamber
+            if not conn.session:
+                return {'status': 1, 'statusMessage': "Subscribing is only possible in a session"}
+            try:
+                topics = json.loads(value) if value else None
+            except json.JSONDecodeError:
+                self.logMessage("Error: invalid JSON parameter string received: " + value)
+                return
+            if messageType == "unsubscribe" and topics is None:
+                topics = pushTopics
+            error = parameterError({'topics': topics}, lists=('topics',))
+            if error is not None:
+                return error
+            if not topics or not set(topics) <= set(pushTopics):
+                return {'status': 1, 'statusMessage': "Invalid topic, valid topics are " + ", ".join(pushTopics)}
+            topics = [self.topicPrefix + topic for topic in topics]
+            if messageType == "unsubscribe":
+                conn.unsubscribe(topics)
+            else:
+                conn.subscribe(topics)
+                for request in pollTopics:
+                    self.poller.reschedule(request)  # poll subscribed data at the fast rate from now on
+            return {'status': 0, 'topics': sorted(conn.topics)}
+        elif messageType == "serialStats":
+            # lines and bytes per line type, errors and round trip times of requests, serialStats=reset starts over
+            reply = self.serialStats.asDict()
+            if value == "reset":
+                reply = brewpiSocketServer.RawJson(json.dumps(reply))  # encode before the counters are reset
+                self.serialStats.reset()
+            return reply
+        elif messageType == "applyDevice":
+            try:
+                configStringJson = json.loads(value)  # load as JSON to check syntax
+            except json.JSONDecodeError:
+                self.logMessage("Error: invalid JSON parameter string received: " + value)
+                return
+            ser.write("U" + value)
+            self.deviceList['listState'] = ""  # invalidate local copy
+            self.stateVersions.changed('deviceList')
+        else:
+            self.logMessage("Error: Received invalid message on socket: " + message)
+
+    def readProfileName(self):
+        """
+        Returns the name of the active profile, which is stored in the header row of tempProfile.csv.
+        None when there is no profile.
+        """
+        profileFile = util.addSlash(self.config['scriptPath']) + 'settings/tempProfile.csv'
+        try:
+            with file(profileFile, 'r') as prof:
+                return prof.readline().split(",")[-1].rstrip("\n")
+        except IOError:
+            return None
+
+    def controlSettings(self):
+        """
+        Returns the control settings, with the data logging state and the name of the active profile added
+        """
+        settings = dict(self.cs)
+        if self.cs['mode'] == "p":
+            settings['profile'] = self.activeProfileName
+        settings['dataLogging'] = self.config['dataLogging']
+        return settings
+
+    def controlSettingsChanged(self):
+        """
+        Gives the control settings a new version and pushes them to the sessions subscribed to settings
+        """
+        self.stateVersions.changed('cs')
+        if self.subscribed('settings'):
+            self.publish('settings', {'cs': self.controlSettings()})
+
+    def deviceListReply(self):
+        if self.deviceList['listState'] in ["dh", "hd"]:
+            return dict(board=self.hwVersion.board,
+                        shield=self.hwVersion.shield,
+                        deviceList=self.deviceList,
+                        pinList=pinList.getPinList(self.hwVersion.board, self.hwVersion.shield))
+        else:
+            return "device-list-not-up-to-date"
+
+    def cachedReply(self, field, value):
+        """
+        Returns the cached JSON of a state field as reply to a socket message.
+
+        Params:
+        field: name of the field
+        value: value of the message. When it is JSON with an ifVersion, the reply is an object with the version of
+               the field and the field as 'value', or with notModified true when the field did not change after
+               ifVersion. ifVersion must be a number.
+        """
+        if not value:
+            return self.responseCache.get(field)
+        try:
+            query = json.loads(value)
+        except json.JSONDecodeError:
+            self.logMessage("Error: invalid JSON parameter string received: " + value)
+            return
+        error = parameterError(query, ('ifVersion',))
+        if error is not None:
+            return error
+        ifVersion = query.get('ifVersion')
+        version = self.stateVersions.versions[field]
+        if ifVersion is not None and version <= ifVersion:
+            return {'version': version, 'notModified': True}
+        return brewpiSocketServer.RawJson('{"version": %d, "value": %s}' % (version, self.responseCache.get(field)))
+
+    def exportData(self, fileFormat, start=None, end=None):
+        """
+        Writes the data of the current beer between start and end from the data store to <beerName>-export.json, in
+        the DataTable format of the chart files, or to <beerName>-export.csv, next to the data files in the www dir
+
+        Returns: the reply, with the name of the file relative to wwwPath
+        """
+        store = self.dataLogger.store
+        if store is None:
+            return {'status': 1, 'statusMessage': "No data is logged for this beer"}
+        self.dataLogger.flush()  # include the buffered rows
+        beerName = self.config['beerName']
+        fileName = 'data/' + beerName + '/' + beerName + '-export.' + fileFormat
+        if fileFormat == 'csv':
+            brewpiStore.exportCsv(store, util.addSlash(self.config['wwwPath']) + fileName, start, end)
+        else:
+            brewpiStore.exportDataTable(store, util.addSlash(self.config['wwwPath']) + fileName, start, end)
+        return {'status': 0, 'statusMessage': "Exported data to " + fileName, 'fileName': fileName}
+
+    def getState(self, fields=None, since=None):
+        """
+        Returns the fields of the state as one JSON object, with the state version as 'version' and the version of
+        each field in 'versions'.
+
+        Params:
+        fields: names of the fields to include, None for all fields
+        since: state version the client already has, fields that did not change after it are left out
+        """
+        stateVersions = self.stateVersions
+        if fields is None:
+            fields = sorted(self.stateFields)
+        state = ['"version": ' + json.dumps(stateVersions.version),
+                 '"versions": ' + json.dumps(dict([(field, stateVersions.versions[field]) for field in fields]))]
+        for field in stateVersions.changedSince(since, fields):
+            state.append(json.dumps(field) + ': ' + self.responseCache.get(field))
+        return brewpiSocketServer.RawJson('{' + ', '.join(state) + '}')
+
+    def readSerial(self):
+        """
+        Processes the lines the serial reader thread has received
+        """
+        try:
+            with self.stats.stage('serialRead'):
+                lines = self.serialReader.receivedLines()
+        except Exception as e:  # the error that stopped the reader thread, like serial.SerialException
+            self.serialFailed(e)
+            return
+        for line in lines:
+            self.processLine(line)
+
+    def temperaturesReceived(self, data):
+        # print it to stdout
+        if self.outputTemperature:
+            print time.strftime("%b %d %Y %H:%M:%S  ") + ("" if self.id is None else "[%s] " % self.id) + data
+
+        # store time of last new data for interval check
+        self.prevDataTime = time.time()
+
+        # process temperature line
+        newData = json.loads(data)
+        # copy/rename keys
+        for key in newData:
+            self.prevTempJson[renameTempKey(key)] = newData[key]
+
+        newRow = self.prevTempJson
+        self.publish('temps', dict(newRow, Time=self.prevDataTime))
+        if self.prevDataTime - self.prevLoggedTime < float(self.config['interval']) - serialCheckInterval:
+            return  # polled faster than the log interval because clients are watching, only log every interval
+        self.prevLoggedTime = self.prevDataTime
+
+        # keep recent samples in memory for getRecent, also when logging is paused
+        self.recentSamples.append(newRow, self.prevDataTime)
+
+        if self.config['dataLogging'] == 'paused' or self.config['dataLogging'] == 'stopped':
+            return  # skip if logging is paused or stopped
+
+        # add to JSON and CSV files, written when the buffer of the data logger is flushed
+        with self.stats.stage('addRow'):
+            self.dataLogger.addRow(newRow, self.prevDataTime)
+
+    def debugMessageReceived(self, data):
+        try:
+            expandedMessage = expandLogMessage.expandLogMessage(data)
+            self.logMessage("Arduino debug message: " + expandedMessage)
+            self.publish('debug', expandedMessage)
+        except Exception, e:  # catch all exceptions, because out of date file could cause errors
+            self.logMessage("Error while expanding log message '" + data + "'" + str(e))
+
+    def lcdTextReceived(self, data):
+        lcdTextReplaced = data.replace('\xb0', '&deg')  # replace degree sign with &deg
+        newLcdText = json.loads(lcdTextReplaced)
+        if self.stateVersions.update('lcd', self.lcdText, newLcdText):
+            self.publish('lcd', newLcdText)
+        self.lcdText = newLcdText
+
+    def controlConstantsReceived(self, data):
+        newCc = json.loads(data)
+        self.commandQueue.echoReceived('c', newCc)
+        if self.stateVersions.update('cc', self.cc, newCc):
+            self.publish('settings', {'cc': newCc})
+        self.cc = newCc
+
+    def controlSettingsReceived(self, data):
+        # do not print this to the log file. This is requested continuously.
+        newCs = json.loads(data)
+        self.commandQueue.echoReceived('s', newCs)
+        changed = self.cs != newCs
+        self.cs = newCs
+        if changed:
+            self.controlSettingsChanged()
+
+    def controlVariablesReceived(self, data):
+        newCv = json.loads(data)
+        if self.stateVersions.update('cv', self.cv, newCv):
+            self.publish('settings', {'cv': newCv})
+        self.cv = newCv
+
+    def versionReceived(self, data):
+        pass  # version number received. Do nothing, just ignore
+
+    def availableDevicesReceived(self, data):
+        self.deviceList['available'] = json.loads(data)
+        oldListState = self.deviceList['listState']
+        self.deviceList['listState'] = oldListState.strip('h') + "h"
+        self.stateVersions.changed('deviceList')
+        self.logMessage("Available devices received: " + str(self.deviceList['available']))
+
+    def installedDevicesReceived(self, data):
+        self.deviceList['installed'] = json.loads(data)
+        oldListState = self.deviceList['listState']
+        self.deviceList['listState'] = oldListState.strip('d') + "d"
+        self.stateVersions.changed('deviceList')
+        self.logMessage("Installed devices received: " + str(self.deviceList['installed']))
+
+    def deviceUpdated(self, data):
+        self.logMessage("Device updated to: " + data)
+
+    def processLine(self, line):
+        """
+        Passes a line received from the Arduino to the handler for its type, with the type and colon removed
+        """
+        self.serialStats.received(line)
+        handler = self.lineHandlers.get(line[0])
+        if handler is None:
+            self.serialStats.unknownLines += 1
+            self.logMessage("Cannot process line from Arduino: " + line)
+            return
+        try:
+            with self.stats.stage('line' + line[0]):  # mostly decoding the JSON of the line
+                handler(line[2:])
+        except json.decoder.JSONDecodeError, e:
+            self.serialStats.decodeErrors[line[0]] += 1
+            self.logMessage("JSON decode error: %s" % str(e))
+            self.logMessage("Line received was: " + line)
+        except UnicodeDecodeError as e:
+            self.serialStats.decodeErrors[line[0]] += 1
+            self.logMessage("Unicode decode error: %s" % str(e))
+            self.logMessage("Line received was: " + line)
+
+    def pollArduino(self, request):
+        """
+        Sends a request for new data to the Arduino, called by the poller: l for the LCD text, s for the control
+        settings, v for the control variables and t for the temperatures
+        """
+        if request == 't' and self.prevDataTime and \
+                time.time() - self.prevDataTime > 3 * float(self.config['interval']):
+            # something is wrong: arduino is not responding to data requests
+            self.logMessage("Error: Arduino is not responding to new data requests")
+        self.ser.write(request)
+
+    def isWatched(self, request):
+        """
+        Returns whether a session subscribed to the data of a poll request
+        """
+        for topic in pollTopics[request]:
+            if self.subscribed(topic):
+                return True
+        return False
+
+    def settingEcho(self, name):
+        """
+        Returns the request that makes the Arduino send a setting back: s for control settings, c for control
+        constants
+        """
+        return 's' if name in self.cs else 'c'
+
+    def waitConfirmed(self, timeout):
+        """
+        Returns a reply that is sent when the Arduino confirmed the settings sent until now, or after timeout seconds
+        with the settings that were not confirmed
+        """
+        reply = brewpiSocketServer.DeferredReply()
+
+        def confirmed(notConfirmed):
+            if notConfirmed:
+                reply.resolve({'status': 1, 'statusMessage': "Arduino did not confirm all settings",
+                               'notConfirmed': notConfirmed})
+            else:
+                reply.resolve({'status': 0})
+
+        self.commandQueue.wait(timeout, confirmed)
+        return reply
+
+    def checkProfile(self):
+        # Check for update from temperature profile
+        cs = self.cs
+        if cs['mode'] == 'p':
+            with self.stats.stage('getNewTemp'):
+                newTemp = temperatureProfile.getNewTemp(self.config['scriptPath'])
+            if newTemp != cs['beerSet']:
+                cs['beerSet'] = newTemp
+                self.controlSettingsChanged()
+                if self.cc['tempSetMin'] < newTemp < self.cc['tempSetMax']:
+                    # if temperature has to be updated send settings to arduino
+                    self.commandQueue.send([('beerSet', cs['beerSet'])])
+                elif newTemp is None:
+                    # temperature control disabled by profile
+                    self.logMessage("Temperature control disabled by empty cell in profile.")
+                    # send as high negative value that will result in INT_MIN on Arduino
+                    self.commandQueue.send([('beerSet', -99999)])
+
+    def checkNewDay(self):
+        """
+        Starts a new JSON file when it is a new day and schedules the next check just after midnight
+        """
+        self.startNewDay()
+        # mktime turns day + 1 into the first day of the next month when needed and takes daylight saving into account
+        now = time.localtime()
+        midnight = time.mktime((now.tm_year, now.tm_mon, now.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+        self.loop.callAt(midnight + 0.1, self.checkNewDay)
+
+    def startNewDay(self):
+        """
+        Starts a new JSON file when logging is active and the day changed since the last check
+        """
+        config = self.config
+        if config['dataLogging'] == 'active':
+            # Check whether it is a new day
+            self.lastDay = self.day
+            self.day = time.strftime("%Y-%m-%d")
+            if self.lastDay != self.day:
+                self.logMessage("Notification: New day, dropping data table and creating new JSON file.")
+                jsonFileName = config['beerName'] + '/' + config['beerName'] + '-' + self.day
+                self.localJsonFileName = util.addSlash(config['scriptPath']) + 'data/' + jsonFileName + '.json'
+                self.wwwJsonFileName = util.addSlash(config['wwwPath']) + 'data/' + jsonFileName + '.json'
+                # create new empty json file
+                self.dataLogger.newChartFile(self.localJsonFileName, self.wwwJsonFileName)
@@ -0,0 +1,165 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+from collections import OrderedDict
+
+import simplejson as json
+
+
+def valuesMatch(sent, echoed):
+    """
+    Returns whether the value the Arduino echoed is the value that was sent. Numbers are stored as fixed point on
+    the Arduino, so they only have to be close.
+    """
+    numbers = (int, long, float)
+    if isinstance(sent, numbers) and isinstance(echoed, numbers):
+        return abs(sent - echoed) < 0.01
+    return sent == echoed
+
+
+class Waiter:
+    """
+    A client waiting for the confirmation of the settings up to sequence
+    """
+
+    def __init__(self, sequence, callback):
+        self.sequence = sequence
+        self.callback = callback
+        self.timer = None
+
+
+class CommandQueue:
+    """
+    Sends settings to the Arduino with the j command. Settings that are sent shortly after each other are combined
+    in one command, in which a later value of a setting replaces the earlier one, and commands are written at most
+    once every minInterval seconds.
+
+    After each command, the control settings and/or constants are requested, depending on the settings in the
+    command. A setting is confirmed when the reply shows its new value. Clients can wait for the confirmation of the
+    settings sent until then.
+    """
+
+    def __init__(self, loop, write, echoRequest, minInterval=0.25):
+        """
+        Params:
+        loop: brewpiEventLoop.EventLoop to schedule the writes on
+        write: function that writes a string to the Arduino
+        echoRequest: function called with the name of a setting, returns the request that makes the Arduino send it:
+                     's' for the control settings, 'c' for the control constants
+        minInterval: minimum number of seconds between two commands
+        """
+        self.loop = loop
+        self.write = write
+        self.echoRequest = echoRequest
+        self.minInterval = float(minInterval)
+        self.sequence = 0  # number of the last send call
+        self.pending = OrderedDict()  # setting: (value, sequence), not written yet
+        self.unconfirmed = {}  # setting: (value, sequence), written but not confirmed by the Arduino yet
+        self.mismatches = {}  # setting: value the Arduino echoed, when it was not the value that was sent
+        self.waiters = []
+        self.flushTimer = None
+        self.lastWrite = 0.0
+
+    def send(self, settings):
+        """
+        Queues settings to be sent to the Arduino
+
+        Params:
+        settings: list of (name, value) pairs, or a dict. The order of the names is kept.
+
+        Returns: sequence number of the settings, which is confirmed when all settings up to it are confirmed
+        """
+        if isinstance(settings, dict):
+            settings = settings.items()
+        self.sequence += 1
+        for name, value in settings:
+            self.pending.pop(name, None)  # move the setting to the end, so settings are applied in the order sent
+            self.pending[name] = (value, self.sequence)
+            self.mismatches.pop(name, None)
+        if self.flushTimer is None:
+            delay = max(self.lastWrite + self.minInterval - time.time(), 0)
+            self.flushTimer = self.loop.callLater(delay, self.flush)
+        return self.sequence
+
+    def flush(self):
+        """
+        Writes the pending settings as one command, followed by the requests for their new values
+        """
+        self.flushTimer = None
+        if not self.pending:
+            return
+        settings = [json.dumps(name) + ': ' + json.dumps(value) for name, (value, seq) in self.pending.items()]
+        self.write('j{' + ', '.join(settings) + '}')
+        for request in sorted(set([self.echoRequest(name) for name in self.pending])):
+            self.write(request)
+        self.unconfirmed.update(self.pending)
+        self.pending = OrderedDict()
+        self.lastWrite = time.time()
+
+    def echoReceived(self, request, values):
+        """
+        Confirms the written settings in a reply of the Arduino
+
+        Params:
+        request: the request the reply belongs to, 's' or 'c'
+        values: dict of the settings in the reply
+        """
+        for name, (value, seq) in self.unconfirmed.items():
+            if self.echoRequest(name) != request:
+                continue
+            if name not in values or valuesMatch(value, values[name]):
+                # settings the Arduino does not send back cannot be checked, they count as confirmed
+                del self.unconfirmed[name]
+                self.mismatches.pop(name, None)
+            else:
+                self.mismatches[name] = values[name]  # the Arduino did not apply it (yet), checked again next reply
+        self.checkWaiters()
+
+    def confirmedUpTo(self, sequence):
+        for value, seq in self.pending.values() + self.unconfirmed.values():
+            if seq <= sequence:
+                return False
+        return True
+
+    def wait(self, timeout, callback):
+        """
+        Calls callback when all settings sent until now are confirmed, or after timeout seconds.
+        callback is called with a dict of the settings that were not confirmed: the value the Arduino sent back, or
+        None when it did not reply. The dict is empty when all settings were confirmed.
+        Settings that are replaced by a later send do not have to be confirmed.
+        """
+        if self.confirmedUpTo(self.sequence):
+            callback({})
+            return
+        waiter = Waiter(self.sequence, callback)
+        waiter.timer = self.loop.callLater(timeout, self.timeout, waiter)
+        self.waiters.append(waiter)
+
+    def checkWaiters(self):
+        for waiter in list(self.waiters):
+            if self.confirmedUpTo(waiter.sequence):
+                self.waiters.remove(waiter)
+                waiter.timer.cancel()
+                waiter.callback({})
+
+    def timeout(self, waiter):
+        self.waiters.remove(waiter)
+        notConfirmed = {}
+        for name, (value, seq) in self.pending.items() + self.unconfirmed.items():
+            if seq <= waiter.sequence:
+                notConfirmed[name] = self.mismatches.get(name)
+        waiter.callback(notConfirmed)
@@ -0,0 +1,87 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+import os
+import threading
+import Queue
+
+import BrewPiUtil as util
+
+
+def compressFile(srcFileName, gzFileName, size=None):
+    """
+    Writes a gzip compressed copy of a file. The copy is written to a temporary file first and then renamed,
+    so the web server never serves a half written file.
+
+    Params:
+    srcFileName: file to compress
+    gzFileName: path of the compressed file
+    size: number of bytes to compress, None for the whole file. Use it for files that are still being appended to.
+    """
+    tmpFileName = gzFileName + '.tmp'
+    with open(srcFileName, 'rb') as src:
+        gzFile = gzip.open(tmpFileName, 'wb', 9)
+        try:
+            remaining = size
+            while remaining is None or remaining > 0:
+                chunk = src.read(65536 if remaining is None else min(65536, remaining))
+                if not chunk:
+                    break
+                gzFile.write(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+        finally:
+            gzFile.close()
+    if os.name == 'nt' and os.path.exists(gzFileName):
+        os.remove(gzFileName)  # rename does not replace files on Windows
+    os.rename(tmpFileName, gzFileName)
+
+
+class BackgroundCompressor(threading.Thread):
+    """
+    Compresses files in a background thread, so the main loop does not wait for it
+    """
+
+    def __init__(self):
+        threading.Thread.__init__(self, name='BackgroundCompressor')
+        self.daemon = True
+        self.queue = Queue.Queue()
+        self.start()
+
+    def compress(self, srcFileName, gzFileName, size=None):
+        """
+        Adds a file to the queue of files to compress, see compressFile for the parameters
+        """
+        self.queue.put((srcFileName, gzFileName, size))
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            srcFileName, gzFileName, size = job
+            try:
+                compressFile(srcFileName, gzFileName, size)
+            except (IOError, OSError) as e:
+                util.logMessage("Error compressing %s: %s" % (srcFileName, str(e)))
+
+    def stop(self):
+        """
+        Finishes the files in the queue and stops the thread
+        """
+        self.queue.put(None)
+        self.join()
@@ -0,0 +1,117 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime
+import os
+import time
+
+# order of the values in a line of the CSV file, after the time stamp
+csvColumns = ('BeerTemp', 'BeerSet', 'BeerAnn', 'FridgeTemp', 'FridgeSet', 'FridgeAnn', 'State', 'RoomTemp')
+
+
+def csvRow(row, now=None):
+    """
+    Formats a data row as a line for the CSV file, for example:
+    Sep 26 2013 00:01:00;18.96;19.0;None;19.94;19.6;None;1;20.5
+
+    Params:
+    row: dict with the keys in csvColumns
+    now: datetime of the row, defaults to the current time
+
+    Returns: the line as a string, including the line ending
+    """
+    if now is None:
+        now = datetime.now()
+    return now.strftime("%b %d %Y %H:%M:%S;") + ';'.join([str(row[key]) for key in csvColumns]) + '\n'
+
+
+class CsvFileWriter:
+    """
+    Keeps the CSV file of a brew open and appends lines to it
+    """
+
+    def __init__(self, csvFileName):
+        self.fileName = csvFileName
+        self.file = open(csvFileName, 'ab', 0)  # unbuffered, every write goes to the file directly
+        self.file.seek(0, os.SEEK_END)
+        self.offset = self.file.tell()
+
+    def addRow(self, row, now=None):
+        """
+        Appends a single data row to the file, see csvRow for the parameters
+        """
+        return self.write([csvRow(row, now)])
+
+    def write(self, csvRows):
+        """
+        Appends already formatted lines to the file with a single write call.
+
+        Params:
+        csvRows: list of strings, formatted with csvRow
+
+        Returns:
+        offset: position in the file where the data was written
+        data: the string that was written
+        """
+        data = ''.join(csvRows)
+        offset = self.offset
+        if data:
+            self.file.write(data)
+            self.offset += len(data)
+        return offset, data
+
+    def sync(self):
+        """
+        Forces the data written so far to disk
+        """
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def iterRows(csvFile):
+    """
+    Streaming parser for the CSV file of a brew, reads the file line by line.
+    Incomplete lines, for example at the end of the file after a crash, are skipped.
+
+    Params:
+    csvFile: file object opened for reading
+
+    Yields (timeStamp, row dict) tuples, with the time stamp in seconds since epoch
+    """
+    for line in csvFile:
+        if not line.endswith('\n'):
+            continue  # last line was not written completely
+        fields = line.rstrip('\r\n').split(';')
+        if len(fields) != len(csvColumns) + 1:
+            continue
+        try:
+            timeStamp = time.mktime(time.strptime(fields[0], "%b %d %Y %H:%M:%S"))
+        except ValueError:
+            continue
+        row = {}
+        for key, value in zip(csvColumns, fields[1:]):
+            if value in ('None', ''):
+                row[key] = None
+            elif key in ('BeerAnn', 'FridgeAnn'):
+                row[key] = value
+            else:
+                try:
+                    row[key] = int(value) if key == 'State' else float(value)
+                except ValueError:
+                    row[key] = None
+        yield timeStamp, row
@@ -0,0 +1,235 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime
+import os
+import re
+import time
+
+import brewpiJson
+import brewpiCsv
+import brewpiMirror
+import brewpiStore
+import brewpiDecimate
+import brewpiRollup
+import brewpiStats
+
+rollupSaveInterval = 3600  # seconds between saving the aggregates to disk
+
+
+class DataLogger:
+    """
+    Writes data rows to the JSON file of the day, the CSV file and data store of the beer and the decimated charts.
+
+    Rows are buffered in memory and written in one go when flushRows rows are buffered or when the oldest buffered
+    row is flushInterval seconds old. After writing, the local files can be synced to disk with fsync, depending on
+    the fsync policy:
+    'never': leave it to the operating system
+    'flush': sync after every flush
+    a number N: sync when at least N rows have been written since the last sync
+    """
+
+    def __init__(self, flushInterval=0.0, flushRows=1, fsync='never', compressor=None, stats=None):
+        """
+        Params:
+        flushInterval, flushRows, fsync: buffer and fsync policy, see above
+        compressor: brewpiCompress.BackgroundCompressor. When given, a gzip compressed copy of each completed
+                    JSON file and a snapshot of the CSV file are published in the www dir when a new file is started.
+                    The snapshot is named after the day of its last row, like beer-2013-10-05.csv.gz, so the web
+                    server does not serve it instead of the CSV file that is still being appended to.
+        stats: brewpiStats.LoopStats the time spent writing each kind of file is added to
+        """
+        self.stats = stats if stats is not None else brewpiStats.LoopStats()
+        self.flushInterval = float(flushInterval)
+        self.flushRows = max(int(flushRows), 1)
+        if fsync in ('never', 'flush'):
+            self.fsyncRows = None if fsync == 'never' else 0
+        else:
+            self.fsyncRows = int(fsync)
+        self.compressor = compressor
+        self.rows = []  # buffered (timeStamp, row) tuples
+        self.bufferedSince = None  # time the oldest buffered row was added
+        self.unsyncedRows = 0
+        self.rowsWritten = 0  # since the script started, for the metrics
+        self.chartFile = None  # brewpiJson.ChartFileWriter for the JSON file of today
+        self.chartMirror = None  # brewpiMirror.WwwMirror publishing the JSON file to the www dir
+        self.csvFile = None  # brewpiCsv.CsvFileWriter for the CSV file of the current beer
+        self.csvMirror = None  # brewpiMirror.WwwMirror publishing the CSV file to the www dir
+        self.csvRowTime = None  # time of the last row written to the CSV file
+        self.store = None  # brewpiStore.BrewStore with all data of the current beer
+        self.decimatedCharts = None  # brewpiDecimate.DecimatedCharts, chart files of the whole beer
+        self.rollups = None  # brewpiRollup.RollupEngine with aggregates per minute, hour and day
+        self.rollupsSaved = time.time()
+
+    def newChartFile(self, jsonFileName, wwwFileName):
+        """
+        Creates a new empty JSON file, keeps it open for appending data rows and mirrors it to the www dir.
+        Buffered rows are written to the previous file first.
+        """
+        self.flush()
+        if self.chartFile is not None:
+            self.chartFile.close()
+            self.chartMirror.close()
+            if self.compressor is not None:
+                # the previous file is complete, publish a compressed copy that the web server can serve as is
+                self.compressor.compress(self.chartFile.fileName, self.chartMirror.wwwFileName + '.gz')
+                if self.csvFile is not None and self.csvRowTime is not None:
+                    self.snapshotCsv()
+        brewpiJson.newEmptyFile(jsonFileName)
+        self.chartFile = brewpiJson.ChartFileWriter(jsonFileName)
+        self.chartMirror = brewpiMirror.WwwMirror(jsonFileName, wwwFileName)
+
+    def startBeer(self, dataPath, wwwDataPath, beerName, csvFileName, wwwCsvFileName, resolutions):
+        """
+        Opens the CSV file, data store and decimated charts of a beer. Buffered rows are written to the previous beer.
+
+        Params:
+        dataPath: data directory of the beer
+        wwwDataPath: data directory of the beer in the www dir
+        beerName: name of the beer
+        csvFileName: path of the CSV file
+        wwwCsvFileName: path where the CSV file is published in the www dir
+        resolutions: list of bucket sizes in seconds for the decimated charts
+        """
+        self.flush()
+        self.closeBeer()
+        self.csvFile = brewpiCsv.CsvFileWriter(csvFileName)
+        self.csvMirror = brewpiMirror.WwwMirror(csvFileName, wwwCsvFileName)
+        self.csvRowTime = None
+        if os.path.exists(wwwCsvFileName + '.gz'):
+            os.remove(wwwCsvFileName + '.gz')  # undated snapshot of older versions, would be served instead of the CSV
+        # Binary columnar store of all data of the beer, from which JSON and CSV files can be exported
+        self.store = brewpiStore.BrewStore(dataPath + 'store')
+        self.decimatedCharts = brewpiDecimate.DecimatedCharts(dataPath, wwwDataPath, beerName, resolutions)
+        self.rollups = brewpiRollup.RollupEngine(dataPath + 'rollup.json')
+
+    def addRow(self, row, timeStamp=None):
+        """
+        Adds a data row to the buffer and writes the buffer when it is full.
+        The aggregates are updated right away.
+
+        Params:
+        row: dict with the data row, a copy is buffered
+        timeStamp: time of the row in seconds since epoch, defaults to now
+        """
+        if timeStamp is None:
+            timeStamp = time.time()
+        if not self.rows:
+            self.bufferedSince = time.time()
+        self.rows.append((timeStamp, dict(row)))
+        if self.rollups is not None:
+            self.rollups.add(row, timeStamp)
+        self.flushIfDue()
+
+    def flushIfDue(self):
+        """
+        Writes the buffer when enough rows are buffered or the oldest row has been buffered long enough.
+        Should be called regularly, also when no new rows are added.
+        """
+        if self.rows and (len(self.rows) >= self.flushRows or
+                          time.time() - self.bufferedSince >= self.flushInterval):
+            self.flush()
+        if self.rollups is not None and time.time() - self.rollupsSaved >= rollupSaveInterval:
+            self.rollups.save()
+            self.rollupsSaved = time.time()
+
+    def flush(self):
+        """
+        Writes all buffered rows to the files and publishes them in the www dir
+        """
+        if not self.rows:
+            return
+        rows = self.rows
+        self.rows = []
+        stats = self.stats
+        if self.chartFile is not None:
+            with stats.stage('jsonWrite'):
+                offset, data = self.chartFile.write([brewpiJson.jsonRow(row, datetime.fromtimestamp(t))
+                                                     for t, row in rows])
+            with stats.stage('wwwCopy'):
+                self.chartMirror.write(offset, data)
+                self.chartMirror.publish()
+        if self.csvFile is not None:
+            self.csvRowTime = rows[-1][0]
+            with stats.stage('csvWrite'):
+                offset, data = self.csvFile.write([brewpiCsv.csvRow(row, datetime.fromtimestamp(t))
+                                                   for t, row in rows])
+            with stats.stage('wwwCopy'):
+                self.csvMirror.write(offset, data)
+                self.csvMirror.publish()
+        with stats.stage('storeWrite'):
+            for t, row in rows:
+                if self.store is not None:
+                    self.store.append(row, t)
+                if self.decimatedCharts is not None:
+                    self.decimatedCharts.addRow(row, t)
+
+        self.unsyncedRows += len(rows)
+        self.rowsWritten += len(rows)
+        if self.fsyncRows is not None and self.unsyncedRows >= self.fsyncRows:
+            with stats.stage('fsync'):
+                self.sync()
+
+    def snapshotCsv(self):
+        """
+        Publishes a gzip compressed copy of the CSV file as it is now, named after the day of its last row, and
+        removes the snapshots of earlier days
+        """
+        base = os.path.splitext(self.csvMirror.wwwFileName)[0]
+        gzFileName = base + time.strftime('-%Y-%m-%d', time.localtime(self.csvRowTime)) + '.csv.gz'
+        self.compressor.compress(self.csvFile.fileName, gzFileName, self.csvFile.offset)
+        directory, name = os.path.split(base)
+        snapshot = re.compile(re.escape(name) + r'-\d{4}-\d{2}-\d{2}\.csv\.gz$')
+        for fileName in os.listdir(directory):
+            if snapshot.match(fileName) and os.path.join(directory, fileName) != gzFileName:
+                os.remove(os.path.join(directory, fileName))
+
+    def sync(self):
+        """
+        Forces the local files to be written to disk
+        """
+        for writer in (self.chartFile, self.csvFile):
+            if writer is not None:
+                writer.sync()
+        if self.store is not None:
+            self.store.flush()
+        self.unsyncedRows = 0
+
+    def closeBeer(self):
+        if self.csvFile is not None:
+            self.csvFile.close()
+            self.csvMirror.close()
+            self.store.close()
+            self.decimatedCharts.close()
+            self.rollups.save()
+            self.csvFile = None
+            self.csvMirror = None
+            self.store = None
+            self.decimatedCharts = None
+            self.rollups = None
+
+    def close(self):
+        """
+        Writes the buffered rows and closes all files
+        """
+        self.flush()
+        if self.fsyncRows is not None:
+            self.sync()
+        if self.chartFile is not None:
+            self.chartFile.close()
+            self.chartMirror.close()
+            self.chartFile = None
+        self.closeBeer()
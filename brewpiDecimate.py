@@ -0,0 +1,153 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime
+import os
+
+import brewpiJson
+import brewpiMirror
+
+# the series of which the peaks are preserved when decimating
+decimatedKeys = ('BeerTemp', 'FridgeTemp')
+
+
+class MinMaxDecimator:
+    """
+    Reduces data rows to a few rows per time bucket, while keeping the peaks in the chart.
+    For each bucket the samples with the minimum and maximum value of each decimated series are kept, in time order.
+    Only the current extremes are stored, so adding a row takes constant time and memory.
+    """
+
+    def __init__(self, bucketSeconds, keys=decimatedKeys):
+        """
+        Params:
+        bucketSeconds: length of a bucket in seconds
+        keys: the series of which the minimum and maximum are kept
+        """
+        self.bucketSeconds = bucketSeconds
+        self.keys = keys
+        self.bucket = None
+        self.first = None  # first sample in the bucket, kept when all decimated values are missing
+        self.extremes = {}  # key: [(value, timeStamp, row) of minimum, same for maximum]
+
+    def add(self, row, timeStamp):
+        """
+        Adds a data row.
+
+        Params:
+        row: dict with the data row
+        timeStamp: time of the row in seconds since epoch
+
+        Returns:
+        list of (timeStamp, row) tuples of the bucket that was completed by this row, empty if it is not complete yet
+        """
+        bucket = int(timeStamp // self.bucketSeconds)
+        completed = []
+        if bucket != self.bucket:
+            completed = self.flush()
+            self.bucket = bucket
+        sample = (timeStamp, dict(row))
+        if self.first is None:
+            self.first = sample
+        for key in self.keys:
+            value = row.get(key)
+            if value is None:
+                continue
+            extremes = self.extremes.get(key)
+            if extremes is None:
+                self.extremes[key] = [(value, ) + sample, (value, ) + sample]
+            elif value < extremes[0][0]:
+                extremes[0] = (value, ) + sample
+            elif value > extremes[1][0]:
+                extremes[1] = (value, ) + sample
+        return completed
+
+    def flush(self):
+        """
+        Ends the current bucket.
+
+        Returns:
+        list of (timeStamp, row) tuples that represent the bucket
+        """
+        samples = {}
+        for extremes in self.extremes.values():
+            for value, timeStamp, row in extremes:
+                samples[timeStamp] = row
+        if not samples and self.first is not None:
+            samples[self.first[0]] = self.first[1]
+        self.first = None
+        self.extremes = {}
+        return sorted(samples.items())
+
+
+class DecimatedCharts:
+    """
+    Maintains a chart file for each resolution with the decimated data of the whole brew.
+    The files are stored in a 'decimated' sub directory of the data directory of the beer and mirrored to the www dir.
+    """
+
+    def __init__(self, dataPath, wwwDataPath, beerName, resolutions):
+        """
+        Params:
+        dataPath: data directory of the beer
+        wwwDataPath: data directory of the beer in the www dir
+        beerName: name of the beer
+        resolutions: list of bucket sizes in seconds
+        """
+        self.charts = []
+        localDir = os.path.join(dataPath, 'decimated')
+        wwwDir = os.path.join(wwwDataPath, 'decimated')
+        for path in [localDir, wwwDir]:
+            if not os.path.exists(path):
+                os.makedirs(path)
+                os.chmod(path, 0775)  # give group all permissions
+        for seconds in resolutions:
+            fileName = "%s-%ds.json" % (beerName, seconds)
+            writer = brewpiJson.ChartFileWriter(os.path.join(localDir, fileName))
+            mirror = brewpiMirror.WwwMirror(writer.fileName, os.path.join(wwwDir, fileName))
+            self.charts.append((MinMaxDecimator(seconds), writer, mirror))
+
+    def addRow(self, row, timeStamp):
+        """
+        Adds a data row to all resolutions. Files are only written when a bucket is completed.
+        """
+        for decimator, writer, mirror in self.charts:
+            writeSamples(writer, mirror, decimator.add(row, timeStamp))
+
+    def close(self):
+        """
+        Writes the incomplete buckets and closes the files. When the script continues logging the beer within the same
+        bucket, that bucket is written again for the rows after the restart, which adds a few samples to the chart
+        instead of losing the peaks before the restart.
+        """
+        for decimator, writer, mirror in self.charts:
+            writeSamples(writer, mirror, decimator.flush())
+            writer.close()
+            mirror.close()
+        self.charts = []
+
+
+def writeSamples(writer, mirror, samples):
+    """
+    Appends the samples of a bucket to a chart file and its copy in the www dir
+
+    Params:
+    samples: list of (timeStamp, row) tuples, as returned by MinMaxDecimator
+    """
+    if samples:
+        offset, data = writer.write([brewpiJson.jsonRow(r, datetime.fromtimestamp(t)) for t, r in samples])
+        mirror.write(offset, data)
+        mirror.publish()
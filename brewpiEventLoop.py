@@ -0,0 +1,254 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+import errno
+import heapq
+import itertools
+import math
+import os
+import select
+import socket
+import time
+
+pollInterval = 0.05  # seconds between checks of readers that cannot be waited for with select
+
+
+class Timer:
+    """
+    A callback scheduled on the event loop. Returned by callLater and callEvery, so it can be cancelled.
+    """
+
+    def __init__(self, when, callback, args, interval=None, relative=True):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.interval = interval  # repeat every interval seconds, None to run once
+        self.relative = relative  # scheduled with a delay instead of at a time of day, moves along with clock steps
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class EventLoop:
+    """
+    Waits until a socket or serial port can be read, a socket can be written or a timer is due and runs the
+    callbacks for it. Uses poll where it is available and select otherwise.
+
+    select on Windows only works for sockets. Other readers, like the serial port, are given a ready function and
+    are checked every pollInterval seconds instead.
+    """
+
+    def __init__(self, stats=None):
+        """
+        Params:
+        stats: brewpiStats.LoopStats that the time spent waiting and running callbacks is added to, None to not time
+        """
+        self.stats = stats
+        self.readers = {}  # file descriptor: (file object, callback)
+        self.writers = {}  # file descriptor: (file object, callback)
+        self.polledReaders = {}  # id of file object: (ready function, callback), for readers select cannot wait for
+        self.timers = []  # heap of (time, sequence number, Timer)
+        self.sequence = itertools.count()  # keeps timers that are due at the same time in the order they were added
+        self.poller = select.poll() if hasattr(select, 'poll') else None
+        self.running = False
+        self.lastTime = time.time()  # to notice the clock being set back
+
+    def addReader(self, fileObj, callback, ready=None):
+        """
+        Calls callback without arguments every time fileObj has data to read.
+
+        Params:
+        fileObj: socket or file like object with a fileno() method
+        callback: function to call
+        ready: function that returns whether fileObj has data. Used instead of select when select does not support
+               fileObj, which is the case for anything but sockets on Windows.
+        """
+        if ready is not None and os.name == 'nt' and not isinstance(fileObj, socket.socket):
+            self.polledReaders[id(fileObj)] = (ready, callback)
+            return
+        fd = fileObj.fileno()
+        self.readers[fd] = (fileObj, callback)
+        self.register(fd)
+
+    def removeReader(self, fileObj):
+        if id(fileObj) in self.polledReaders:
+            del self.polledReaders[id(fileObj)]
+            return
+        for fd, (reader, callback) in self.readers.items():
+            if reader is fileObj:
+                del self.readers[fd]
+                self.register(fd)
+
+    def addWriter(self, sock, callback):
+        """
+        Calls callback without arguments every time sock can be written without blocking
+        """
+        fd = sock.fileno()
+        self.writers[fd] = (sock, callback)
+        self.register(fd)
+
+    def removeWriter(self, sock):
+        for fd, (writer, callback) in self.writers.items():
+            if writer is sock:
+                del self.writers[fd]
+                self.register(fd)
+
+    def register(self, fd):
+        """
+        Updates the events poll waits for on fd, after a reader or writer was added or removed
+        """
+        if self.poller is None:
+            return
+        events = 0
+        if fd in self.readers:
+            events |= select.POLLIN | select.POLLPRI
+        if fd in self.writers:
+            events |= select.POLLOUT
+        if events:
+            self.poller.register(fd, events)  # modifies the events when fd was already registered
+        else:
+            try:
+                self.poller.unregister(fd)
+            except KeyError:
+                pass
+
+    def callAt(self, when, callback, *args):
+        """
+        Calls callback with args at time when, in seconds since epoch
+        """
+        timer = Timer(when, callback, args, relative=False)
+        heapq.heappush(self.timers, (when, next(self.sequence), timer))
+        return timer
+
+    def callLater(self, delay, callback, *args):
+        """
+        Calls callback with args after delay seconds
+        """
+        timer = Timer(time.time() + delay, callback, args)
+        heapq.heappush(self.timers, (timer.when, next(self.sequence), timer))
+        return timer
+
+    def callEvery(self, interval, callback, *args):
+        """
+        Calls callback with args every interval seconds, the first time after interval seconds
+        """
+        timer = Timer(time.time() + interval, callback, args, interval)
+        heapq.heappush(self.timers, (timer.when, next(self.sequence), timer))
+        return timer
+
+    def now(self):
+        """
+        Returns time.time(). When the clock was set back since the last call, like by NTP after a Raspberry Pi booted
+        without a real time clock, the timers scheduled with a delay are moved back as much, otherwise they would not
+        run until the clock has caught up again. Timers scheduled with callAt stay at their time of day.
+        """
+        now = time.time()
+        step = now - self.lastTime
+        self.lastTime = now
+        if step < 0:
+            for i, (when, sequence, timer) in enumerate(self.timers):
+                if timer.relative:
+                    timer.when = when + step
+                    self.timers[i] = (timer.when, sequence, timer)
+            heapq.heapify(self.timers)
+        return now
+
+    def timeout(self):
+        """
+        Returns the number of seconds until the first timer is due, None when no timers are scheduled
+        """
+        while self.timers and self.timers[0][2].cancelled:
+            heapq.heappop(self.timers)
+        timeout = None
+        if self.timers:
+            timeout = max(self.timers[0][0] - self.now(), 0)
+        if self.polledReaders and (timeout is None or timeout > pollInterval):
+            timeout = pollInterval
+        return timeout
+
+    def wait(self, timeout):
+        """
+        Waits at most timeout seconds for readers to have data or writers to be writable
+        Returns: list of (file descriptor, readers or writers dict, callback) of the readers and writers that are ready
+        """
+        if not self.readers and not self.writers:
+            if timeout is not None:
+                time.sleep(timeout)
+            return []
+        try:
+            if self.poller is not None:
+                # poll takes whole milliseconds, round up so it does not return early and the loop spins until a timer
+                # is due
+                events = self.poller.poll(None if timeout is None else math.ceil(timeout * 1000))
+                # errors and hang ups are passed to both, the callback finds out when it reads or writes
+                failed = select.POLLERR | select.POLLHUP | select.POLLNVAL
+                readable = [fd for fd, event in events if event & (select.POLLIN | select.POLLPRI | failed)]
+                writable = [fd for fd, event in events if event & (select.POLLOUT | failed)]
+            else:
+                readable, writable, exceptional = select.select(self.readers.keys(), self.writers.keys(), [],
+                                                                timeout)
+        except (select.error, IOError, OSError) as e:
+            if e.args[0] == errno.EINTR:
+                return []  # interrupted by a signal, the signal handler might have stopped the loop
+            raise
+        return ([(fd, self.readers, self.readers[fd][1]) for fd in readable if fd in self.readers] +
+                [(fd, self.writers, self.writers[fd][1]) for fd in writable if fd in self.writers])
+
+    def runOnce(self, timeout=None):
+        """
+        Waits for readers or writers to be ready or the first timer to be due, at most timeout seconds, and runs the
+        callbacks
+        """
+        timerTimeout = self.timeout()
+        if timeout is None or (timerTimeout is not None and timerTimeout < timeout):
+            timeout = timerTimeout
+        waitStart = time.time()
+        events = self.wait(timeout)
+        waitEnd = time.time()
+        for fd, callbacks, callback in events:
+            if fd in callbacks:  # an earlier callback can have removed it
+                callback()
+        for ready, callback in self.polledReaders.values():
+            if ready():
+                callback()
+        now = self.now()
+        while self.timers and self.timers[0][0] <= now:
+            when, sequence, timer = heapq.heappop(self.timers)
+            if timer.cancelled:
+                continue
+            if timer.interval is not None:
+                # schedule the next call before running the callback, so the callback can cancel it
+                timer.when = max(when + timer.interval, now)
+                heapq.heappush(self.timers, (timer.when, next(self.sequence), timer))
+            timer.callback(*timer.args)
+        if self.stats is not None:
+            self.stats.add('wait', waitEnd - waitStart)
+            self.stats.add('callbacks', time.time() - waitEnd)
+
+    def run(self):
+        """
+        Runs callbacks until stop is called
+        """
+        self.running = True
+        while self.running:
+            self.runOnce()
+
+    def stop(self):
+        """
+        Stops run after the current callback. Can be called from a signal handler.
+        """
+        self.running = False
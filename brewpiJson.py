@@ -19,6 +19,8 @@ import time
 import os
 import re
 
+import simplejson as json
+
 jsonCols = ("\"cols\":[" +
             "{\"type\":\"datetime\",\"id\":\"Time\",\"label\":\"Time\"}," +
             "{\"type\":\"number\",\"id\":\"BeerTemp\",\"label\":\"Beer temperature\"}," +
@@ -40,72 +42,222 @@ def fixJson(j):
 	return j
 
 
+# column keys of a data row in the order they are written to the DataTable, with the cell format used for each
+rowFormat = (("BeerTemp", "{\"v\":%s}"),
+             ("BeerSet", "{\"v\":%s}"),
+             ("BeerAnn", "{\"v\":\"%s\"}"),
+             ("FridgeTemp", "{\"v\":%s}"),
+             ("FridgeSet", "{\"v\":%s}"),
+             ("FridgeAnn", "{\"v\":\"%s\"}"),
+             ("RoomTemp", "{\"v\":\"%s\"}"),
+             ("State", "{\"v\":\"%s\"}"))
+
+
+def jsonRow(row, now=None):
+	"""
+	Formats a data row as a DataTable row, something like this:
+	{"c":[{"v":"Date(2012,8,26,0,1,0)"},{"v":18.96},{"v":19.0},null,{"v":19.94},{"v":19.6},null,null,null]}
+
+	Params:
+	row: dict with the keys in rowFormat
+	now: datetime of the row, defaults to the current time
+
+	Returns: the row as a string
+	"""
+	if now is None:
+		now = datetime.now()
+	cells = ["{\"v\":\"Date(%d,%d,%d,%d,%d,%d)\"}" % (now.year, now.month - 1, now.day,
+	                                                    now.hour, now.minute, now.second)]
+	for key, cellFormat in rowFormat:
+		if row[key] is None:
+			cells.append("null")
+		else:
+			cells.append(cellFormat % str(row[key]))
+	return "{\"c\":[" + ",".join(cells) + "]}"
+
+
+class ChartFileWriter:
+	"""
+	Keeps a DataTable JSON file open and appends rows to it.
+	The insert point before the closing ]} of the file is tracked in memory, so adding rows does not have to read
+	the file and each batch of rows is written to disk with a single write call.
+	"""
+
+	def __init__(self, jsonFileName):
+		"""
+		Opens a DataTable JSON file for appending, an empty file is created when it does not exist yet.
+
+		Params:
+		jsonFileName: string, path to the JSON file
+		"""
+		self.fileName = jsonFileName
+		if not os.path.isfile(jsonFileName):
+			newEmptyFile(jsonFileName)
+		self.file = open(jsonFileName, "r+b", 0)  # unbuffered, every write goes to the file directly
+		self.file.seek(-3, os.SEEK_END)
+		self.empty = (self.file.read(1) == '[')
+		self.offset = self.file.tell()  # insert point, rows are written over the closing ]}
+
+	def addRow(self, row, now=None):
+		"""
+		Appends a single data row to the file, see jsonRow for the parameters
+		"""
+		return self.write([jsonRow(row, now)])
+
+	def write(self, jsonRows):
+		"""
+		Appends already formatted rows to the file and rewrites the closing ]} after them.
+
+		Params:
+		jsonRows: list of strings, formatted with jsonRow
+
+		Returns:
+		offset: position in the file where the data was written
+		data: the string that was written
+		"""
+		if not jsonRows:
+			return self.offset, ''
+		separator = "," + os.linesep
+		if self.empty:
+			data = os.linesep
+		else:
+			data = separator
+		data += separator.join(jsonRows) + "]}"
+		offset = self.offset
+		self.file.seek(offset)
+		self.file.write(data)
+		self.offset += len(data) - 2  # the next rows overwrite the closing ]} again
+		self.empty = False
+		return offset, data
+
+	def sync(self):
+		"""
+		Forces the data written so far to disk
+		"""
+		os.fsync(self.file.fileno())
+
+	def close(self):
+		self.file.close()
+
+
 def addRow(jsonFileName, row):
-	jsonFile = open(jsonFileName, "r+")
-	jsonFile.seek(-3, 2)  # Go insert point to add the last row
-	ch = jsonFile.read(1)
-	jsonFile.seek(0, os.SEEK_CUR)
-	# when alternating between reads and writes, the file contents should be flushed, see
-	# http://bugs.python.org/issue3207. This prevents IOError, Errno 0
-	if ch != '[':
-		# not the first item
-		jsonFile.write(',')
-	newRow = {}
-	newRow['Time'] = datetime.today()
-
-	# insert something like this into the file:
-	# {"c":[{"v":"Date(2012,8,26,0,1,0)"},{"v":18.96},{"v":19.0},null,{"v":19.94},{"v":19.6},null]},
-	jsonFile.write(os.linesep)
-	jsonFile.write("{\"c\":[")
-	now = datetime.now()
-	jsonFile.write("{{\"v\":\"Date({y},{M},{d},{h},{m},{s})\"}},".format(
-		y=now.year, M=(now.month - 1), d=now.day, h=now.hour, m=now.minute, s=now.second))
-	if row['BeerTemp'] is None:
-		jsonFile.write("null,")
-	else:
-		jsonFile.write("{\"v\":" + str(row['BeerTemp']) + "},")
-
-	if row['BeerSet'] is None:
-		jsonFile.write("null,")
-	else:
-		jsonFile.write("{\"v\":" + str(row['BeerSet']) + "},")
-
-	if row['BeerAnn'] is None:
-		jsonFile.write("null,")
-	else:
-		jsonFile.write("{\"v\":\"" + str(row['BeerAnn']) + "\"},")
-
-	if row['FridgeTemp'] is None:
-		jsonFile.write("null,")
-	else:
-		jsonFile.write("{\"v\":" + str(row['FridgeTemp']) + "},")
-
-	if row['FridgeSet'] is None:
-		jsonFile.write("null,")
-	else:
-		jsonFile.write("{\"v\":" + str(row['FridgeSet']) + "},")
-
-	if row['FridgeAnn'] is None:
-		jsonFile.write("null,")
-	else:
-		jsonFile.write("{\"v\":\"" + str(row['FridgeAnn']) + "\"},")
-
-	if row['RoomTemp'] is None:
-		jsonFile.write("null,")
-	else:
-		jsonFile.write("{\"v\":\"" + str(row['RoomTemp']) + "\"},")
-
-	if row['State'] is None:
-		jsonFile.write("null")
-	else:
-		jsonFile.write("{\"v\":\"" + str(row['State']) + "\"}")
-
-	# rewrite end of json file
-	jsonFile.write("]}]}")
-	jsonFile.close()
+	"""
+	Appends a single row to a DataTable JSON file. Use a ChartFileWriter when adding rows to the same file repeatedly.
+	"""
+	writer = ChartFileWriter(jsonFileName)
+	writer.addRow(row)
+	writer.close()
 
 
 def newEmptyFile(jsonFileName):
 	jsonFile = open(jsonFileName, "w")
 	jsonFile.write("{" + jsonCols + ",\"rows\":[]}")
 	jsonFile.close()
+
+
+dateRegex = re.compile(r'Date\((\d+),(\d+),(\d+),(\d+),(\d+),(\d+)\)')
+tokenRegex = re.compile(r'[{}"\\]')
+
+
+def dateToTimeStamp(dateString):
+	"""
+	Converts a date as written in the DataTable, like Date(2012,8,26,0,1,0), to seconds since epoch.
+	Months start at 0 in this format.
+	Returns: time stamp as float, or None when the string is not a date
+	"""
+	match = dateRegex.search(dateString)
+	if match is None:
+		return None
+	y, M, d, h, m, s = [int(x) for x in match.groups()]
+	return time.mktime((y, M + 1, d, h, m, s, 0, 0, -1))
+
+
+def cellsToRow(colIds, cells):
+	"""
+	Converts the cells of a DataTable row to a data row with the keys in rowFormat.
+	Numbers that were written as strings are converted to numbers.
+
+	Returns:
+	timeStamp: time of the row in seconds since epoch, None if the row has no valid time
+	row: dict with the data row
+	"""
+	timeStamp = None
+	row = dict([(key, None) for key, cellFormat in rowFormat])
+	for colId, cell in zip(colIds, cells):
+		if cell is None or cell.get('v') is None:
+			continue
+		value = cell['v']
+		if colId == 'Time':
+			timeStamp = dateToTimeStamp(str(value))
+		elif colId in ('BeerAnn', 'FridgeAnn'):
+			row[colId] = value
+		elif colId in row:
+			try:
+				row[colId] = int(value) if colId == 'State' else float(value)
+			except ValueError:
+				pass
+	return timeStamp, row
+
+
+def iterRows(jsonFile, chunkSize=65536):
+	"""
+	Streaming parser for DataTable JSON files, that reads the file in chunks instead of loading it as a whole.
+	Rows are found by matching braces, so they do not have to be on separate lines.
+	An incomplete row at the end of the file, for example after a crash, is skipped.
+
+	Params:
+	jsonFile: file object opened for reading
+
+	Yields (timeStamp, row dict) tuples, see cellsToRow. Rows without a valid time are skipped.
+	"""
+	text = ''
+	while '"rows":[' not in text:
+		chunk = jsonFile.read(chunkSize)
+		if not chunk:
+			return
+		text += chunk
+	headerEnd = text.index('"rows":[') + len('"rows":[')
+	try:
+		colIds = [col['id'] for col in json.loads(text[:headerEnd] + ']}')['cols']]
+	except (ValueError, KeyError, TypeError):
+		return
+	text = text[headerEnd:]
+
+	while True:
+		depth = 0
+		inString = False
+		escaped = -1  # position of a character that is escaped by a backslash
+		start = None  # start of the row that is being scanned
+		end = 0  # end of the last complete row
+		for match in tokenRegex.finditer(text):
+			i = match.start()
+			if i == escaped:
+				continue
+			token = match.group()
+			if inString:
+				if token == '\\':
+					escaped = i + 1
+				elif token == '"':
+					inString = False
+			elif token == '"':
+				inString = True
+			elif token == '{':
+				if depth == 0:
+					start = i
+				depth += 1
+			elif token == '}' and depth > 0:
+				depth -= 1
+				if depth == 0:
+					end = i + 1
+					try:
+						timeStamp, row = cellsToRow(colIds, json.loads(text[start:end])['c'])
+					except (ValueError, KeyError, TypeError, AttributeError):
+						continue  # skip rows that cannot be parsed
+					if timeStamp is not None:
+						yield timeStamp, row
+		# continue with the incomplete row, if any
+		text = text[start:] if depth > 0 else text[end:]
+		chunk = jsonFile.read(chunkSize)
+		if not chunk:
+			return
+		text += chunk
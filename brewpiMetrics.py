@@ -0,0 +1,181 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from collections import OrderedDict
+
+contentType = 'text/plain; version=0.0.4'
+
+# gauges of the last data row: key in the row, metric name and help text
+temperatureGauges = [
+    ('BeerTemp', 'brewpi_beer_temperature', "Beer temperature in the temperature format of the Arduino"),
+    ('FridgeTemp', 'brewpi_fridge_temperature', "Fridge temperature in the temperature format of the Arduino"),
+    ('RoomTemp', 'brewpi_room_temperature', "Room temperature in the temperature format of the Arduino"),
+    ('BeerSet', 'brewpi_beer_setting', "Beer temperature setting"),
+    ('FridgeSet', 'brewpi_fridge_setting', "Fridge temperature setting"),
+    ('State', 'brewpi_state', "State of the controller: 0 idle, 1 state off, 2 door open, 3 heating, 4 cooling, ...")]
+
+summaryQuantiles = (0.5, 0.9, 0.99)
+
+
+def formatValue(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, long)):
+        return str(value)
+    return repr(float(value))
+
+
+def formatLabels(labels):
+    if not labels:
+        return ''
+    escaped = ['%s="%s"' % (name, unicode(value).encode('utf-8').replace('\\', '\\\\').replace('"', '\\"')
+                            .replace('\n', '\\n'))
+               for name, value in labels.items()]
+    return '{' + ','.join(escaped) + '}'
+
+
+class Metrics:
+    """
+    Collects samples grouped in metric families and formats them in the Prometheus text exposition format
+    """
+
+    def __init__(self):
+        self.families = OrderedDict()  # name: (type, help text, list of (sample name, labels, value))
+
+    def add(self, name, metricType, helpText, value, labels=None, sampleName=None):
+        """
+        Adds a sample to a metric family. Samples with value None are left out.
+
+        Params:
+        name: name of the metric family
+        metricType: gauge, counter or summary
+        helpText: description of the metric
+        value: number
+        labels: dict of label name: value
+        sampleName: name of the sample when it differs from the family, like name_sum for a summary
+        """
+        if name not in self.families:
+            self.families[name] = (metricType, helpText, [])
+        if value is not None:
+            self.families[name][2].append((sampleName or name, labels or {}, value))
+
+    def addSummary(self, name, helpText, histogram, labels=None):
+        """
+        Adds the quantiles, sum and count of a brewpiStats.Histogram as a summary, in seconds
+        """
+        labels = labels or {}
+        self.add(name, 'summary', helpText, None)
+        if not histogram.count:
+            return
+        for quantile in summaryQuantiles:
+            self.add(name, 'summary', helpText, histogram.percentile(quantile),
+                     OrderedDict(labels.items() + [('quantile', quantile)]))
+        self.add(name, 'summary', helpText, histogram.total, labels, name + '_sum')
+        self.add(name, 'summary', helpText, histogram.count, labels, name + '_count')
+
+    def format(self):
+        lines = []
+        for name, (metricType, helpText, samples) in self.families.items():
+            if not samples:
+                continue
+            lines.append('# HELP %s %s' % (name, helpText))
+            lines.append('# TYPE %s %s' % (name, metricType))
+            for sampleName, labels, value in samples:
+                lines.append(sampleName + formatLabels(labels) + ' ' + formatValue(value))
+        return '\n'.join(lines) + '\n'
+
+
+def collect(chambers, loopStats, startTime):
+    """
+    Collects the metrics of the script
+
+    Params:
+    chambers: list of brewpiChamber.Chamber objects
+    loopStats: brewpiStats.LoopStats of the main loop
+    startTime: time the script was started, in seconds since epoch
+
+    Returns: Metrics object
+    """
+    metrics = Metrics()
+    metrics.add('brewpi_start_time_seconds', 'gauge', "Time the script was started, in seconds since epoch",
+                startTime)
+    for chamber in chambers:
+        labels = OrderedDict() if chamber.id is None else OrderedDict([('chamber', chamber.id)])
+        hwVersion = chamber.hwVersion.toString() if chamber.hwVersion is not None else ''
+        metrics.add('brewpi_info', 'gauge', "Version of the Arduino and temperature format, always 1", 1,
+                    OrderedDict(labels.items() + [('version', hwVersion), ('format', chamber.cc.get('tempFormat'))]))
+        for key, name, helpText in temperatureGauges:
+            metrics.add(name, 'gauge', helpText, chamber.prevTempJson.get(key) if chamber.prevDataTime else None,
+                        labels)
+        metrics.add('brewpi_mode', 'gauge', "Control mode: b beer constant, f fridge constant, p profile, o off", 1,
+                    OrderedDict(labels.items() + [('mode', chamber.cs.get('mode'))]))
+        metrics.add('brewpi_last_data_time_seconds', 'gauge', "Time the last temperatures were received",
+                    chamber.prevDataTime or None, labels)
+        metrics.add('brewpi_rows_written_total', 'counter', "Data rows written to the data files",
+                    chamber.dataLogger.rowsWritten, labels)
+        metrics.add('brewpi_rows_buffered', 'gauge', "Data rows waiting to be written to the data files",
+                    len(chamber.dataLogger.rows), labels)
+
+        serialStats = chamber.serialStats
+        for lineType in sorted(serialStats.lines):
+            lineLabels = OrderedDict(labels.items() + [('type', lineType)])
+            metrics.add('brewpi_serial_lines_received_total', 'counter', "Lines received from the Arduino by type",
+                        serialStats.lines[lineType], lineLabels)
+            metrics.add('brewpi_serial_bytes_received_total', 'counter', "Bytes received from the Arduino by type",
+                        serialStats.bytes[lineType], lineLabels)
+        metrics.add('brewpi_serial_bytes_written_total', 'counter', "Bytes written to the Arduino",
+                    serialStats.bytesWritten, labels)
+        for lineType, count in sorted(serialStats.decodeErrors.items()):
+            metrics.add('brewpi_serial_decode_errors_total', 'counter', "Lines from the Arduino that could not be "
+                        "decoded, by type", count, OrderedDict(labels.items() + [('type', lineType)]))
+        metrics.add('brewpi_serial_unknown_lines_total', 'counter', "Lines from the Arduino of an unknown type",
+                    serialStats.unknownLines, labels)
+        for request, count in sorted(serialStats.unanswered.items()):
+            metrics.add('brewpi_serial_unanswered_requests_total', 'counter', "Requests the Arduino did not answer",
+                        count, OrderedDict(labels.items() + [('request', request)]))
+        for request, histogram in serialStats.latency.items():
+            metrics.addSummary('brewpi_serial_round_trip_seconds', "Time from a request to the reply of the Arduino",
+                               histogram, OrderedDict(labels.items() + [('request', request)]))
+
+    for stage, histogram in loopStats.histograms.items():
+        metrics.addSummary('brewpi_loop_stage_seconds', "Time spent in each stage of the main loop", histogram,
+                           {'stage': stage})
+    return metrics
+
+
+def httpResponse(request, body):
+    """
+    Returns: the HTTP response to a request for the metrics, body is a function that returns the metrics text
+    """
+    requestLine = request.split('\r\n', 1)[0].split(' ')
+    if len(requestLine) < 2 or requestLine[0] != 'GET' or requestLine[1].split('?')[0] not in ('/', '/metrics'):
+        status, contentTypeHeader, text = '404 Not Found', 'text/plain', 'Not found, metrics are at /metrics\n'
+    else:
+        status, contentTypeHeader, text = '200 OK', contentType, body()
+    return ('HTTP/1.0 %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n' %
+            (status, contentTypeHeader, len(text))) + text
+
+
+def writeFile(fileName, text):
+    """
+    Writes the metrics to a file for a textfile collector. The file is replaced at once, so the collector never reads
+    a partly written file.
+    """
+    tempFileName = fileName + '.tmp'
+    with open(tempFileName, 'w') as metricsFile:
+        metricsFile.write(text)
+    os.rename(tempFileName, fileName)
@@ -0,0 +1,116 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import BrewPiUtil as util
+
+
+class WwwMirror:
+    """
+    Publishes a copy of a data file in the www directory, by only writing the bytes that changed in the original.
+
+    Two buffer files are kept next to the published file. Changes are applied to the buffer that is not published
+    and that buffer is then published by hard linking it to the published file name with an atomic rename.
+    The web server always sees a complete file this way. The buffer that was replaced is only written to again at
+    the next publish, so a reader that still has it open gets a full interval to finish reading it.
+
+    When hard links are not supported, the whole file is copied on each publish.
+    """
+
+    def __init__(self, srcFileName, wwwFileName):
+        """
+        Params:
+        srcFileName: string, path to the local file
+        wwwFileName: string, path where the file is published in the www directory
+        """
+        self.srcFileName = srcFileName
+        self.wwwFileName = wwwFileName
+        wwwDir, wwwBaseName = os.path.split(wwwFileName)
+        # buffer names are hidden and do not end in the original extension, so the web interface does not list them
+        self.buffers = [os.path.join(wwwDir, '.' + wwwBaseName + '.' + str(i)) for i in range(2)]
+        self.tmpFileName = os.path.join(wwwDir, '.' + wwwBaseName + '.tmp')
+        self.pending = [[], []]  # (offset, data) writes not yet applied to each buffer
+        self.back = 0  # index of the buffer that is not published
+        self.useLinks = hasattr(os, 'link')
+        self.sync()
+
+    def sync(self):
+        """
+        Copies the complete local file to the buffers and publishes it. Used when the file is first mirrored.
+        """
+        self.pending = [[], []]
+        if self.useLinks:
+            for bufferFileName in self.buffers:
+                shutil.copyfile(self.srcFileName, bufferFileName)
+            self.publish()
+        else:
+            shutil.copyfile(self.srcFileName, self.wwwFileName)
+
+    def write(self, offset, data):
+        """
+        Registers data that was written to the local file, it will be included in the next publish.
+
+        Params:
+        offset: position in the local file where the data was written
+        data: the string that was written
+        """
+        if data:
+            for pending in self.pending:
+                pending.append((offset, data))
+
+    def publish(self):
+        """
+        Makes all writes registered so far visible in the www directory
+        """
+        if not self.useLinks:
+            self.pending = [[], []]
+            shutil.copyfile(self.srcFileName, self.wwwFileName)
+            return
+
+        backFileName = self.buffers[self.back]
+        if self.pending[self.back]:
+            with open(backFileName, 'r+b') as backFile:
+                for offset, data in self.pending[self.back]:
+                    backFile.seek(offset)
+                    backFile.write(data)
+            self.pending[self.back] = []
+        try:
+            if os.path.exists(self.tmpFileName):
+                os.remove(self.tmpFileName)
+            os.link(backFileName, self.tmpFileName)
+            os.rename(self.tmpFileName, self.wwwFileName)
+        except OSError as e:
+            util.logMessage("Cannot hard link %s (%s), copying the whole file on every update instead." %
+                            (self.wwwFileName, e.strerror))
+            self.useLinks = False
+            self.removeBuffers()
+            self.publish()
+            return
+        self.back = 1 - self.back
+
+    def removeBuffers(self):
+        for fileName in self.buffers + [self.tmpFileName]:
+            if os.path.exists(fileName):
+                os.remove(fileName)
+
+    def close(self):
+        """
+        Publishes the remaining writes and removes the buffer files. The published file is kept.
+        """
+        self.publish()
+        if self.useLinks:
+            self.removeBuffers()
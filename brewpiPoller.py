@@ -0,0 +1,145 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+
+def parsePolicy(value, default):
+    """
+    Parses a poll policy from the config file: the fast and the slow interval in seconds, like '0.5, 10'.
+    A single number is used for both. 0 disables polling at that rate.
+
+    Returns: tuple (fast, slow), default when value is None
+    """
+    if value is None:
+        return default
+    if isinstance(value, basestring):
+        value = [value]
+    intervals = [float(interval) for interval in value]
+    if len(intervals) == 1:
+        intervals *= 2
+    return intervals[0], intervals[1]
+
+
+class Poller:
+    """
+    Sends the requests that keep the script's copy of the Arduino state up to date, like 'l' for the LCD text.
+    Each request type is sent at a fast rate while clients use its data and at a slow rate otherwise, so the serial
+    port and the Arduino are not kept busy with data nobody looks at.
+
+    A client uses the data of a request type when it asked for it less than activeTime seconds ago, or when
+    isWatched returns True for it, for example because a session subscribed to it.
+    """
+
+    def __init__(self, loop, poll, policies, activeTime=10.0, isWatched=None):
+        """
+        Params:
+        loop: brewpiEventLoop.EventLoop to schedule the requests on
+        poll: function called with the request type to send the request
+        policies: dict of request type: (fast interval, slow interval) in seconds, 0 to not poll at that rate
+        activeTime: seconds a request type stays at the fast rate after the data was asked for
+        isWatched: function called with the request type, returns whether a client follows the data continuously
+        """
+        self.loop = loop
+        self.poll = poll
+        self.policies = dict(policies)
+        self.activeTime = float(activeTime)
+        self.isWatched = isWatched
+        self.lastDemand = dict([(request, None) for request in self.policies])
+        self.lastPoll = dict([(request, None) for request in self.policies])
+        self.timers = {}
+
+    def start(self):
+        """
+        Sends all requests that are polled when there is no demand and schedules the next ones
+        """
+        for request in self.policies:
+            self.schedule(request, time.time())
+
+    def stop(self):
+        for timer in self.timers.values():
+            timer.cancel()
+        self.timers = {}
+
+    def setPolicy(self, request, policy):
+        """
+        Changes the (fast, slow) intervals of request, the next poll is moved forward when it is due earlier now
+        """
+        self.policies[request] = policy
+        self.reschedule(request)
+
+    def active(self, request, now=None):
+        """
+        Returns whether a client uses the data of request, so it is polled at the fast rate
+        """
+        if now is None:
+            now = time.time()
+        if self.lastDemand[request] is not None and now - self.lastDemand[request] < self.activeTime:
+            return True
+        return bool(self.isWatched and self.isWatched(request))
+
+    def interval(self, request, now=None):
+        """
+        Returns the current interval of request in seconds, 0 when it is not polled
+        """
+        fast, slow = self.policies[request]
+        return fast if self.active(request, now) else slow
+
+    def demand(self, request):
+        """
+        Records that a client asked for the data of request. When it was polled at the slow rate, it is polled
+        right away if the data is older than the fast interval, so the client does not wait for the slow rate.
+        """
+        if request not in self.policies:
+            return
+        now = time.time()
+        self.lastDemand[request] = now
+        self.reschedule(request, now)
+
+    def reschedule(self, request, now=None):
+        """
+        Moves the next poll of request forward when it is due earlier at the current rate, after a subscription
+        for example
+        """
+        if now is None:
+            now = time.time()
+        nextTime = self.nextPollTime(request, now)
+        timer = self.timers.get(request)
+        if nextTime is not None and (timer is None or nextTime < timer.when):
+            self.schedule(request, nextTime)
+
+    def nextPollTime(self, request, now):
+        interval = self.interval(request, now)
+        if not interval:
+            return None
+        if self.lastPoll[request] is None:
+            return now
+        return max(self.lastPoll[request] + interval, now)
+
+    def schedule(self, request, when):
+        timer = self.timers.pop(request, None)
+        if timer is not None:
+            timer.cancel()
+        if when is not None:
+            self.timers[request] = self.loop.callAt(when, self.pollRequest, request)
+
+    def pollRequest(self, request):
+        del self.timers[request]
+        now = time.time()
+        if self.interval(request, now):  # the request can have become inactive since it was scheduled
+            self.lastPoll[request] = now
+            self.poll(request)
+        self.schedule(request, self.nextPollTime(request, now))
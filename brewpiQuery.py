@@ -0,0 +1,207 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+from array import array
+from bisect import bisect_left, bisect_right
+import os
+
+import simplejson as json
+
+import brewpiJson
+from brewpiDecimate import MinMaxDecimator
+
+# column definitions of the daily JSON files, in the order of the cells in a row
+chartCols = json.loads("{" + brewpiJson.jsonCols + "}")['cols']
+chartColIds = [col['id'] for col in chartCols]
+
+
+def parseRowLine(line):
+    """
+    Parses a row line of a daily JSON file, without the separator or the end of the file after it.
+    Returns: the row as dict
+    """
+    line = line.strip()
+    if line.endswith(','):
+        line = line[:-1]
+    elif line.endswith(']}]}'):
+        line = line[:-2]  # last row of the file
+    return json.loads(line)
+
+
+class FileIndex:
+    """
+    Index of a daily JSON file: the time stamp and the position in the file of each row.
+    Rows are written on a line of their own, so the file only needs to be scanned once. When the file grows, only
+    the last indexed row and the rows after it are scanned again.
+    """
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.times = array('d')
+        self.offsets = array('L')  # start of each row
+        self.indexedSize = 0
+
+    def update(self):
+        """
+        Indexes the rows that were added to the file since the last update
+        """
+        size = os.path.getsize(self.fileName)
+        if size == self.indexedSize:
+            return
+        offset = 0
+        if self.offsets:
+            # the end of the last row changes when a row is added after it, scan it again
+            offset = self.offsets.pop()
+            self.times.pop()
+        with open(self.fileName, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if line.startswith('{"c":'):
+                    t = brewpiJson.dateToTimeStamp(line)
+                    if t is not None:
+                        self.times.append(t)
+                        self.offsets.append(offset)
+                offset += len(line)
+        self.indexedSize = size
+
+    def rows(self, start=None, end=None):
+        """
+        Reads the rows between time stamps start and end, by reading only that part of the file.
+        Returns: list of (timeStamp, row dict) tuples
+        """
+        self.update()
+        first = 0 if start is None else bisect_left(self.times, start)
+        last = len(self.times) if end is None else bisect_right(self.times, end)
+        if first >= last:
+            return []
+        if last < len(self.offsets):
+            endOffset = self.offsets[last]
+        else:
+            endOffset = self.indexedSize
+        startOffset = self.offsets[first]
+        with open(self.fileName, 'rb') as f:
+            f.seek(startOffset)
+            data = f.read(endOffset - startOffset)
+        # parse only the indexed rows, lines without a valid date are not in the index
+        samples = []
+        for i in range(first, last):
+            lineStart = self.offsets[i] - startOffset
+            lineEnd = data.find('\n', lineStart)
+            if lineEnd < 0:
+                lineEnd = len(data)
+            samples.append((self.times[i], parseRowLine(data[lineStart:lineEnd])))
+        return samples
+
+
+class BrewIndex:
+    """
+    Index over all daily JSON files of a beer, to get the logged data of any time range
+    """
+
+    def __init__(self, dataPath, beerName):
+        """
+        Params:
+        dataPath: data directory of the beer
+        beerName: name of the beer
+        """
+        self.dataPath = dataPath
+        self.beerName = beerName
+        self.files = {}  # file name: FileIndex
+
+    def update(self):
+        """
+        Updates the indexes of all daily files of the beer
+        Returns: list of FileIndex objects that contain rows, sorted by time
+        """
+        for baseName in os.listdir(self.dataPath):
+            fileName = os.path.join(self.dataPath, baseName)
+            if baseName.startswith(self.beerName + '-') and baseName.endswith('.json') and fileName not in self.files:
+                self.files[fileName] = FileIndex(fileName)
+        indexes = []
+        for fileName, index in self.files.items():
+            if not os.path.exists(fileName):
+                del self.files[fileName]
+                continue
+            index.update()
+            if index.times:
+                indexes.append(index)
+        return sorted(indexes, key=lambda index: index.times[0])
+
+    def query(self, start=None, end=None, columns=None, maxPoints=None):
+        """
+        Gets the logged data between two time stamps.
+
+        Params:
+        start: first time stamp in seconds since epoch, None for the start of the brew
+        end: last time stamp, None for the last row
+        columns: list of column ids to include, None for all. Time is always included.
+        maxPoints: maximum number of rows to return. When there are more rows, the data is decimated.
+
+        Returns:
+        dict in the DataTable format of the daily files, with only the requested columns
+        """
+        if columns is None:
+            columns = chartColIds
+        selected = [i for i, colId in enumerate(chartColIds) if colId == 'Time' or colId in columns]
+        samples = []
+        for index in self.update():
+            if (end is not None and index.times[0] > end) or (start is not None and index.times[-1] < start):
+                continue
+            samples += index.rows(start, end)
+
+        if maxPoints and len(samples) > maxPoints:
+            samples = decimate(samples, [i for i in selected if chartCols[i]['type'] == 'number'], maxPoints)
+
+        rows = [{'c': [row['c'][i] for i in selected]} for t, row in samples]
+        return {'cols': [chartCols[i] for i in selected], 'rows': rows}
+
+
+def cellValue(cell):
+    """
+    Returns the value of a number cell as float. Some numbers are written as strings in the daily files.
+    """
+    if cell is None:
+        return None
+    try:
+        return float(cell['v'])
+    except (TypeError, ValueError):
+        return None
+
+
+def decimate(samples, cellIndexes, maxPoints):
+    """
+    Reduces a list of (timeStamp, row dict) samples to at most maxPoints samples, keeping the peaks of the cells
+    at cellIndexes
+    """
+    keys = [str(i) for i in cellIndexes]
+    buckets = maxPoints // max(2 * len(keys), 1)  # each bucket results in up to 2 rows per series
+    result = samples
+    if buckets > 0:
+        firstTime = samples[0][0]
+        # buckets start at the first sample, slightly larger than needed to not end up with an extra bucket
+        bucketSeconds = ((samples[-1][0] - firstTime) * 1.000001 / buckets) or 1.0
+        decimator = MinMaxDecimator(bucketSeconds, keys)
+        result = []
+        for t, row in samples:
+            values = dict([(str(i), cellValue(row['c'][i])) for i in cellIndexes])
+            values['sample'] = (t, row)
+            result += decimator.add(values, t - firstTime)
+        result += decimator.flush()
+        result = [values['sample'] for t, values in result]
+    if len(result) > maxPoints:
+        step = len(result) / float(maxPoints)
+        result = [result[int(i * step)] for i in range(maxPoints)]
+    return result
@@ -0,0 +1,115 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+from array import array
+from datetime import datetime
+import time
+
+import brewpiJson
+from brewpiStore import columns, columnNames, toStored, fromStored
+
+
+class SampleRingBuffer:
+    """
+    Keeps the most recent samples in memory, in preallocated arrays with one array per column.
+    When the buffer is full, the oldest sample is overwritten.
+    """
+
+    def __init__(self, capacity):
+        """
+        Params:
+        capacity: maximum number of samples that is kept
+        """
+        self.capacity = max(int(capacity), 1)
+        self.arrays = dict([(name, array(typeCode, [0]) * self.capacity) for name, typeCode in columns])
+        self.start = 0  # position of the oldest sample
+        self.count = 0
+        self.lastTime = None  # time stamp of the newest sample, older samples are not added
+
+    def __len__(self):
+        return self.count
+
+    def append(self, row, timeStamp=None):
+        """
+        Adds a sample, overwriting the oldest one when the buffer is full. A sample that is older than the newest
+        sample is skipped, because firstAfter needs sorted time stamps.
+
+        Params:
+        row: dict with the data row
+        timeStamp: time of the sample in seconds since epoch, defaults to now
+
+        Returns: True when the sample was added, False when it was skipped
+        """
+        if timeStamp is None:
+            timeStamp = time.time()
+        if self.lastTime is not None and timeStamp < self.lastTime:
+            return False
+        self.lastTime = timeStamp
+        if self.count < self.capacity:
+            position = (self.start + self.count) % self.capacity
+            self.count += 1
+        else:
+            position = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.arrays['Time'][position] = timeStamp
+        for name in columnNames[1:]:
+            self.arrays[name][position] = toStored(name, row.get(name))
+        return True
+
+    def position(self, i):
+        """
+        Returns the position in the arrays of the i-th oldest sample
+        """
+        return (self.start + i) % self.capacity
+
+    def firstAfter(self, since):
+        """
+        Returns the index of the oldest sample that is newer than since, by binary search on the time stamps
+        """
+        times = self.arrays['Time']
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if times[self.position(middle)] <= since:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def rows(self, since=None):
+        """
+        Generator of (timeStamp, row dict) tuples of the samples newer than since, oldest first
+        """
+        first = 0 if since is None else self.firstAfter(since)
+        for i in range(first, self.count):
+            position = self.position(i)
+            row = dict([(name, fromStored(name, self.arrays[name][position])) for name in columnNames[1:]])
+            row['BeerAnn'] = None
+            row['FridgeAnn'] = None
+            yield self.arrays['Time'][position], row
+
+    def toJson(self, since=None):
+        """
+        Returns the samples newer than since as a JSON string in the DataTable format of the daily files.
+        The time stamp of the last sample is added as lastTime, to be used as since in the next request.
+        """
+        jsonRows = []
+        lastTime = since
+        for timeStamp, row in self.rows(since):
+            jsonRows.append(brewpiJson.jsonRow(row, datetime.fromtimestamp(timeStamp)))
+            lastTime = timeStamp
+        return ("{" + brewpiJson.jsonCols + ",\"rows\":[" + ",".join(jsonRows) + "],\"lastTime\":" +
+                ("null" if lastTime is None else repr(lastTime)) + "}")
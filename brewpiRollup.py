@@ -0,0 +1,161 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+import os
+import time
+
+import simplejson as json
+
+# temperature columns that are aggregated
+rollupColumns = ('BeerTemp', 'BeerSet', 'FridgeTemp', 'FridgeSet', 'RoomTemp')
+
+# resolutions with the number of buckets that is kept, None to keep all
+rollupResolutions = (('minute', 60, 24 * 60),
+                     ('hour', 3600, None),
+                     ('day', 86400, None))
+
+maxStateGap = 3600  # time between samples is not counted for the state when it is longer, the script was not running
+
+
+def bucketStart(resolution, timeStamp):
+    """
+    Returns the start of the bucket that timeStamp falls in. Days start at local midnight.
+    """
+    if resolution == 'day':
+        t = time.localtime(timeStamp)
+        return int(time.mktime((t.tm_year, t.tm_mon, t.tm_mday, 0, 0, 0, 0, 0, -1)))
+    seconds = dict([(name, size) for name, size, keep in rollupResolutions])[resolution]
+    return int(timeStamp // seconds * seconds)
+
+
+class RollupEngine:
+    """
+    Keeps the minimum, maximum, mean and count of each temperature column and the time spent in each state,
+    per minute, hour and day. Every sample updates one bucket per resolution, so adding a sample takes constant time.
+
+    The time between two samples is added to the state of the first sample, in the buckets of the first sample.
+    """
+
+    def __init__(self, fileName=None):
+        """
+        Params:
+        fileName: JSON file the aggregates are saved to and loaded from, None to keep them in memory only
+        """
+        self.fileName = fileName
+        self.buckets = dict([(name, OrderedDict()) for name, size, keep in rollupResolutions])
+        self.prevTime = None
+        self.prevState = None
+        self.changed = False
+        if fileName is not None and os.path.exists(fileName):
+            self.load()
+
+    def bucket(self, resolution, timeStamp):
+        buckets = self.buckets[resolution]
+        start = bucketStart(resolution, timeStamp)
+        bucket = buckets.get(start)
+        if bucket is None:
+            bucket = {'temps': {}, 'states': {}}
+            buckets[start] = bucket
+            keep = [k for name, size, k in rollupResolutions if name == resolution][0]
+            if keep is not None and len(buckets) > keep:
+                buckets.popitem(last=False)
+        return bucket
+
+    def add(self, row, timeStamp=None):
+        """
+        Adds a sample to the aggregates.
+
+        Params:
+        row: dict with the data row
+        timeStamp: time of the sample in seconds since epoch, defaults to now
+        """
+        if timeStamp is None:
+            timeStamp = time.time()
+        for resolution, size, keep in rollupResolutions:
+            bucket = self.bucket(resolution, timeStamp)
+            for column in rollupColumns:
+                value = row.get(column)
+                if value is None:
+                    continue
+                value = float(value)
+                stats = bucket['temps'].get(column)
+                if stats is None:
+                    bucket['temps'][column] = [1, value, value, value]  # count, sum, min, max
+                else:
+                    stats[0] += 1
+                    stats[1] += value
+                    if value < stats[2]:
+                        stats[2] = value
+                    if value > stats[3]:
+                        stats[3] = value
+            if self.prevState is not None and 0 < timeStamp - self.prevTime <= maxStateGap:
+                prevBucket = self.bucket(resolution, self.prevTime)
+                state = str(self.prevState)
+                prevBucket['states'][state] = prevBucket['states'].get(state, 0) + timeStamp - self.prevTime
+        self.prevTime = timeStamp
+        self.prevState = row.get('State')
+        self.changed = True
+
+    def get(self, resolution, start=None, end=None):
+        """
+        Gets the aggregates of the buckets that start between start and end.
+
+        Params:
+        resolution: 'minute', 'hour' or 'day'
+        start: seconds since epoch, None for the first bucket
+        end: seconds since epoch, None for the last bucket
+
+        Returns:
+        list of dicts with the start time of the bucket as 'time', a dict with count, min, max and mean for each
+        temperature column and 'states' with the number of seconds spent in each state
+        """
+        result = []
+        for bucketTime in sorted(self.buckets[resolution]):
+            if (start is not None and bucketTime < start) or (end is not None and bucketTime > end):
+                continue
+            bucket = self.buckets[resolution][bucketTime]
+            summary = {'time': bucketTime, 'states': dict(bucket['states'])}
+            for column, (count, total, minimum, maximum) in bucket['temps'].items():
+                summary[column] = {'count': count, 'min': minimum, 'max': maximum, 'mean': round(total / count, 3)}
+            result.append(summary)
+        return result
+
+    def load(self):
+        with open(self.fileName, 'r') as f:
+            saved = json.load(f)
+        for name, size, keep in rollupResolutions:
+            for bucketTime, bucket in sorted([(int(t), b) for t, b in saved.get(name, {}).items()]):
+                self.buckets[name][bucketTime] = bucket
+        self.prevTime = saved.get('prevTime')
+        self.prevState = saved.get('prevState')
+
+    def save(self):
+        """
+        Writes the aggregates to the JSON file, when they changed since the last save
+        """
+        if self.fileName is None or not self.changed:
+            return
+        saved = dict([(name, buckets) for name, buckets in self.buckets.items()])
+        saved['prevTime'] = self.prevTime
+        saved['prevState'] = self.prevState
+        tmpFileName = self.fileName + '.tmp'
+        with open(tmpFileName, 'w') as f:
+            json.dump(saved, f)
+        if os.name == 'nt' and os.path.exists(self.fileName):
+            os.remove(self.fileName)  # rename does not replace files on Windows
+        os.rename(tmpFileName, self.fileName)  # replace the old file at once, so it is never half written
+        self.changed = False
@@ -0,0 +1,134 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import Queue
+import threading
+
+
+class LineFramer:
+    """
+    Splits the data received from the Arduino into lines. Data can be added in chunks of any size, a line that is
+    not complete yet is kept until the rest of it is received.
+    """
+
+    def __init__(self):
+        self.partial = ''
+
+    def feed(self, data):
+        """
+        Adds received data.
+        Returns: list of the lines that were completed by the data, without line endings. Empty lines are skipped.
+        """
+        lines = (self.partial + data).split('\n')
+        self.partial = lines.pop()
+        return [line.rstrip('\r') for line in lines if line.rstrip('\r')]
+
+
+def readAvailable(ser):
+    """
+    Reads all data that is waiting on the serial port without waiting for more, but at least one byte.
+    When nothing is waiting, this waits up to the timeout of the port, which raises an exception when the port is
+    disconnected instead of returning nothing forever.
+    """
+    return ser.read(max(ser.inWaiting(), 1))
+
+
+class SerialReader(threading.Thread):
+    """
+    Reads the serial port in a background thread and queues the received lines, so the main loop never waits for
+    the serial port. The main loop can wait for lines with select on this object, which is readable through a pipe
+    when lines have been queued. On Windows, where select does not support pipes, it has to check lines instead.
+    """
+
+    def __init__(self, ser):
+        threading.Thread.__init__(self)
+        self.daemon = True  # do not keep the script running when the main thread exits
+        self.ser = ser
+        self.framer = LineFramer()
+        self.lines = Queue.Queue()  # received lines, or the exception that stopped the thread
+        self.running = True
+        self.wakeupRead = None
+        self.wakeupWrite = None
+        if os.name != 'nt':
+            import fcntl
+            self.wakeupRead, self.wakeupWrite = os.pipe()
+            for fd in (self.wakeupRead, self.wakeupWrite):
+                fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+    def fileno(self):
+        return self.wakeupRead
+
+    def run(self):
+        while self.running:
+            try:
+                data = readAvailable(self.ser)
+            except Exception as e:  # serial.SerialException or OSError when the port is gone
+                if self.running:
+                    self.lines.put(e)
+                    self.wakeup()
+                return
+            lines = self.framer.feed(data)
+            for line in lines:
+                self.lines.put(line)
+            if lines:
+                self.wakeup()
+
+    def wakeup(self):
+        if self.wakeupWrite is not None:
+            try:
+                os.write(self.wakeupWrite, 'x')
+            except OSError:
+                pass  # the pipe is full, so the main loop will wake up anyway
+
+    def receivedLines(self):
+        """
+        Returns the lines that were received since the last call, without waiting.
+        Raises the exception that stopped the thread when reading the port failed, on the next call when lines were
+        received before it, so those lines are still processed.
+        """
+        if self.wakeupRead is not None:
+            try:
+                os.read(self.wakeupRead, 4096)
+            except OSError:
+                pass  # nothing to read
+        lines = []
+        while True:
+            try:
+                item = self.lines.get_nowait()
+            except Queue.Empty:
+                return lines
+            if isinstance(item, Exception):
+                if lines:
+                    # the thread has stopped, so the exception is the last item in the queue again
+                    self.lines.put(item)
+                    self.wakeup()
+                    return lines
+                raise item
+            lines.append(item)
+
+    def stop(self):
+        """
+        Stops the thread, it is done within the timeout of the serial port
+        """
+        self.running = False
+        if self.is_alive():
+            self.join()
+        for fd in (self.wakeupRead, self.wakeupWrite):
+            if fd is not None:
+                os.close(fd)
+        self.wakeupRead = None
+        self.wakeupWrite = None
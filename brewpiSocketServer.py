@@ -0,0 +1,330 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+import errno
+import socket
+import time
+
+import simplejson as json
+
+import BrewPiUtil as util
+
+# errors of non blocking sockets that mean: try again later
+retryErrors = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+maxRequestSize = 1024 * 1024  # sessions sending a longer line are closed
+maxBufferSize = 4 * 1024 * 1024  # subscribers that let this many bytes of pushed messages pile up are closed
+
+
+class RawJson(str):
+    """
+    A reply that is JSON already, it is sent as is instead of being encoded again
+    """
+    pass
+
+
+class DeferredReply:
+    """
+    A reply that is not known yet when the handler returns, like the confirmation of a command by the Arduino.
+    The handler returns it and calls resolve with the reply later.
+    """
+
+    def __init__(self):
+        self.callbacks = []
+        self.resolved = False
+        self.reply = None
+
+    def addCallback(self, callback):
+        """
+        Calls callback with the reply when it is resolved, right away when it is resolved already
+        """
+        if self.resolved:
+            callback(self.reply)
+        else:
+            self.callbacks.append(callback)
+
+    def resolve(self, reply=None):
+        self.resolved = True
+        self.reply = reply
+        for callback in self.callbacks:
+            callback(reply)
+        self.callbacks = []
+
+
+def encodeReply(reply):
+    """
+    Encodes the reply of a handler for a client that sent a single message: strings are sent as is, other
+    objects as JSON
+    """
+    if reply is None:
+        return ''
+    if isinstance(reply, basestring):
+        return reply
+    return json.dumps(reply)
+
+
+def encodeResponse(requestId, reply=None, error=None):
+    """
+    Encodes the response to a request in a session: a JSON object on a single line with the id of the request and
+    the reply as result, or an error message
+    """
+    if error is not None:
+        return json.dumps({'id': requestId, 'error': error}) + '\n'
+    if isinstance(reply, RawJson):
+        result = reply
+    else:
+        result = json.dumps(reply)
+    return '{"id": ' + json.dumps(requestId) + ', "result": ' + result + '}\n'
+
+
+class Connection:
+    """
+    A client connected to the socket server. Sending only adds data to a buffer, which is written to the client
+    when it is ready to receive it, so a slow client cannot make the script wait.
+    """
+
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self.inBuffer = ''  # start of a request that has not been received completely, in a session
+        self.outBuffer = ''
+        self.session = None  # whether this is a session, known when the first data is received
+        self.topics = set()  # topics the session subscribed to
+        self.closing = False  # close when the buffer has been written
+        self.waitingForReply = False  # a single message whose reply is a DeferredReply that is not resolved yet
+        self.lastActivity = time.time()
+
+    def send(self, data):
+        """
+        Buffers data to be sent to the client
+        Returns: the number of bytes buffered, like socket.send
+        """
+        if data:
+            self.outBuffer += data
+            self.server.loop.addWriter(self.sock, self.write)
+        return len(data)
+
+    sendall = send
+
+    def subscribe(self, topics):
+        self.topics.update(topics)
+
+    def unsubscribe(self, topics=None):
+        """
+        Unsubscribes from topics, from all topics when topics is None
+        """
+        if topics is None:
+            self.topics.clear()
+        else:
+            self.topics.difference_update(topics)
+
+    def finish(self):
+        """
+        Closes the connection when all buffered data has been sent
+        """
+        self.closing = True
+        if not self.outBuffer:
+            self.server.close(self)
+
+    def read(self):
+        try:
+            data = self.sock.recv(65536)
+        except socket.error as e:
+            if e.args[0] in retryErrors:
+                return
+            self.server.close(self)
+            return
+        if not data:
+            self.server.close(self)  # client closed the connection
+            return
+        self.lastActivity = time.time()
+        self.server.dataReceived(self, data)
+
+    def write(self):
+        try:
+            sent = self.sock.send(self.outBuffer)
+        except socket.error as e:
+            if e.args[0] in retryErrors:
+                return
+            util.logMessage("Socket error(%d) while sending reply: %s" % (e.args[0], e.args[-1]))
+            self.server.close(self)
+            return
+        self.lastActivity = time.time()
+        self.outBuffer = self.outBuffer[sent:]
+        if not self.outBuffer:
+            self.server.loop.removeWriter(self.sock)
+            if self.closing:
+                self.server.close(self)
+
+
+class SocketServer:
+    """
+    Accepts connections on a listening socket without blocking, reads messages from them and passes them to a
+    handler. A connection either carries a single message or is a session with any number of requests.
+
+    Single message: the client sends a message like 'getMode' or 'setBeer=20.0'. The reply is sent and the
+    connection is closed.
+
+    Session: when the first data the client sends starts with {, the connection stays open. Each request is a
+    JSON object on a line of its own, like {"id": 1, "cmd": "setBeer", "value": 20.0}. The value is optional and
+    can be any JSON value; a value that is not a string is passed to the handler as JSON. A request can name the
+    chamber it is for: {"chamber": "fridge2", "cmd": "getMode"} is passed to the handler as fridge2/getMode.
+    Requests are handled in the order they are received, the client does not have to wait for a response before
+    sending the next request.
+    Each response is a JSON object on a line of its own, with the id of the request and the reply of the handler as
+    result: {"id": 1, "result": null}. Requests that cannot be parsed get an error instead of a result. A handler
+    can return a DeferredReply for a reply that is not known yet, its response is sent when it is resolved.
+
+    A session can subscribe to topics. Messages published on a topic are pushed to the subscribed sessions as a
+    line with the topic and the data, without an id: {"topic": "lcd", "data": ["line 1", ...]}
+    """
+
+    def __init__(self, loop, sock, handler, timeout=10.0):
+        """
+        Params:
+        loop: brewpiEventLoop.EventLoop to run on
+        sock: bound socket, listening is started here
+        handler: function called with the Connection and the message, returns the reply
+        timeout: connections that are not a session are closed when there has been no activity for this many seconds
+        """
+        self.loop = loop
+        self.sock = sock
+        self.handler = handler
+        self.timeout = timeout
+        self.connections = []
+        sock.setblocking(0)
+        sock.listen(10)  # Create a backlog queue for up to 10 connections
+        loop.addReader(sock, self.accept)
+        loop.callEvery(1.0, self.closeIdle)
+
+    def accept(self):
+        try:
+            sock, addr = self.sock.accept()
+        except socket.error as e:
+            if e.args[0] in retryErrors + (errno.ECONNABORTED,):
+                return  # the client gave up before the connection was accepted
+            raise
+        sock.setblocking(0)
+        connection = Connection(self, sock)
+        self.connections.append(connection)
+        self.loop.addReader(sock, connection.read)
+
+    def dataReceived(self, connection, data):
+        if connection.session is None:
+            connection.session = data.lstrip().startswith('{')
+        if not connection.session:
+            if connection.closing:
+                return  # the message has been handled already
+            reply = self.handler(connection, data)
+            if isinstance(reply, DeferredReply):
+                connection.closing = True  # ignore further data while waiting for the reply
+                connection.waitingForReply = True  # not idle, the reply can take longer than the timeout
+                reply.addCallback(lambda result: self.sendReply(connection, encodeReply(result), True))
+            else:
+                connection.send(encodeReply(reply))
+                connection.finish()
+            return
+
+        requests = (connection.inBuffer + data).split('\n')
+        connection.inBuffer = requests.pop()
+        if len(connection.inBuffer) > maxRequestSize:
+            util.logMessage("Closing socket session, request is longer than %d bytes" % maxRequestSize)
+            self.close(connection)
+            return
+        for request in requests:
+            if request.strip():
+                connection.send(self.handleRequest(connection, request))
+
+    def handleRequest(self, connection, line):
+        """
+        Handles a request of a session
+        Returns: the encoded response
+        """
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return encodeResponse(None, error="Invalid JSON")
+        if not isinstance(request, dict) or not isinstance(request.get('cmd'), basestring):
+            return encodeResponse(None, error="Request needs a cmd")
+        value = request.get('value', '')
+        if not isinstance(value, basestring):
+            value = json.dumps(value)
+        message = request['cmd'] + ('=' + value if value else '')  # like a single message
+        if isinstance(request.get('chamber'), basestring):
+            message = request['chamber'] + '/' + message
+        message = message.encode('utf-8')
+        reply = self.handler(connection, message)
+        if isinstance(reply, DeferredReply):
+            # the response is sent when the reply is known, responses to later requests can be sent before it
+            requestId = request.get('id')
+            reply.addCallback(lambda result: self.sendReply(connection, encodeResponse(requestId, result)))
+            return ''
+        return encodeResponse(request.get('id'), reply)
+
+    def sendReply(self, connection, data, finish=False):
+        """
+        Sends the reply of a DeferredReply, unless the connection has been closed in the meantime
+        """
+        if connection not in self.connections:
+            return
+        connection.waitingForReply = False
+        connection.send(data)
+        if finish:
+            connection.finish()
+
+    def subscribed(self, topic):
+        """
+        Returns whether any session is subscribed to topic, to skip preparing messages nobody receives
+        """
+        for connection in self.connections:
+            if topic in connection.topics:
+                return True
+        return False
+
+    def publish(self, topic, data):
+        """
+        Pushes data to all sessions subscribed to topic. The message is encoded once for all of them.
+        """
+        message = None
+        for connection in list(self.connections):
+            if topic not in connection.topics:
+                continue
+            if message is None:
+                message = json.dumps({'topic': topic, 'data': data}) + '\n'
+            if len(connection.outBuffer) > maxBufferSize:
+                util.logMessage("Closing socket session, it does not receive the messages it subscribed to")
+                self.close(connection)
+                continue
+            connection.send(message)
+
+    def close(self, connection):
+        if connection not in self.connections:
+            return
+        self.connections.remove(connection)
+        self.loop.removeReader(connection.sock)
+        self.loop.removeWriter(connection.sock)
+        connection.sock.close()
+
+    def closeIdle(self):
+        now = time.time()
+        for connection in list(self.connections):
+            if not connection.session and not connection.waitingForReply and \
+                    now - connection.lastActivity > self.timeout:
+                self.close(connection)
+
+    def closeAll(self):
+        for connection in list(self.connections):
+            self.close(connection)
@@ -0,0 +1,94 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+import simplejson as json
+
+
+class StateVersions:
+    """
+    Keeps track of changes to the parts of the state that clients request, like the LCD text and the control
+    settings. Every change increases the state version and gives the changed field that version, so a client that
+    knows the version of its last update can ask for the fields that changed after it.
+    """
+
+    def __init__(self, fields, start=None):
+        """
+        Params:
+        fields: names of the fields
+        start: first version, defaults to the current time in milliseconds. That keeps versions increasing when the
+               script is restarted, so clients notice the changes.
+        """
+        if start is None:
+            start = int(time.time() * 1000)
+        self.version = start
+        self.versions = dict([(field, start) for field in fields])
+
+    def changed(self, field):
+        """
+        Marks a field as changed
+        """
+        self.version += 1
+        self.versions[field] = self.version
+
+    def update(self, field, oldValue, newValue):
+        """
+        Marks a field as changed when the new value differs from the old value
+        Returns: whether the value changed
+        """
+        if oldValue == newValue:
+            return False
+        self.changed(field)
+        return True
+
+    def changedSince(self, since=None, fields=None):
+        """
+        Returns the names of the fields that changed after version since, limited to fields when it is given
+        """
+        if fields is None:
+            fields = self.versions.keys()
+        return [field for field in fields if since is None or self.versions[field] > since]
+
+
+class ResponseCache:
+    """
+    Keeps the JSON encoding of each field of a StateVersions, so a field is encoded once per version instead of
+    once per request
+    """
+
+    def __init__(self, stateVersions, getters, encode=json.dumps):
+        """
+        Params:
+        stateVersions: StateVersions of the fields
+        getters: dict of field name: function that returns the current value of the field
+        encode: function that encodes a value
+        """
+        self.stateVersions = stateVersions
+        self.getters = getters
+        self.encode = encode
+        self.cache = {}  # field: (version, encoded value)
+
+    def get(self, field):
+        """
+        Returns the encoded value of field, encoded again only when the field changed since the last call
+        """
+        version = self.stateVersions.versions[field]
+        cached = self.cache.get(field)
+        if cached is None or cached[0] != version:
+            cached = (version, self.encode(self.getters[field]()))
+            self.cache[field] = cached
+        return cached[1]
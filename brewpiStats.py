@@ -0,0 +1,239 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+import time
+from collections import OrderedDict, defaultdict, deque
+
+# upper bounds in seconds of the histogram buckets: 10 microseconds, doubling up to about 2.5 minutes
+bucketBounds = [0.00001 * 2 ** i for i in range(24)]
+
+# requests to the Arduino and the type of the line it replies with
+replyTypes = {'t': 'T', 'l': 'L', 's': 'S', 'c': 'C', 'v': 'V'}
+
+
+class Histogram:
+    """
+    Counts durations in a fixed number of buckets with exponentially growing sizes, so the memory use does not grow
+    with the number of durations. Percentiles are the upper bound of the bucket they fall in, so they are accurate to
+    a factor of 2.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(bucketBounds) + 1)  # the last bucket counts durations above the last bound
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(bucketBounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """
+        Returns: the duration in seconds that fraction of the durations is below, None when nothing was counted
+        """
+        if not self.count:
+            return None
+        needed = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= needed and count:
+                return min(bucketBounds[i], self.max) if i < len(bucketBounds) else self.max
+        return self.max
+
+    def asDict(self):
+        """
+        Returns: dict with the count and the mean, max and percentiles in milliseconds
+        """
+        if not self.count:
+            return {'count': 0}
+        return OrderedDict([('count', self.count),
+                            ('mean', round(1000 * self.total / self.count, 3)),
+                            ('p50', round(1000 * self.percentile(0.5), 3)),
+                            ('p90', round(1000 * self.percentile(0.9), 3)),
+                            ('p99', round(1000 * self.percentile(0.99), 3)),
+                            ('max', round(1000 * self.max, 3))])
+
+
+class StageTimer:
+    """
+    Context manager that adds the time spent in its block to a histogram. Not reentrant, use it for one stage.
+    """
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+
+    def __exit__(self, excType, excValue, traceback):
+        self.histogram.add(time.time() - self.start)
+
+
+class LoopStats:
+    """
+    Histograms of the time spent in each stage of the main loop, like waiting for the socket and serial port,
+    handling socket messages, writing to the serial port, processing each line type and writing the data files.
+    """
+
+    def __init__(self):
+        self.histograms = OrderedDict()  # stage name: Histogram, in the order the stages were first timed
+        self.timers = {}
+        self.since = time.time()
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def stage(self, name):
+        """
+        Returns: a StageTimer for a stage, use as 'with stats.stage(name):'
+        """
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = StageTimer(self.histogram(name))
+        return timer
+
+    def add(self, name, seconds):
+        self.histogram(name).add(seconds)
+
+    def timed(self, name, function):
+        """
+        Returns: a function that calls function and adds the time of each call to the stage name
+        """
+        histogram = self.histogram(name)
+
+        def timedFunction(*args, **kwargs):
+            start = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.add(time.time() - start)
+        return timedFunction
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.__init__()
+        self.since = time.time()
+
+    def asDict(self):
+        """
+        Returns: dict with the time the stats were started and the histogram of each stage, for the loopStats message
+        """
+        return OrderedDict([('since', self.since),
+                            ('stages', OrderedDict((name, histogram.asDict())
+                                                   for name, histogram in self.histograms.items()))])
+
+    def summary(self):
+        """
+        Returns: one line with the count, median, 99th percentile and maximum of each stage in milliseconds
+        """
+        parts = []
+        for name, histogram in self.histograms.items():
+            if histogram.count:
+                parts.append("%s n=%d p50=%.2f p99=%.2f max=%.2f" % (name, histogram.count,
+                                                                     1000 * histogram.percentile(0.5),
+                                                                     1000 * histogram.percentile(0.99),
+                                                                     1000 * histogram.max))
+        return ", ".join(parts)
+
+
+class SerialStats:
+    """
+    Counters of the traffic with one Arduino: lines and bytes received per line type, bytes written, lines that could
+    not be decoded or processed, and histograms of the time from each request for data (t, l, s, c, v) to the line the
+    Arduino replies with.
+
+    Replies are matched to the oldest request of their type that is waiting for a reply. Requests that have not been
+    answered after replyTimeout seconds are counted as unanswered, so a lost request does not make the later replies
+    look slow.
+    """
+
+    def __init__(self, replyTimeout=5.0, maxWaiting=10):
+        self.replyTimeout = replyTimeout
+        self.maxWaiting = maxWaiting
+        self.waiting = dict((request, deque()) for request in replyTypes)  # send times of requests
+        self.requestOf = dict((reply, request) for request, reply in replyTypes.items())
+        self.reset()
+
+    def reset(self):
+        self.since = time.time()
+        self.lines = defaultdict(int)  # line type: number of lines received
+        self.bytes = defaultdict(int)  # line type: number of bytes received, line endings included
+        self.bytesWritten = 0
+        self.decodeErrors = defaultdict(int)  # line type: number of lines with invalid JSON
+        self.unknownLines = 0
+        self.unanswered = defaultdict(int)  # request: number of requests without a reply
+        self.latency = OrderedDict((request, Histogram()) for request in sorted(replyTypes))
+
+    def written(self, data):
+        """
+        Counts data written to the Arduino and remembers the time of requests for data
+        """
+        self.bytesWritten += len(data)
+        waiting = self.waiting.get(data)
+        if waiting is not None:
+            if len(waiting) >= self.maxWaiting:
+                waiting.popleft()
+                self.unanswered[data] += 1
+            waiting.append(time.time())
+
+    def received(self, line):
+        """
+        Counts a line received from the Arduino. A reply to a request adds the round trip time to its histogram.
+        """
+        lineType = line[0]
+        self.lines[lineType] += 1
+        self.bytes[lineType] += len(line) + 1
+        request = self.requestOf.get(lineType)
+        if request is None:
+            return
+        waiting = self.waiting[request]
+        now = time.time()
+        while waiting and now - waiting[0] > self.replyTimeout:
+            waiting.popleft()
+            self.unanswered[request] += 1
+        if waiting:
+            self.latency[request].add(now - waiting.popleft())
+
+    def asDict(self):
+        """
+        Returns: dict with the counters, the rates per second since the stats were started and the round trip times
+        in milliseconds, for the serialStats message
+        """
+        seconds = max(time.time() - self.since, 0.001)
+        lines = OrderedDict()
+        for lineType in sorted(self.lines):
+            lines[lineType] = OrderedDict([('lines', self.lines[lineType]),
+                                           ('bytes', self.bytes[lineType]),
+                                           ('linesPerSecond', round(self.lines[lineType] / seconds, 3)),
+                                           ('bytesPerSecond', round(self.bytes[lineType] / seconds, 3))])
+        return OrderedDict([('since', self.since),
+                            ('lines', lines),
+                            ('bytesWritten', self.bytesWritten),
+                            ('decodeErrors', dict(self.decodeErrors)),
+                            ('unknownLines', self.unknownLines),
+                            ('unanswered', dict(self.unanswered)),
+                            ('latency', OrderedDict((request, histogram.asDict())
+                                                    for request, histogram in self.latency.items()))])
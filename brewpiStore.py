@@ -0,0 +1,255 @@
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+
+import brewpiJson
+import brewpiCsv
+
+# Columns of the store with their array type code. Time is in seconds since epoch.
+# Missing temperatures are stored as NaN, a missing state as -1.
+columns = (('Time', 'd'),
+           ('BeerTemp', 'f'),
+           ('BeerSet', 'f'),
+           ('FridgeTemp', 'f'),
+           ('FridgeSet', 'f'),
+           ('RoomTemp', 'f'),
+           ('State', 'b'))
+
+columnNames = tuple([name for name, typeCode in columns])
+
+segmentMagic = 'BPS1'
+segmentHeader = struct.Struct('<4sII')  # magic, capacity, row count
+segmentRows = 8192  # capacity of a new segment, about 11 days of data at the default interval
+
+
+def toStored(name, value):
+    """
+    Converts a value from a data row to the value that is stored in the column
+    """
+    if name == 'State':
+        return -1 if value is None else int(value)
+    return float('nan') if value is None else float(value)
+
+
+def fromStored(name, value):
+    """
+    Converts a stored value back to the value used in a data row
+    """
+    if name == 'State':
+        return None if value < 0 else value
+    if name == 'Time':
+        return value
+    return None if math.isnan(value) else round(value, 2)  # temperatures are stored as single precision floats
+
+
+class Segment:
+    """
+    A file with a fixed number of rows, stored column by column, that is memory mapped for reading and appending.
+    The row count in the header is updated after the values are written, so an interrupted append is ignored.
+    """
+
+    def __init__(self, fileName, capacity=segmentRows):
+        """
+        Opens a segment file, a new file with room for capacity rows is created when it does not exist yet
+        """
+        self.fileName = fileName
+        if not os.path.isfile(fileName):
+            size = segmentHeader.size + capacity * sum([struct.calcsize(t) for n, t in columns])
+            with open(fileName, 'wb') as f:
+                f.write(segmentHeader.pack(segmentMagic, capacity, 0))
+                f.truncate(size)
+        self.file = open(fileName, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        magic, self.capacity, self.count = segmentHeader.unpack_from(self.map, 0)
+        if magic != segmentMagic:
+            raise ValueError("%s is not a BrewPi data store segment" % fileName)
+        self.offsets = {}  # start of each column in the file
+        offset = segmentHeader.size
+        for name, typeCode in columns:
+            self.offsets[name] = offset
+            offset += self.capacity * struct.calcsize(typeCode)
+
+    def isFull(self):
+        return self.count >= self.capacity
+
+    def append(self, values):
+        """
+        Appends one row to the segment.
+
+        Params:
+        values: sequence of stored values, in the order of the columns
+        """
+        for (name, typeCode), value in zip(columns, values):
+            struct.pack_into('<' + typeCode, self.map, self.offsets[name] + self.count * struct.calcsize(typeCode),
+                             value)
+        self.count += 1
+        struct.pack_into('<I', self.map, 8, self.count)
+
+    def column(self, name, start=0, end=None):
+        """
+        Returns the values of rows start to end of a column as an array
+        """
+        typeCode = dict(columns)[name]
+        if end is None or end > self.count:
+            end = self.count
+        itemSize = struct.calcsize(typeCode)
+        offset = self.offsets[name]
+        values = array(typeCode)
+        values.fromstring(self.map[offset + start * itemSize:offset + end * itemSize])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class BrewStore:
+    """
+    Binary columnar store of the data of a brew: a directory of segment files that are filled one after the other.
+    The rows are kept in time order, so a query can find its range by binary search on the Time column.
+    """
+
+    def __init__(self, path, segmentCapacity=segmentRows):
+        """
+        Opens the store in directory path, the directory is created if it does not exist.
+        New segments get room for segmentCapacity rows.
+        """
+        self.path = path
+        self.segmentCapacity = segmentCapacity
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.segments = [Segment(os.path.join(path, fileName))
+                         for fileName in sorted(os.listdir(path)) if fileName.endswith('.seg')]
+        self.lastTime = None  # time stamp of the last row, rows before it are not stored
+        for segment in reversed(self.segments):
+            if segment.count:
+                self.lastTime = segment.column('Time', segment.count - 1)[0]
+                break
+        self.outOfOrder = 0  # number of rows that were not stored because they were older than the last row
+
+    def newSegment(self):
+        segment = Segment(os.path.join(self.path, '%05d.seg' % len(self.segments)), self.segmentCapacity)
+        self.segments.append(segment)
+        return segment
+
+    def append(self, row, timeStamp=None):
+        """
+        Appends a data row to the store. A row that is older than the last row is skipped, like the rows logged after
+        the clock was set back by NTP, because the queries need sorted time stamps.
+
+        Params:
+        row: dict with the data row, like the rows written to the JSON file
+        timeStamp: time of the row in seconds since epoch, defaults to now
+
+        Returns: True when the row was stored, False when it was skipped
+        """
+        if timeStamp is None:
+            timeStamp = time.time()
+        if self.lastTime is not None and timeStamp < self.lastTime:
+            self.outOfOrder += 1
+            return False
+        if not self.segments or self.segments[-1].isFull():
+            self.newSegment()
+        values = [timeStamp] + [toStored(name, row.get(name)) for name in columnNames[1:]]
+        self.segments[-1].append(values)
+        self.lastTime = timeStamp
+        return True
+
+    def __len__(self):
+        return sum([segment.count for segment in self.segments])
+
+    def query(self, start=None, end=None, names=columnNames):
+        """
+        Gets the data between two time stamps.
+
+        Params:
+        start: first time stamp to include, in seconds since epoch. None for the start of the brew.
+        end: last time stamp to include. None for the last row.
+        names: the columns to return
+
+        Returns:
+        dict with an array of values for each requested column and for Time
+        """
+        result = dict([(name, array(dict(columns)[name])) for name in names])
+        result.setdefault('Time', array('d'))
+        for segment in self.segments:
+            if segment.count == 0:
+                continue
+            times = segment.column('Time')
+            if (end is not None and times[0] > end) or (start is not None and times[-1] < start):
+                continue  # segment is outside the requested range
+            first = 0 if start is None else bisect_left(times, start)
+            last = len(times) if end is None else bisect_right(times, end)
+            result['Time'].extend(times[first:last])
+            for name in result:
+                if name != 'Time':
+                    result[name].extend(segment.column(name, first, last))
+        return result
+
+    def rows(self, start=None, end=None):
+        """
+        Generator of the data rows between start and end, as dicts with the same keys as the rows in the JSON file
+        """
+        data = self.query(start, end)
+        for i in range(len(data['Time'])):
+            row = dict([(name, fromStored(name, data[name][i])) for name in columnNames])
+            row['BeerAnn'] = None
+            row['FridgeAnn'] = None
+            yield row
+
+    def flush(self):
+        for segment in self.segments:
+            segment.flush()
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+
+def exportDataTable(store, jsonFileName, start=None, end=None):
+    """
+    Writes the data between start and end to a JSON file in the DataTable format used for the daily chart files
+    """
+    brewpiJson.newEmptyFile(jsonFileName)
+    writer = brewpiJson.ChartFileWriter(jsonFileName)
+    writer.write([brewpiJson.jsonRow(row, datetime.fromtimestamp(row['Time'])) for row in store.rows(start, end)])
+    writer.close()
+
+
+def exportCsv(store, csvFileName, start=None, end=None):
+    """
+    Writes the data between start and end to a CSV file in the same format as the CSV file of a brew
+    """
+    if os.path.exists(csvFileName):
+        os.remove(csvFileName)
+    writer = brewpiCsv.CsvFileWriter(csvFileName)
+    writer.write([brewpiCsv.csvRow(row, datetime.fromtimestamp(row['Time'])) for row in store.rows(start, end)])
+    writer.close()
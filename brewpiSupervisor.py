@@ -0,0 +1,458 @@
+#!/usr/bin/python
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+import errno
+import getopt
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows has no flock, a second supervisor is not detected there
+
+import BrewPiProcess
+import BrewPiUtil as util
+import brewpiEventLoop
+import brewpiSocketServer
+
+checkInterval = 0.1  # seconds between checks whether a worker has exited
+dontRunCheckInterval = 0.5  # seconds between checks of the do_not_run_brewpi files
+
+
+def writeDontRunFile(path):
+    dontrunfile = open(path, "w")
+    dontrunfile.write("1")
+    dontrunfile.close()
+
+
+class Worker:
+    """
+    A brewpi.py process run by the supervisor, for one chamber.
+    """
+
+    def __init__(self, name, command, dontRunFile=None):
+        """
+        Params:
+        name: name of the worker, the chamber id
+        command: list of the program and its arguments
+        dontRunFile: path of the do_not_run_brewpi file, the worker is not run while it exists
+        """
+        self.name = name
+        self.command = command
+        self.dontRunFile = dontRunFile
+        self.process = None
+        self.startTime = None
+        self.restartDelay = None  # set by the supervisor, doubles when the worker exits shortly after a start
+        self.restartTimer = None
+        self.restarts = 0
+        self.exitCode = None
+        self.stopDeadline = None  # the process is killed when it is still running at this time after being stopped
+        self.restartWhenStopped = False
+
+    def dontRun(self):
+        return self.dontRunFile is not None and os.path.exists(self.dontRunFile)
+
+    def status(self):
+        """
+        Returns: dict with the state of the worker, for the status control message
+        """
+        return {'running': self.process is not None,
+                'pid': self.process.pid if self.process is not None else None,
+                'uptime': round(time.time() - self.startTime, 1) if self.process is not None else None,
+                'restarts': self.restarts,
+                'exitCode': self.exitCode,
+                'dontRun': self.dontRun()}
+
+
+class Supervisor:
+    """
+    Keeps a brewpi.py worker process running for each chamber. A worker that exits is started again, right away the
+    first time and with a delay that doubles every time it exits again shortly after it was started.
+
+    A worker is not run while its do_not_run_brewpi file exists. The files are checked every dontRunCheckInterval
+    seconds: a worker is stopped when its file appears and started when the file is removed, like the web interface
+    does. The control socket does the same with the messages start, stop and restart, optionally followed by
+    =<chamber id>, and returns the state of the workers for the message status.
+    """
+
+    def __init__(self, loop, workers, stdout=None, stderr=None, minRestartDelay=0.1, maxRestartDelay=60.0,
+                 stableTime=60.0, stopTimeout=10.0):
+        """
+        Params:
+        loop: brewpiEventLoop.EventLoop to run on
+        workers: list of Worker objects
+        stdout, stderr: files the output of the workers is written to, None to inherit them
+        minRestartDelay, maxRestartDelay: range of the delay in seconds before a worker that exited is restarted
+        stableTime: the restart delay is reset when a worker ran for this many seconds
+        stopTimeout: seconds a worker gets to exit after SIGTERM, before it is killed
+        """
+        self.loop = loop
+        self.workers = OrderedDict((worker.name, worker) for worker in workers)
+        self.stdout = stdout
+        self.stderr = stderr
+        self.minRestartDelay = minRestartDelay
+        self.maxRestartDelay = maxRestartDelay
+        self.stableTime = stableTime
+        self.stopTimeout = stopTimeout
+        self.stopping = False
+        for worker in self.workers.values():
+            worker.restartDelay = minRestartDelay
+
+    def start(self):
+        self.loop.callEvery(checkInterval, self.checkWorkers)
+        self.loop.callEvery(dontRunCheckInterval, self.checkDontRun)
+        for worker in self.workers.values():
+            self.startWorker(worker)
+
+    def startWorker(self, worker):
+        """
+        Starts the process of a worker, unless it is already running or should not run
+        """
+        if worker.restartTimer is not None:
+            worker.restartTimer.cancel()
+            worker.restartTimer = None
+        if worker.process is not None or self.stopping or worker.dontRun():
+            return
+        try:
+            worker.process = subprocess.Popen(worker.command, stdout=self.stdout, stderr=self.stderr, close_fds=True)
+        except OSError as e:
+            util.logMessage("Error starting worker %s: %s" % (worker.name, e))
+            self.scheduleRestart(worker)
+            return
+        worker.startTime = time.time()
+        worker.stopDeadline = None
+        util.logMessage("Started worker %s with pid %d" % (worker.name, worker.process.pid))
+
+    def stopWorker(self, worker, restart=False):
+        """
+        Asks the process of a worker to exit with SIGTERM. It is killed when it has not exited after stopTimeout
+        seconds.
+
+        Params:
+        restart: start the worker again right after it exited
+        """
+        if worker.restartTimer is not None:
+            worker.restartTimer.cancel()
+            worker.restartTimer = None
+        if worker.process is None:
+            if restart:
+                self.startWorker(worker)
+            return
+        worker.restartWhenStopped = restart
+        if worker.stopDeadline is None:
+            worker.stopDeadline = time.time() + self.stopTimeout
+            try:
+                worker.process.terminate()
+            except OSError:
+                pass  # it has exited already, checkWorkers will find out
+
+    def scheduleRestart(self, worker):
+        util.logMessage("Restarting worker %s in %.1f seconds" % (worker.name, worker.restartDelay))
+        worker.restartTimer = self.loop.callLater(worker.restartDelay, self.startWorker, worker)
+        worker.restarts += 1
+        worker.restartDelay = min(worker.restartDelay * 2, self.maxRestartDelay)
+
+    def checkWorkers(self):
+        """
+        Restarts the workers that exited and kills the ones that did not exit in time after being stopped
+        """
+        now = time.time()
+        for worker in self.workers.values():
+            if worker.process is None:
+                continue
+            exitCode = worker.process.poll()
+            if exitCode is None:
+                if worker.stopDeadline is not None and now > worker.stopDeadline:
+                    util.logMessage("Worker %s did not exit in time, killing it" % worker.name)
+                    try:
+                        worker.process.kill()
+                    except OSError:
+                        pass
+                    worker.stopDeadline = now + self.stopTimeout
+                continue
+
+            stopped = worker.stopDeadline is not None
+            worker.process = None
+            worker.exitCode = exitCode
+            worker.stopDeadline = None
+            if now - worker.startTime >= self.stableTime:
+                worker.restartDelay = self.minRestartDelay
+            if stopped:
+                util.logMessage("Worker %s stopped" % worker.name)
+                if worker.restartWhenStopped:
+                    worker.restartWhenStopped = False
+                    self.startWorker(worker)
+            elif self.stopping or worker.dontRun():
+                util.logMessage("Worker %s exited with code %d, not restarting it" % (worker.name, exitCode))
+            else:
+                util.logMessage("Worker %s exited with code %d" % (worker.name, exitCode))
+                self.scheduleRestart(worker)
+
+    def checkDontRun(self):
+        """
+        Stops the workers whose do_not_run_brewpi file appeared and starts the ones whose file was removed
+        """
+        for worker in self.workers.values():
+            if worker.dontRun():
+                if worker.process is not None and worker.stopDeadline is None:
+                    util.logMessage("Found %s, stopping worker %s" % (worker.dontRunFile, worker.name))
+                    self.stopWorker(worker)
+            elif worker.process is None and worker.restartTimer is None:
+                self.startWorker(worker)
+
+    def shutdown(self):
+        """
+        Stops all workers and waits until they have exited
+        """
+        self.stopping = True
+        for worker in self.workers.values():
+            self.stopWorker(worker)
+        while any(worker.process is not None for worker in self.workers.values()):
+            time.sleep(checkInterval)
+            self.checkWorkers()
+
+    def handleMessage(self, conn, message):
+        """
+        Handles a message received on the control socket
+
+        Params:
+        conn: brewpiSocketServer.Connection the message was received on
+        message: start, stop, restart or status, optionally followed by = and the name of a worker
+
+        Returns: dict with the status of the workers for status, a status dict otherwise
+        """
+        if "=" in message:
+            messageType, name = message.split("=", 1)
+            if name not in self.workers:
+                return {'status': 1, 'statusMessage': "Unknown chamber '%s'" % name}
+            workers = [self.workers[name]]
+        else:
+            messageType = message
+            workers = self.workers.values()
+
+        if messageType == "status":
+            return OrderedDict((worker.name, worker.status()) for worker in workers)
+        elif messageType == "start":
+            for worker in workers:
+                if worker.dontRunFile is not None and os.path.exists(worker.dontRunFile):
+                    os.remove(worker.dontRunFile)
+                worker.restartDelay = self.minRestartDelay
+                self.startWorker(worker)
+        elif messageType == "stop":
+            for worker in workers:
+                if worker.dontRunFile is not None:
+                    writeDontRunFile(worker.dontRunFile)
+                self.stopWorker(worker)
+        elif messageType == "restart":
+            for worker in workers:
+                worker.restartDelay = self.minRestartDelay
+                self.stopWorker(worker, restart=True)
+        else:
+            util.logMessage("Error: Received invalid message on control socket: " + message)
+            return {'status': 1, 'statusMessage': "Unknown message '%s'" % messageType}
+        return {'status': 0, 'statusMessage': "%s done" % messageType}
+
+
+def readWorkerConfigs(configFile, config):
+    """
+    Reads the config of each chamber in the [chambers] section of the config file, or only the config file itself
+    when it has no [chambers] section.
+
+    Returns: list of (name of the worker, path of the config file, ConfigObj)
+    """
+    if 'chambers' in config:
+        configFiles = [(chamberId, os.path.abspath(chamberConfigFile))
+                       for chamberId, chamberConfigFile in config['chambers'].items()]
+    else:
+        configFiles = [('brewpi', configFile)]
+    return [(name, workerConfigFile, util.readCfgWithDefaults(workerConfigFile))
+            for name, workerConfigFile in configFiles]
+
+
+def layoutErrors(workerConfigs):
+    """
+    Checks that the chambers can run side by side, each in its own brewpi.py process. Every chamber needs its own
+    scriptPath and wwwPath for its data files, profile and do_not_run_brewpi file, its own serial port and its own
+    socket. The socket file is in the scriptPath, but chambers with useInternetSocket need their own socketPort.
+
+    Params:
+    workerConfigs: list of (name, config file, ConfigObj), as returned by readWorkerConfigs
+
+    Returns: list of error messages, empty when the chambers do not share anything
+    """
+    errors = []
+    for setting in ('scriptPath', 'wwwPath', 'port', 'socket'):
+        owners = {}
+        for name, workerConfigFile, workerConfig in workerConfigs:
+            if setting == 'socket':
+                value = BrewPiProcess.BrewPiProcess.fromConfig(workerConfigFile, workerConfig, []).socketAddress()
+            elif setting == 'port':
+                value = workerConfig['port']
+            else:
+                value = os.path.normpath(os.path.abspath(workerConfig[setting]))
+            if value in owners:
+                errors.append("Chambers '%s' and '%s' have the same %s %s" % (owners[value], name, setting, value))
+            else:
+                owners[value] = name
+    return errors
+
+
+def createWorkers(workerConfigs, logToFiles=False):
+    """
+    Creates a worker for each chamber, which runs brewpi.py with the config file of the chamber
+
+    Params:
+    workerConfigs: list of (name, config file, ConfigObj), as returned by readWorkerConfigs
+    logToFiles: start brewpi.py with --log, so each worker writes to the log files in its own scriptPath and
+    starts a new stdout.txt every time it is started
+
+    Returns: list of Worker objects
+    """
+    brewpiScript = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brewpi.py')
+    workers = []
+    for name, workerConfigFile, workerConfig in workerConfigs:
+        command = [sys.executable, '-u', brewpiScript, '--config', workerConfigFile]
+        if logToFiles:
+            command.append('--log')
+            logPath = util.addSlash(workerConfig['scriptPath']) + 'logs'
+            if not os.path.isdir(logPath):
+                os.makedirs(logPath)
+        dontRunFile = util.addSlash(workerConfig['wwwPath']) + 'do_not_run_brewpi'
+        workers.append(Worker(name, command, dontRunFile))
+    return workers
+
+
+def sendMessage(socketFile, message):
+    """
+    Sends a message to the control socket of a running supervisor and returns the reply
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(socketFile)
+    sock.sendall(message)
+    reply = ''
+    while True:
+        data = sock.recv(4096)
+        if not data:
+            break
+        reply += data
+    sock.close()
+    return reply
+
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hc:ls:", ['help', 'config=', 'log', 'send='])
+    except getopt.GetoptError:
+        print "Unknown parameter, available Options: --help, --config <path to config file>, --log, --send <message>"
+        sys.exit(1)
+
+    configFile = util.addSlash(sys.path[0]) + 'settings/config.cfg'
+    logToFiles = False
+    message = None
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            print "\n Available command line options: "
+            print "--help: print this help message"
+            print "--config <path to config file>: config file to use, settings/config.cfg when omitted"
+            print "--log: redirect the output of the supervisor to logs/stderr.txt and start the workers with --log"
+            print "--send <message>: send start, stop, restart or status, optionally followed by =<chamber id>, " \
+                  "to the running supervisor and print the reply"
+            sys.exit(0)
+        if o in ('-c', '--config'):
+            configFile = os.path.abspath(a)
+            if not os.path.exists(configFile):
+                sys.exit('ERROR: Config file "%s" was not found!' % configFile)
+        if o in ('-l', '--log'):
+            logToFiles = True
+        if o in ('-s', '--send'):
+            message = a
+
+    config = util.readCfgWithDefaults(configFile)
+    socketFile = util.addSlash(config['scriptPath']) + 'SUPERVISORSOCKET'
+
+    if message is not None:
+        try:
+            print sendMessage(socketFile, message)
+        except socket.error as e:
+            sys.exit("Could not connect to the supervisor on %s: %s" % (socketFile, e))
+        sys.exit(0)
+
+    # Only one supervisor runs for a config file. The cron job checks this lock with flock(1) before starting Python,
+    # so the supervisor is only started when it is not running; a supervisor started anyway exits here.
+    lockFile = open(configFile + '.supervisor.lock', 'a')
+    if fcntl is None:
+        util.logMessage("Warning: file locking is not available on this platform, a second supervisor for the " +
+                        "same config file is not detected")
+    else:
+        try:
+            fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError as e:
+            if e.errno in (errno.EAGAIN, errno.EACCES):
+                sys.exit(0)  # already running, do not print anything, this will flood the logs
+            raise
+
+    workerConfigs = readWorkerConfigs(configFile, config)
+    errors = layoutErrors(workerConfigs)
+    if errors:
+        for error in errors:
+            util.logMessage("Error: " + error)
+        util.logMessage("Each chamber runs in its own brewpi.py process and needs its own scriptPath, wwwPath, " +
+                        "port and socket. Supervisor will exit.")
+        sys.exit(1)
+
+    if logToFiles:
+        # The workers write their own log files, stdout.txt is started again each time a worker is started
+        logPath = util.addSlash(config['scriptPath']) + 'logs/'
+        util.logMessage("Redirecting output to log files in %s, output will not be shown in console" % logPath)
+        sys.stderr = open(logPath + 'stderr.txt', 'a', 0)  # append to stderr file, unbuffered
+        sys.stdout = sys.stderr
+
+    loop = brewpiEventLoop.EventLoop()
+    supervisor = Supervisor(loop, createWorkers(workerConfigs, logToFiles), sys.stdout, sys.stderr,
+                            float(config.get('minRestartDelay', 0.1)), float(config.get('maxRestartDelay', 60)))
+
+    if os.path.exists(socketFile):
+        os.remove(socketFile)  # left behind by a supervisor that crashed
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.bind(socketFile)
+    os.chmod(socketFile, 0777)
+    server = brewpiSocketServer.SocketServer(loop, s, supervisor.handleMessage)
+
+    def stopOnSignal(signum, frame):
+        util.logMessage("Supervisor received signal %d, stopping workers." % signum)
+        loop.stop()
+
+    signal.signal(signal.SIGTERM, stopOnSignal)
+    signal.signal(signal.SIGINT, stopOnSignal)
+
+    util.logMessage("Supervisor started for workers " + ", ".join(supervisor.workers.keys()))
+    supervisor.start()
+    loop.run()
+
+    server.closeAll()
+    supervisor.shutdown()
+    os.remove(socketFile)
+
+
+if __name__ == '__main__':
+    main()
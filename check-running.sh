@@ -1,9 +1,8 @@
 #!/bin/bash
-echo "check-runnign.sh has been repaced by process management in the script itself."
-echo "The BrewPi script will now exit when another script is already running that would cause conflict."
-echo "Please change your brewpi users crontab to just start the brewpi script:"
+echo "check-running.sh has been replaced by brewpiSupervisor.py, which keeps brewpi.py running and restarts it."
+echo "The cron job to start the supervisor is in /etc/cron.d/brewpi, run utils/updateCron.sh to install or update it."
+echo "Please remove the line for check-running.sh or brewpi.py from the crontab of the brewpi user:"
 echo "sudo -u brewpi crontab -e"
-echo "change the line to:  * * * * * python -u /home/brewpi/brewpi.py --dontrunfile 1>/home/brewpi/logs/stdout.txt 2>>/home/brewpi/logs/stderr.txt &"
 
 exit 0
 
@@ -0,0 +1,155 @@
+#!/usr/bin/python
+# Copyright 2013 BrewPi
+# This file is part of BrewPi.
+
+# BrewPi is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# BrewPi is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with BrewPi.  If not, see <http://www.gnu.org/licenses/>.
+
+# Converts the daily JSON files (or the CSV file) of existing beers to the binary data store of brewpiStore.
+# Run it with BrewPi stopped when the store of the active beer is rebuilt with --force.
+
+import getopt
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+
+import BrewPiUtil as util
+import brewpiJson
+import brewpiCsv
+import brewpiStore
+
+
+def dailyFiles(dataPath, beerName):
+    """
+    Returns the daily JSON files of a beer, ordered by the time of their first row
+    """
+    files = []
+    for baseName in os.listdir(dataPath):
+        if baseName.startswith(beerName + '-') and baseName.endswith('.json'):
+            fileName = os.path.join(dataPath, baseName)
+            with open(fileName, 'rb') as f:
+                firstRow = next(brewpiJson.iterRows(f), None)
+            if firstRow is not None:
+                files.append((firstRow[0], fileName))
+    return [fileName for firstTime, fileName in sorted(files)]
+
+
+def migrateBeer(job):
+    """
+    Converts the data of one beer to a data store in data/<beer>/store.
+
+    Params:
+    job: tuple of the data directory of the beer, the name of the beer, whether to rebuild an existing store and
+         whether to read the CSV file instead of the daily JSON files
+
+    Returns: a summary of the migration as string
+    """
+    dataPath, beerName, force, useCsv = job
+    storePath = os.path.join(dataPath, 'store')
+    if os.path.exists(storePath) and os.listdir(storePath):
+        if not force:
+            return "%s: skipped, a data store already exists. Use --force to rebuild it." % beerName
+        shutil.rmtree(storePath)
+
+    csvFileName = os.path.join(dataPath, beerName + '.csv')
+    if useCsv:
+        sources = [csvFileName] if os.path.isfile(csvFileName) else []
+    else:
+        sources = dailyFiles(dataPath, beerName)
+    if not sources:
+        return "%s: skipped, no data files found" % beerName
+
+    startTime = time.time()
+    store = brewpiStore.BrewStore(storePath)
+    added = 0
+    for fileName in sources:
+        with open(fileName, 'rb') as f:
+            rows = brewpiCsv.iterRows(f) if useCsv else brewpiJson.iterRows(f)
+            for timeStamp, row in rows:
+                if store.append(row, timeStamp):  # rows that are out of order are skipped, the store needs sorted times
+                    added += 1
+    store.close()
+    return "%s: %d rows from %d files in %.1f seconds, %d rows skipped because they were out of order" % (
+        beerName, added, len(sources), time.time() - startTime, store.outOfOrder)
+
+
+def printHelp():
+    print "Converts logged data of existing beers to the binary data store.\n"
+    print "Available command line options: "
+    print "--help: print this help message"
+    print "--config <path to config file>: specify a config file to use. When omitted settings/config.cfg is used"
+    print "--beer <name>: only convert this beer. When omitted, all beers in the data directory are converted"
+    print "--jobs <N>: convert N beers at the same time, using N processes. Defaults to the number of CPUs"
+    print "--force: rebuild data stores that already exist"
+    print "--csv: read the CSV file of each beer instead of the daily JSON files"
+
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hc:b:j:f", ['help', 'config=', 'beer=', 'jobs=', 'force', 'csv'])
+    except getopt.GetoptError:
+        print "Unknown parameter, available Options: --help, --config <path to config file>, --beer <name>, " \
+              "--jobs <N>, --force, --csv"
+        sys.exit(1)
+
+    configFile = util.addSlash(sys.path[0]) + 'settings/config.cfg'
+    beers = None
+    try:
+        jobs = multiprocessing.cpu_count()
+    except NotImplementedError:
+        jobs = 1
+    force = False
+    useCsv = False
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            printHelp()
+            sys.exit()
+        if o in ('-c', '--config'):
+            configFile = os.path.abspath(a)
+            if not os.path.exists(configFile):
+                sys.exit('ERROR: Config file "%s" was not found!' % configFile)
+        if o in ('-b', '--beer'):
+            beers = [a]
+        if o in ('-j', '--jobs'):
+            try:
+                jobs = max(int(a), 1)
+            except ValueError:
+                sys.exit('ERROR: --jobs needs a number')
+        if o in ('-f', '--force'):
+            force = True
+        if o == '--csv':
+            useCsv = True
+
+    config = util.readCfgWithDefaults(configFile)
+    dataRoot = util.addSlash(config['scriptPath']) + 'data/'
+    if beers is None:
+        beers = sorted([name for name in os.listdir(dataRoot) if os.path.isdir(os.path.join(dataRoot, name))])
+
+    jobList = [(os.path.join(dataRoot, beerName), beerName, force, useCsv) for beerName in beers]
+    jobs = min(jobs, len(jobList))  # do not start processes that have no beer to convert
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap_unordered(migrateBeer, jobList)
+    else:
+        results = (migrateBeer(job) for job in jobList)
+    for result in results:
+        print result
+    if jobs > 1:
+        pool.close()
+        pool.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+import brewpiJson
+import brewpiQuery
+from chartFileWriterTest import newRow
+
+
+def timeStamp(day, hour):
+    return time.mktime(datetime(2013, 9, day, hour, 0, 0).timetuple())
+
+
+class BrewIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.writers = []
+        for day in (26, 27):
+            writer = brewpiJson.ChartFileWriter(os.path.join(self.dir, 'beer-2013-09-%d.json' % day))
+            for hour in range(24):
+                writer.addRow(newRow(day + hour / 100.0), datetime(2013, 9, day, hour, 0, 0))
+            self.writers.append(writer)
+        self.index = brewpiQuery.BrewIndex(self.dir, 'beer')
+
+    def tearDown(self):
+        for writer in self.writers:
+            writer.close()
+        shutil.rmtree(self.dir)
+
+    def beerTemps(self, result):
+        return [row['c'][1]['v'] for row in result['rows']]
+
+    def test_queryAllData(self):
+        result = self.index.query()
+        self.assertEqual(48, len(result['rows']))
+        self.assertEqual(brewpiQuery.chartCols, result['cols'])
+
+    def test_queryRangeAcrossFiles(self):
+        result = self.index.query(timeStamp(26, 22), timeStamp(27, 1))
+        self.assertEqual([26.22, 26.23, 27.0, 27.01], self.beerTemps(result))
+
+    def test_selectColumns(self):
+        result = self.index.query(timeStamp(27, 5), timeStamp(27, 5), ['BeerTemp', 'State'])
+        self.assertEqual(['Time', 'BeerTemp', 'State'], [col['id'] for col in result['cols']])
+        self.assertEqual([{"v": "Date(2013,8,27,5,0,0)"}, {"v": 27.05}, {"v": "1"}], result['rows'][0]['c'])
+
+    def test_newRowsAreIndexed(self):
+        self.index.query()
+        self.writers[1].addRow(newRow(28.0), datetime(2013, 9, 28, 0, 0, 0))
+        result = self.index.query(timeStamp(27, 23))
+        self.assertEqual([27.23, 28.0], self.beerTemps(result))
+
+    def test_rowWithoutValidDateIsSkipped(self):
+        writer = self.writers[1]
+        writer.write(['{"c":[{"v":"Date(bad)"},{"v":99.0},null,null,null,null,null,null,null]}'])
+        writer.addRow(newRow(28.0), datetime(2013, 9, 28, 0, 0, 0))
+        writer.addRow(newRow(28.01), datetime(2013, 9, 28, 1, 0, 0))
+        result = self.index.query(timeStamp(27, 23))
+        self.assertEqual([27.23, 28.0, 28.01], self.beerTemps(result))
+        self.assertEqual({"v": "Date(2013,8,28,1,0,0)"}, result['rows'][2]['c'][0])
+
+    def test_maxPoints(self):
+        result = self.index.query(columns=['BeerTemp'], maxPoints=10)
+        self.assertTrue(len(result['rows']) <= 10)
+        self.assertTrue(27.23 in self.beerTemps(result))
+
+
+if __name__ == '__main__':
+    unittest.main()
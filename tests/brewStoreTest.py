@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import simplejson as json
+import brewpiStore
+from chartFileWriterTest import newRow
+
+
+class BrewStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.storePath = os.path.join(self.dir, 'store')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def fillStore(self, count, capacity=brewpiStore.segmentRows):
+        store = brewpiStore.BrewStore(self.storePath, capacity)
+        for i in range(count):
+            store.append(newRow(18.0 + i * 0.01), 1000.0 + i * 60)
+        return store
+
+    def test_rowsAreReadBack(self):
+        store = self.fillStore(3)
+        rows = list(store.rows())
+        self.assertEqual(3, len(rows))
+        self.assertEqual(1060.0, rows[1]['Time'])
+        self.assertEqual(18.01, rows[1]['BeerTemp'])
+        self.assertEqual(21.25, rows[1]['RoomTemp'])
+        self.assertEqual(1, rows[1]['State'])
+        store.close()
+
+    def test_missingValuesAreNone(self):
+        store = brewpiStore.BrewStore(self.storePath)
+        row = newRow(None)
+        row['State'] = None
+        store.append(row, 1000.0)
+        rows = list(store.rows())
+        self.assertEqual(None, rows[0]['BeerTemp'])
+        self.assertEqual(None, rows[0]['State'])
+        store.close()
+
+    def test_queryAcrossSegments(self):
+        store = self.fillStore(10, capacity=4)
+        self.assertEqual(3, len(store.segments))
+        data = store.query(1000.0 + 3 * 60, 1000.0 + 8 * 60, ('BeerTemp',))
+        self.assertEqual(['Time', 'BeerTemp'], sorted(data.keys(), reverse=True))
+        self.assertEqual([1000.0 + i * 60 for i in range(3, 9)], list(data['Time']))
+        store.close()
+
+    def test_storeIsReopened(self):
+        self.fillStore(5, capacity=4).close()
+        store = brewpiStore.BrewStore(self.storePath)
+        self.assertEqual(5, len(store))
+        store.append(newRow(20.0), 5000.0)
+        self.assertEqual(6, len(store))
+        store.close()
+
+    def test_rowsOutOfOrderAreSkipped(self):
+        store = self.fillStore(5, capacity=4)
+        self.assertFalse(store.append(newRow(20.0), 1100.0))  # the clock was set back
+        store.close()
+        store = brewpiStore.BrewStore(self.storePath)
+        self.assertFalse(store.append(newRow(20.0), 1200.0))
+        self.assertTrue(store.append(newRow(20.0), 1240.0))
+        self.assertEqual(1, store.outOfOrder)
+        self.assertEqual([1060.0, 1120.0, 1180.0], list(store.query(1001.0, 1200.0)['Time']))
+        store.close()
+
+    def test_exportDataTable(self):
+        store = self.fillStore(4)
+        jsonFileName = os.path.join(self.dir, 'export.json')
+        brewpiStore.exportDataTable(store, jsonFileName, 1060.0, 1120.0)
+        with open(jsonFileName) as f:
+            rows = json.load(f)['rows']
+        self.assertEqual([18.01, 18.02], [row['c'][1]['v'] for row in rows])
+        store.close()
+
+    def test_exportCsv(self):
+        store = self.fillStore(2)
+        csvFileName = os.path.join(self.dir, 'export.csv')
+        brewpiStore.exportCsv(store, csvFileName)
+        with open(csvFileName) as f:
+            lines = f.readlines()
+        self.assertEqual(2, len(lines))
+        self.assertTrue(lines[0].endswith(';18.0;20.0;None;18.5;17.0;None;1;21.25\n'))
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import simplejson as json
+import brewpiChamber
+from chartFileWriterTest import newRow
+from brewpiEventLoop import EventLoop
+
+
+class FakeChamber:
+    def __init__(self, chamberId, scriptPath, wwwPath, port=None):
+        self.id = chamberId
+        self.config = {'scriptPath': scriptPath, 'wwwPath': wwwPath, 'port': port or '/dev/' + chamberId}
+
+
+class SharedPathsTestCase(unittest.TestCase):
+    def test_ownPathsAreAccepted(self):
+        chambers = [FakeChamber('fridge1', '/home/brewpi/fridge1/', '/var/www/fridge1/'),
+                    FakeChamber('fridge2', '/home/brewpi/fridge2/', '/var/www/fridge2/')]
+        self.assertEqual([], brewpiChamber.sharedPaths(chambers))
+
+    def test_sharedPathsAreFound(self):
+        chambers = [FakeChamber('fridge1', '/home/brewpi/', '/var/www/'),
+                    FakeChamber('fridge2', '/home/brewpi/fridge2/', '/var/www'),
+                    FakeChamber('fridge3', '/home/brewpi', '/var/www/fridge3/')]
+        self.assertEqual(["Chambers 'fridge1' and 'fridge3' have the same scriptPath /home/brewpi",
+                          "Chambers 'fridge1' and 'fridge2' have the same wwwPath /var/www"],
+                         brewpiChamber.sharedPaths(chambers))
+
+    def test_sharedPortIsFound(self):
+        chambers = [FakeChamber('fridge1', '/home/brewpi/fridge1/', '/var/www/fridge1/', '/dev/ttyACM0'),
+                    FakeChamber('fridge2', '/home/brewpi/fridge2/', '/var/www/fridge2/', '/dev/ttyACM0')]
+        self.assertEqual(["Chambers 'fridge1' and 'fridge2' have the same port /dev/ttyACM0"],
+                         brewpiChamber.sharedPaths(chambers))
+
+
+class ParameterErrorTestCase(unittest.TestCase):
+    def check(self, query):
+        return brewpiChamber.parameterError(query, ('from', 'to'), ('maxPoints',), ('columns',))
+
+    def test_validParameters(self):
+        self.assertEqual(None, self.check({}))
+        self.assertEqual(None, self.check({'from': 1380000000, 'to': 1380003600.5, 'maxPoints': 100,
+                                           'columns': ['BeerTemp', u'State']}))
+
+    def test_invalidParameters(self):
+        self.assertEqual(1, self.check([])['status'])
+        self.assertEqual('Invalid columns: "BeerTemp"', self.check({'columns': 'BeerTemp'})['statusMessage'])
+        self.assertEqual('Invalid columns: [1]', self.check({'columns': [1]})['statusMessage'])
+        self.assertEqual('Invalid maxPoints: 10.5', self.check({'maxPoints': 10.5})['statusMessage'])
+        self.assertEqual('Invalid from: "1380000000"', self.check({'from': '1380000000'})['statusMessage'])
+        self.assertEqual('Invalid to: null', self.check({'to': None})['statusMessage'])
+        self.assertEqual('Invalid to: true', self.check({'to': True})['statusMessage'])
+
+
+class FakeConnection:
+    def __init__(self):
+        self.session = True
+        self.topics = set()
+
+    def subscribe(self, topics):
+        self.topics.update(topics)
+
+    def unsubscribe(self, topics):
+        self.topics.difference_update(topics)
+
+
+class FakeServer:
+    def __init__(self):
+        self.topics = set()
+
+    def subscribed(self, topic):
+        return topic in self.topics
+
+    def publish(self, topic, data):
+        pass
+
+
+class ChamberMessageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        configFile = os.path.join(self.tempDir, 'config.cfg')
+        with open(configFile, 'w') as f:
+            f.write("scriptPath = %s/\nwwwPath = %s/www/\nport = /dev/null\n" % (self.tempDir, self.tempDir))
+        self.chamber = brewpiChamber.Chamber(None, configFile, EventLoop())
+        self.chamber.server = FakeServer()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def assertRejected(self, message, conn=None):
+        reply = self.chamber.handleMessage(conn, message)
+        self.assertEqual(1, reply['status'], message)
+
+    def test_getStateRejectsInvalidParameters(self):
+        self.assertRejected('getState=[1]')
+        self.assertRejected('getState={"fields":5}')
+        self.assertRejected('getState={"fields":[["lcd"]]}')
+        self.assertRejected('getState={"since":"1"}')
+        self.assertTrue('"lcd"' in str(self.chamber.handleMessage(None, 'getState={"fields":["lcd"],"since":0}')))
+
+    def test_cachedRepliesRejectInvalidIfVersion(self):
+        self.assertRejected('lcd=[1]')
+        self.assertRejected('getControlSettings={"ifVersion":"3"}')
+        self.assertRejected('getControlConstants={"ifVersion":null}')
+        version = self.chamber.stateVersions.versions['lcd']
+        self.assertTrue(self.chamber.handleMessage(None, 'lcd={"ifVersion":%d}' % version)['notModified'])
+
+    def test_getDataRejectsMaxPointsBelowOne(self):
+        self.assertRejected('getData={"maxPoints":0}')
+        self.assertRejected('getData={"maxPoints":-5}')
+        self.assertEqual([], self.chamber.handleMessage(None, 'getData={"maxPoints":1}')['rows'])
+
+    def test_setParametersRejectsValuesThatAreNotObjects(self):
+        self.assertRejected('setParameters=[1]')
+        self.assertRejected('setParameters=5')
+
+    def test_subscribeRejectsInvalidTopics(self):
+        conn = FakeConnection()
+        self.assertRejected('subscribe=5', conn)
+        self.assertRejected('subscribe=[[1]]', conn)
+        self.assertRejected('unsubscribe={"lcd":1}', conn)
+        self.assertEqual(['lcd'], self.chamber.handleMessage(conn, 'subscribe=["lcd"]')['topics'])
+
+    def test_exportDataWritesTheStoreToTheWwwDir(self):
+        self.assertRejected('exportData={"format":"xml"}')
+        self.chamber.startNewBrew('beer')
+        self.chamber.dataLogger.addRow(newRow(19.0), 1380000000)
+        self.chamber.dataLogger.addRow(newRow(19.5), 1380000060)
+        reply = self.chamber.handleMessage(None, 'exportData={"format":"csv","from":1380000030}')
+        self.assertEqual('data/beer/beer-export.csv', reply['fileName'])
+        with open(os.path.join(self.tempDir, 'www', reply['fileName'])) as f:
+            self.assertEqual(1, len(f.readlines()))
+        reply = self.chamber.handleMessage(None, 'exportData=')
+        with open(os.path.join(self.tempDir, 'www', reply['fileName'])) as f:
+            self.assertEqual(2, len(json.load(f)['rows']))
+        self.chamber.dataLogger.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+import simplejson as json
+import brewpiJson
+
+
+def newRow(beerTemp):
+    return {"BeerTemp": beerTemp, "BeerSet": 20.0, "BeerAnn": None, "FridgeTemp": 18.5, "FridgeSet": 17.0,
+            "FridgeAnn": None, "RoomTemp": 21.25, "State": 1}
+
+
+class ChartFileWriterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.dir, 'test.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def loadRows(self):
+        with open(self.fileName) as f:
+            return json.load(f)['rows']
+
+    def test_newFileHasNoRows(self):
+        writer = brewpiJson.ChartFileWriter(self.fileName)
+        writer.close()
+        self.assertEqual([], self.loadRows())
+
+    def test_rowsAreValidJson(self):
+        writer = brewpiJson.ChartFileWriter(self.fileName)
+        writer.addRow(newRow(19.5), datetime(2013, 9, 26, 0, 1, 0))
+        writer.addRow(newRow(None))
+        writer.close()
+        rows = self.loadRows()
+        self.assertEqual(2, len(rows))
+        self.assertEqual({"v": "Date(2013,8,26,0,1,0)"}, rows[0]['c'][0])
+        self.assertEqual({"v": 19.5}, rows[0]['c'][1])
+        self.assertEqual(None, rows[1]['c'][1])
+        self.assertEqual({"v": "1"}, rows[1]['c'][8])
+
+    def test_reopenedFileContinuesAfterLastRow(self):
+        writer = brewpiJson.ChartFileWriter(self.fileName)
+        writer.addRow(newRow(19.5))
+        writer.close()
+        writer = brewpiJson.ChartFileWriter(self.fileName)
+        writer.write([brewpiJson.jsonRow(newRow(19.6)), brewpiJson.jsonRow(newRow(19.7))])
+        writer.close()
+        self.assertEqual([19.5, 19.6, 19.7], [row['c'][1]['v'] for row in self.loadRows()])
+
+    def test_sameOutputAsAddRow(self):
+        otherFileName = os.path.join(self.dir, 'other.json')
+        now = datetime(2013, 1, 2, 3, 4, 5)
+        writer = brewpiJson.ChartFileWriter(self.fileName)
+        writer.addRow(newRow(19.5), now)
+        writer.close()
+        brewpiJson.newEmptyFile(otherFileName)
+        brewpiJson.addRow(otherFileName, newRow(19.5))
+        with open(otherFileName) as f:
+            other = json.load(f)['rows']
+        other[0]['c'][0] = {"v": "Date(2013,0,2,3,4,5)"}
+        self.assertEqual(other, self.loadRows())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import time
+import unittest
+
+from brewpiEventLoop import EventLoop
+from brewpiCommands import CommandQueue
+
+
+class CommandQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.loop = EventLoop()
+        self.written = []
+        self.queue = CommandQueue(self.loop, self.written.append, self.echoRequest, minInterval=0.05)
+        self.results = []
+
+    def echoRequest(self, name):
+        return 's' if name in ('mode', 'beerSet', 'fridgeSet') else 'c'
+
+    def runFor(self, seconds):
+        startTime = time.time()
+        while time.time() - startTime < seconds:
+            self.loop.runOnce(0.005)
+
+    def test_settingsAreCombinedInOrder(self):
+        self.queue.send([('mode', 'b'), ('beerSet', 20.0)])
+        self.queue.send([('mode', 'f'), ('fridgeSet', 18.0)])
+        self.queue.send({'Kp': 5})
+        self.runFor(0.01)
+        self.assertEqual(['j{"beerSet": 20.0, "mode": "f", "fridgeSet": 18.0, "Kp": 5}', 'c', 's'], self.written)
+
+    def test_commandsAreRateLimited(self):
+        self.queue.send([('beerSet', 20.0)])
+        self.runFor(0.01)
+        self.queue.send([('beerSet', 20.5)])
+        self.queue.send([('beerSet', 21.0)])
+        self.runFor(0.02)
+        self.assertEqual(['j{"beerSet": 20.0}', 's'], self.written)
+        self.runFor(0.05)
+        self.assertEqual(['j{"beerSet": 20.0}', 's', 'j{"beerSet": 21.0}', 's'], self.written)
+
+    def test_waitIsResolvedByEcho(self):
+        self.queue.send([('mode', 'b'), ('beerSet', 20.0)])
+        self.queue.wait(1.0, self.results.append)
+        self.runFor(0.01)
+        self.queue.echoReceived('c', {'tempFormat': 'C'})
+        self.assertEqual([], self.results)
+        self.queue.echoReceived('s', {'mode': 'b', 'beerSet': 20.001, 'fridgeSet': 19.0})
+        self.assertEqual([{}], self.results)
+
+        self.queue.wait(1.0, self.results.append)  # nothing to confirm
+        self.assertEqual([{}, {}], self.results)
+
+    def test_waitTimesOutWithSettingsThatWereNotApplied(self):
+        self.queue.send([('beerSet', 50.0)])
+        self.queue.wait(0.05, self.results.append)
+        self.runFor(0.01)
+        self.queue.echoReceived('s', {'mode': 'b', 'beerSet': 30.0})
+        self.assertEqual([], self.results)
+        self.runFor(0.06)
+        self.assertEqual([{'beerSet': 30.0}], self.results)
+
+
+if __name__ == '__main__':
+    unittest.main()
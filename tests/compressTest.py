@@ -0,0 +1,48 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+import brewpiCompress
+
+
+class CompressTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.srcFileName = os.path.join(self.dir, 'day.json')
+        self.gzFileName = os.path.join(self.dir, 'www.json.gz')
+        with open(self.srcFileName, 'wb') as f:
+            f.write('{"c":[{"v":19.5}]},\n' * 10000)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def readCompressed(self):
+        gzFile = gzip.open(self.gzFileName, 'rb')
+        try:
+            return gzFile.read()
+        finally:
+            gzFile.close()
+
+    def test_compressFile(self):
+        brewpiCompress.compressFile(self.srcFileName, self.gzFileName)
+        with open(self.srcFileName, 'rb') as f:
+            self.assertEqual(f.read(), self.readCompressed())
+        self.assertTrue(os.path.getsize(self.gzFileName) * 10 < os.path.getsize(self.srcFileName))
+        self.assertFalse(os.path.exists(self.gzFileName + '.tmp'))
+
+    def test_compressPartOfFile(self):
+        brewpiCompress.compressFile(self.srcFileName, self.gzFileName, 100000)
+        self.assertEqual(100000, len(self.readCompressed()))
+
+    def test_backgroundCompressorFinishesQueueOnStop(self):
+        compressor = brewpiCompress.BackgroundCompressor()
+        compressor.compress(self.srcFileName, self.gzFileName)
+        compressor.compress(os.path.join(self.dir, 'missing.json'), self.gzFileName + '2')
+        compressor.stop()
+        self.assertTrue(os.path.exists(self.gzFileName))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import simplejson as json
+import brewpiCompress
+import brewpiDataLog
+from chartFileWriterTest import newRow
+
+
+class DataLoggerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dataPath = os.path.join(self.dir, 'data') + '/'
+        self.wwwPath = os.path.join(self.dir, 'www') + '/'
+        os.mkdir(self.dataPath)
+        os.mkdir(self.wwwPath)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def newLogger(self, **kwargs):
+        logger = brewpiDataLog.DataLogger(**kwargs)
+        logger.newChartFile(self.dataPath + 'day1.json', self.wwwPath + 'day1.json')
+        logger.startBeer(self.dataPath, self.wwwPath, 'beer', self.dataPath + 'beer.csv', self.wwwPath + 'beer.csv',
+                         [3600])
+        return logger
+
+    def rowCount(self, fileName):
+        with open(fileName) as f:
+            return len(json.load(f)['rows'])
+
+    def test_rowsAreWrittenWhenBufferIsFull(self):
+        logger = self.newLogger(flushInterval=3600, flushRows=3)
+        logger.addRow(newRow(19.0))
+        logger.addRow(newRow(19.1))
+        self.assertEqual(0, self.rowCount(self.wwwPath + 'day1.json'))
+        logger.addRow(newRow(19.2))
+        self.assertEqual(3, self.rowCount(self.wwwPath + 'day1.json'))
+        self.assertEqual(3, len(logger.store))
+        logger.close()
+
+    def test_rowsAreWrittenAfterFlushInterval(self):
+        logger = self.newLogger(flushInterval=60, flushRows=100)
+        logger.addRow(newRow(19.0))
+        logger.addRow(newRow(19.0))
+        logger.flushIfDue()
+        self.assertEqual(0, self.rowCount(self.dataPath + 'day1.json'))
+        logger.bufferedSince -= 61
+        logger.flushIfDue()
+        self.assertEqual(2, self.rowCount(self.dataPath + 'day1.json'))
+        logger.close()
+
+    def test_closeWritesBufferedRows(self):
+        logger = self.newLogger(flushInterval=3600, flushRows=100)
+        logger.addRow(newRow(19.0))
+        logger.close()
+        self.assertEqual(1, self.rowCount(self.dataPath + 'day1.json'))
+        with open(self.wwwPath + 'beer.csv') as f:
+            self.assertEqual(1, len(f.readlines()))
+
+    def test_bufferedRowsGoToPreviousDay(self):
+        logger = self.newLogger(flushInterval=3600, flushRows=100)
+        logger.addRow(newRow(19.0))
+        logger.newChartFile(self.dataPath + 'day2.json', self.wwwPath + 'day2.json')
+        logger.addRow(newRow(19.0))
+        logger.close()
+        self.assertEqual(1, self.rowCount(self.dataPath + 'day1.json'))
+        self.assertEqual(1, self.rowCount(self.dataPath + 'day2.json'))
+
+    def test_fsyncEveryNRows(self):
+        logger = self.newLogger(fsync='2')
+        logger.addRow(newRow(19.0))
+        self.assertEqual(1, logger.unsyncedRows)
+        logger.addRow(newRow(19.0))
+        self.assertEqual(0, logger.unsyncedRows)
+        logger.close()
+
+    def test_csvSnapshotIsNamedAfterItsLastDay(self):
+        class Compressor:
+            def compress(self, srcFileName, gzFileName, size=None):
+                brewpiCompress.compressFile(srcFileName, gzFileName, size)
+
+        open(self.wwwPath + 'beer.csv.gz', 'w').close()  # undated snapshot of an older version
+        logger = self.newLogger(compressor=Compressor())
+        self.assertFalse(os.path.exists(self.wwwPath + 'beer.csv.gz'))
+        logger.addRow(newRow(19.0), time.mktime((2013, 10, 5, 23, 59, 0, 0, 0, -1)))
+        logger.newChartFile(self.dataPath + 'day2.json', self.wwwPath + 'day2.json')
+        self.assertTrue(os.path.exists(self.wwwPath + 'beer-2013-10-05.csv.gz'))
+        logger.addRow(newRow(19.1), time.mktime((2013, 10, 6, 23, 59, 0, 0, 0, -1)))
+        logger.newChartFile(self.dataPath + 'day3.json', self.wwwPath + 'day3.json')
+        self.assertEqual(['beer-2013-10-06.csv.gz', 'beer.csv'],
+                         sorted(f for f in os.listdir(self.wwwPath) if f.startswith('beer')))
+        logger.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
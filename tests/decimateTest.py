@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from brewpiDecimate import DecimatedCharts, MinMaxDecimator
+
+
+def newRow(beerTemp, fridgeTemp):
+    return {"BeerTemp": beerTemp, "FridgeTemp": fridgeTemp}
+
+
+class MinMaxDecimatorTestCase(unittest.TestCase):
+    def addAll(self, decimator, samples):
+        output = []
+        for timeStamp, beerTemp, fridgeTemp in samples:
+            output += decimator.add(newRow(beerTemp, fridgeTemp), timeStamp)
+        return output
+
+    def test_bucketIsWrittenWhenComplete(self):
+        decimator = MinMaxDecimator(60)
+        self.assertEqual([], self.addAll(decimator, [(0, 20.0, 18.0), (30, 20.1, 18.1)]))
+        output = decimator.add(newRow(20.2, 18.2), 60)
+        self.assertEqual([0, 30], [t for t, row in output])
+
+    def test_extremesOfBothSeriesAreKept(self):
+        decimator = MinMaxDecimator(3600)
+        output = self.addAll(decimator, [(0, 20.0, 18.0),
+                                         (10, 20.5, 18.5),
+                                         (20, 20.2, 15.0),
+                                         (30, 19.5, 17.0),
+                                         (40, 20.1, 22.0),
+                                         (50, 20.1, 18.0)])
+        output += decimator.flush()
+        self.assertEqual([10, 20, 30, 40], [t for t, row in output])
+        self.assertEqual(newRow(20.2, 15.0), output[1][1])
+
+    def test_rowWithoutValuesIsKept(self):
+        decimator = MinMaxDecimator(60)
+        output = self.addAll(decimator, [(0, None, None), (10, None, None), (60, None, None)])
+        self.assertEqual([0], [t for t, row in output])
+
+    def test_emptyFlush(self):
+        self.assertEqual([], MinMaxDecimator(60).flush())
+
+
+class DecimatedChartsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def test_incompleteBucketIsWrittenOnClose(self):
+        dataPath = os.path.join(self.tempDir, 'data')
+        charts = DecimatedCharts(dataPath, os.path.join(self.tempDir, 'www'), 'beer', [3600])
+        for timeStamp, beerTemp, fridgeTemp in [(0, 20.0, 18.0), (10, 20.5, 15.0)]:
+            charts.addRow(dict(newRow(beerTemp, fridgeTemp), BeerSet=20.0, BeerAnn=None, FridgeSet=18.0,
+                               FridgeAnn=None, RoomTemp=None, State=0), timeStamp)
+        charts.close()
+        with open(os.path.join(dataPath, 'decimated', 'beer-3600s.json')) as chartFile:
+            rows = json.load(chartFile)['rows']
+        self.assertEqual([20.0, 20.5], [row['c'][1]['v'] for row in rows])
+
+
+if __name__ == '__main__':
+    unittest.main()
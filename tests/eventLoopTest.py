@@ -0,0 +1,70 @@
+import socket
+import time
+import unittest
+
+from brewpiEventLoop import EventLoop
+
+
+class EventLoopTestCase(unittest.TestCase):
+    def setUp(self):
+        self.loop = EventLoop()
+        self.calls = []
+
+    def test_timersRunInOrderOfTime(self):
+        self.loop.callLater(0.02, self.calls.append, 'second')
+        self.loop.callLater(0.01, self.calls.append, 'first')
+        self.loop.callLater(0.03, self.loop.stop)
+        self.loop.run()
+        self.assertEqual(['first', 'second'], self.calls)
+
+    def test_cancelledTimerDoesNotRun(self):
+        timer = self.loop.callLater(0.01, self.calls.append, 'cancelled')
+        self.loop.callLater(0.02, self.loop.stop)
+        timer.cancel()
+        self.loop.run()
+        self.assertEqual([], self.calls)
+
+    def test_callEveryRepeats(self):
+        self.loop.callEvery(0.01, self.calls.append, 'tick')
+        self.loop.callLater(0.055, self.loop.stop)
+        self.loop.run()
+        self.assertTrue(4 <= len(self.calls) <= 6)
+
+    def test_readerIsCalledWhenDataArrives(self):
+        a, b = socket.socketpair()
+        received = []
+        self.loop.addReader(a, lambda: received.append(a.recv(100)))
+        self.loop.callLater(0.01, b.send, 'hello')
+        startTime = time.time()
+        while not received and time.time() - startTime < 1:
+            self.loop.runOnce()
+        self.assertEqual(['hello'], received)
+        self.assertTrue(time.time() - startTime < 0.5)  # does not wait for a timeout before reading
+
+        self.loop.removeReader(a)
+        b.send('ignored')
+        self.loop.runOnce(0.01)
+        self.assertEqual(['hello'], received)
+        a.close()
+        b.close()
+
+    def test_runOnceWaitsAtMostTimeout(self):
+        startTime = time.time()
+        self.loop.callLater(10, self.loop.stop)
+        self.loop.runOnce(0.02)
+        self.assertTrue(time.time() - startTime < 1)
+
+    def test_delayedTimersMoveBackWithClock(self):
+        # timers scheduled an hour ago by the clock, which was then set back an hour
+        self.loop.lastTime += 3600
+        self.loop.callLater(3600.01, self.calls.append, 'delay')
+        self.loop.callAt(time.time() + 3600.01, self.calls.append, 'timeOfDay')
+        startTime = time.time()
+        while not self.calls and time.time() - startTime < 1:
+            self.loop.runOnce(0.05)
+        self.assertEqual(['delay'], self.calls)
+        self.assertTrue(self.loop.timers[0][0] > time.time() + 3000)  # still at its time of day
+
+
+if __name__ == '__main__':
+    unittest.main()
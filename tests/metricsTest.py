@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+
+import brewpiMetrics
+from brewpiMetrics import Metrics
+from brewpiStats import Histogram
+
+
+class MetricsTestCase(unittest.TestCase):
+    def test_samplesAreGroupedInFamilies(self):
+        metrics = Metrics()
+        metrics.add('brewpi_beer_temperature', 'gauge', "Beer temperature", 19.5, {'chamber': 'fridge1'})
+        metrics.add('brewpi_rows_written_total', 'counter', "Rows", 12, {'chamber': 'fridge1'})
+        metrics.add('brewpi_beer_temperature', 'gauge', "Beer temperature", None, {'chamber': 'fridge2'})
+        metrics.add('brewpi_beer_temperature', 'gauge', "Beer temperature", 18, {'chamber': 'a "b"'})
+        metrics.add('brewpi_room_temperature', 'gauge', "Room temperature", None)
+        self.assertEqual('# HELP brewpi_beer_temperature Beer temperature\n'
+                         '# TYPE brewpi_beer_temperature gauge\n'
+                         'brewpi_beer_temperature{chamber="fridge1"} 19.5\n'
+                         'brewpi_beer_temperature{chamber="a \\"b\\""} 18\n'
+                         '# HELP brewpi_rows_written_total Rows\n'
+                         '# TYPE brewpi_rows_written_total counter\n'
+                         'brewpi_rows_written_total{chamber="fridge1"} 12\n', metrics.format())
+
+    def test_histogramsAreSummaries(self):
+        histogram = Histogram()
+        histogram.add(0.5)
+        metrics = Metrics()
+        metrics.addSummary('brewpi_loop_stage_seconds', "Stage time", histogram, OrderedDict([('stage', 'wait')]))
+        metrics.addSummary('brewpi_loop_stage_seconds', "Stage time", Histogram(), {'stage': 'dispatch'})
+        self.assertEqual('# HELP brewpi_loop_stage_seconds Stage time\n'
+                         '# TYPE brewpi_loop_stage_seconds summary\n'
+                         'brewpi_loop_stage_seconds{stage="wait",quantile="0.5"} 0.5\n'
+                         'brewpi_loop_stage_seconds{stage="wait",quantile="0.9"} 0.5\n'
+                         'brewpi_loop_stage_seconds{stage="wait",quantile="0.99"} 0.5\n'
+                         'brewpi_loop_stage_seconds_sum{stage="wait"} 0.5\n'
+                         'brewpi_loop_stage_seconds_count{stage="wait"} 1\n', metrics.format())
+
+    def test_httpResponse(self):
+        response = brewpiMetrics.httpResponse('GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n', lambda: 'a 1\n')
+        self.assertEqual('HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: 4\r\n'
+                         'Connection: close\r\n\r\na 1\n', response)
+        self.assertTrue(brewpiMetrics.httpResponse('GET /other HTTP/1.1\r\n\r\n', None).startswith('HTTP/1.0 404'))
+
+    def test_writeFile(self):
+        tempDir = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(tempDir, 'brewpi.prom')
+            brewpiMetrics.writeFile(fileName, 'a 1\n')
+            self.assertEqual(['brewpi.prom'], os.listdir(tempDir))
+            self.assertEqual('a 1\n', open(fileName).read())
+        finally:
+            shutil.rmtree(tempDir)
+
+
+if __name__ == '__main__':
+    unittest.main()
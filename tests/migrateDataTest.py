@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from StringIO import StringIO
+
+import brewpiJson
+import brewpiCsv
+import brewpiStore
+import migrateData
+from chartFileWriterTest import newRow
+
+
+def timeStamp(hour):
+    return time.mktime(datetime(2013, 9, 26, hour, 0, 0).timetuple())
+
+
+class StreamingParserTestCase(unittest.TestCase):
+    def jsonText(self, count):
+        rows = [brewpiJson.jsonRow(newRow(18.0 + i), datetime(2013, 9, 26, i, 0, 0)) for i in range(count)]
+        return "{" + brewpiJson.jsonCols + ",\"rows\":[\n" + ",\n".join(rows) + "]}"
+
+    def test_parseJson(self):
+        rows = list(brewpiJson.iterRows(StringIO(self.jsonText(3))))
+        self.assertEqual([timeStamp(0), timeStamp(1), timeStamp(2)], [t for t, row in rows])
+        self.assertEqual(19.0, rows[1][1]['BeerTemp'])
+        self.assertEqual(21.25, rows[1][1]['RoomTemp'])
+        self.assertEqual(1, rows[1][1]['State'])
+        self.assertEqual(None, rows[1][1]['BeerAnn'])
+
+    def test_smallChunks(self):
+        rows = list(brewpiJson.iterRows(StringIO(self.jsonText(5)), chunkSize=7))
+        self.assertEqual(5, len(rows))
+
+    def test_truncatedJson(self):
+        text = self.jsonText(3)
+        rows = list(brewpiJson.iterRows(StringIO(text[:-20])))
+        self.assertEqual(2, len(rows))
+
+    def test_annotationWithBraces(self):
+        row = newRow(18.0)
+        row['BeerAnn'] = 'dry hopped {"} \\\\'
+        text = "{" + brewpiJson.jsonCols + ",\"rows\":[" + brewpiJson.jsonRow(row, datetime(2013, 9, 26)) + "]}"
+        text = text.replace('{"} \\\\', '{\\"} \\\\')
+        rows = list(brewpiJson.iterRows(StringIO(text)))
+        self.assertEqual('dry hopped {"} \\', rows[0][1]['BeerAnn'])
+
+    def test_parseCsv(self):
+        text = (brewpiCsv.csvRow(newRow(18.0), datetime(2013, 9, 26, 0, 0, 0)) +
+                brewpiCsv.csvRow(newRow(None), datetime(2013, 9, 26, 1, 0, 0)) +
+                brewpiCsv.csvRow(newRow(18.0), datetime(2013, 9, 26, 2, 0, 0))[:-5])
+        rows = list(brewpiCsv.iterRows(StringIO(text)))
+        self.assertEqual([timeStamp(0), timeStamp(1)], [t for t, row in rows])
+        self.assertEqual(18.0, rows[0][1]['BeerTemp'])
+        self.assertEqual(None, rows[1][1]['BeerTemp'])
+        self.assertEqual(1, rows[0][1]['State'])
+
+
+class MigrateBeerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for day, hours in (('2013-09-27', (0, 1)), ('2013-09-26', (22, 23))):
+            writer = brewpiJson.ChartFileWriter(os.path.join(self.dir, 'beer-%s.json' % day))
+            for hour in hours:
+                d = int(day[-2:])
+                writer.addRow(newRow(d + hour / 100.0), datetime(2013, 9, d, hour, 0, 0))
+            writer.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_migrateJson(self):
+        migrateData.migrateBeer((self.dir, 'beer', False, False))
+        store = brewpiStore.BrewStore(os.path.join(self.dir, 'store'))
+        self.assertEqual([26.22, 26.23, 27.0, 27.01], [row['BeerTemp'] for row in store.rows()])
+        store.close()
+
+    def test_existingStoreIsKept(self):
+        migrateData.migrateBeer((self.dir, 'beer', False, False))
+        result = migrateData.migrateBeer((self.dir, 'beer', False, False))
+        self.assertTrue('skipped' in result)
+        migrateData.migrateBeer((self.dir, 'beer', True, False))
+        store = brewpiStore.BrewStore(os.path.join(self.dir, 'store'))
+        self.assertEqual(4, len(store))
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import time
+import unittest
+
+from brewpiEventLoop import EventLoop
+from brewpiPoller import Poller, parsePolicy
+
+
+class PollerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.loop = EventLoop()
+        self.polls = []
+        self.watched = set()
+
+    def createPoller(self, policies, activeTime=10.0):
+        return Poller(self.loop, self.polls.append, policies, activeTime, lambda request: request in self.watched)
+
+    def runFor(self, seconds):
+        startTime = time.time()
+        while time.time() - startTime < seconds:
+            self.loop.runOnce(0.005)
+
+    def test_pollsAtSlowRateWithoutDemand(self):
+        poller = self.createPoller({'l': (0.01, 0.05), 'v': (0.01, 0)})
+        poller.start()
+        self.runFor(0.12)
+        self.assertTrue(2 <= self.polls.count('l') <= 4)
+        self.assertEqual(0, self.polls.count('v'))  # not polled without demand
+
+    def test_demandPollsRightAwayAndAtFastRate(self):
+        poller = self.createPoller({'l': (0.01, 10)})
+        poller.start()
+        self.runFor(0.02)
+        self.assertEqual(['l'], self.polls)
+        poller.demand('l')
+        self.runFor(0.105)
+        self.assertTrue(8 <= len(self.polls) <= 12)
+
+    def test_returnsToSlowRateWhenDemandEnds(self):
+        poller = self.createPoller({'s': (0.01, 10)}, activeTime=0.03)
+        poller.start()
+        poller.demand('s')
+        self.runFor(0.1)
+        count = len(self.polls)
+        self.runFor(0.05)
+        self.assertEqual(count, len(self.polls))
+
+    def test_watchedRequestsArePolledFast(self):
+        poller = self.createPoller({'t': (0.01, 0)})
+        poller.start()
+        self.runFor(0.02)
+        self.assertEqual([], self.polls)
+        self.watched.add('t')
+        poller.reschedule('t')
+        self.runFor(0.055)
+        self.assertTrue(4 <= len(self.polls) <= 7)
+
+    def test_parsePolicy(self):
+        self.assertEqual((0.5, 10.0), parsePolicy(['0.5', '10'], (1, 1)))
+        self.assertEqual((5.0, 5.0), parsePolicy('5', (1, 1)))
+        self.assertEqual((1, 2), parsePolicy(None, (1, 2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
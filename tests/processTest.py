@@ -0,0 +1,83 @@
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+import BrewPiProcess
+from BrewPiProcess import BrewPiProcess as Process, BrewPiProcesses
+
+
+class ProcessRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.oldRegistryPath = BrewPiProcess.registryPath
+        BrewPiProcess.registryPath = os.path.join(self.tempDir, 'registry')
+        self.processes = []
+
+    def tearDown(self):
+        for process in self.processes:
+            process.unregister()
+        BrewPiProcess.registryPath = self.oldRegistryPath
+        shutil.rmtree(self.tempDir)
+
+    def createProcess(self, name, ports, scriptPath=None):
+        config = {'scriptPath': os.path.join(self.tempDir, scriptPath or name)}
+        process = Process.fromConfig(os.path.join(self.tempDir, name + '.cfg'), config, ports)
+        self.processes.append(process)
+        return process
+
+    def test_conflictsAreFound(self):
+        self.assertTrue(self.createProcess('a', ['/dev/ttyACM0']).register())
+        self.assertFalse(self.createProcess('a', ['/dev/ttyACM1'], 'other').register())  # same config file
+        self.assertFalse(self.createProcess('b', ['/dev/ttyACM1', '/dev/ttyACM0']).register())  # same port
+        self.assertFalse(self.createProcess('c', ['/dev/ttyACM1'], 'a').register())  # same socket
+        self.assertTrue(self.createProcess('d', ['/dev/ttyACM1']).register())
+
+    def test_runningProcessesAreListed(self):
+        first = self.createProcess('a', ['/dev/ttyACM0'])
+        second = self.createProcess('b', ['/dev/ttyACM1', '/dev/ttyACM2'])
+        first.register()
+        second.register()
+        listed = BrewPiProcesses().update()
+        self.assertEqual(sorted([first.as_dict(), second.as_dict()]), sorted(p.as_dict() for p in listed))
+
+        first.unregister()  # the lock file stays, but is not locked anymore
+        self.assertEqual([second.as_dict()], [p.as_dict() for p in BrewPiProcesses().update()])
+        self.assertTrue(self.createProcess('c', ['/dev/ttyACM0']).register())
+
+    def test_symlinkedLockFileIsNotFollowed(self):
+        os.makedirs(BrewPiProcess.registryPath)
+        target = os.path.join(self.tempDir, 'target')
+        open(target, 'w').close()
+        os.symlink(target, BrewPiProcess.lockFileName('port', '/dev/ttyACM0'))
+        self.assertFalse(self.createProcess('a', ['/dev/ttyACM0']).register())
+        self.assertEqual('', open(target).read())
+
+    def test_windowsSkipsRegistration(self):
+        oldFcntl = BrewPiProcess.fcntl
+        BrewPiProcess.fcntl = None
+        try:
+            self.assertTrue(self.createProcess('a', ['/dev/ttyACM0']).register())
+            self.assertTrue(self.createProcess('a', ['/dev/ttyACM0']).register())
+            self.assertEqual([], BrewPiProcesses().update())
+        finally:
+            BrewPiProcess.fcntl = oldFcntl
+
+    def test_quitUsesRegisteredSocket(self):
+        process = self.createProcess('a', ['/dev/ttyACM0'])
+        os.mkdir(os.path.join(self.tempDir, 'a'))
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(process.sock['file'])
+        listener.listen(1)
+        listener.settimeout(1)
+        # the config file of the process does not exist anymore
+        Process.fromInfo(process.as_dict()).quit()
+        conn, address = listener.accept()
+        self.assertEqual('quit', conn.recv(100))
+        conn.close()
+        listener.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+import simplejson as json
+from brewpiRingBuffer import SampleRingBuffer
+from chartFileWriterTest import newRow
+
+
+class SampleRingBufferTestCase(unittest.TestCase):
+    def fill(self, capacity, count):
+        ringBuffer = SampleRingBuffer(capacity)
+        for i in range(count):
+            ringBuffer.append(newRow(18.0 + i), 1000.0 + i)
+        return ringBuffer
+
+    def test_keepsAllSamplesUntilFull(self):
+        ringBuffer = self.fill(5, 3)
+        self.assertEqual(3, len(ringBuffer))
+        self.assertEqual([1000.0, 1001.0, 1002.0], [t for t, row in ringBuffer.rows()])
+
+    def test_oldestSamplesAreOverwritten(self):
+        ringBuffer = self.fill(5, 8)
+        self.assertEqual(5, len(ringBuffer))
+        self.assertEqual([21.0, 22.0, 23.0, 24.0, 25.0], [row['BeerTemp'] for t, row in ringBuffer.rows()])
+
+    def test_since(self):
+        ringBuffer = self.fill(5, 8)
+        self.assertEqual([1006.0, 1007.0], [t for t, row in ringBuffer.rows(1005.0)])
+        self.assertEqual([], list(ringBuffer.rows(1007.0)))
+        self.assertEqual(5, len(list(ringBuffer.rows(0.0))))
+
+    def test_samplesOutOfOrderAreSkipped(self):
+        ringBuffer = self.fill(5, 3)
+        self.assertFalse(ringBuffer.append(newRow(30.0), 1001.5))
+        self.assertTrue(ringBuffer.append(newRow(30.0), 1002.0))
+        self.assertEqual([1002.0, 1002.0], [t for t, row in ringBuffer.rows(1001.0)])
+
+    def test_toJson(self):
+        ringBuffer = self.fill(5, 3)
+        result = json.loads(ringBuffer.toJson(1000.0))
+        self.assertEqual(2, len(result['rows']))
+        self.assertEqual({"v": 19.0}, result['rows'][0]['c'][1])
+        self.assertEqual(1002.0, result['lastTime'])
+        self.assertEqual(1002.0, json.loads(ringBuffer.toJson(1002.0))['lastTime'])
+        self.assertEqual(None, json.loads(SampleRingBuffer(5).toJson())['lastTime'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+from brewpiRollup import RollupEngine
+
+
+def newRow(beerTemp, state):
+    return {"BeerTemp": beerTemp, "BeerSet": 20.0, "FridgeTemp": 18.0, "FridgeSet": 17.0, "RoomTemp": None,
+            "State": state}
+
+
+class RollupEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.start = time.mktime(datetime(2013, 9, 26, 12, 0, 0).timetuple())
+
+    def fill(self, engine):
+        engine.add(newRow(19.0, 0), self.start)
+        engine.add(newRow(21.0, 4), self.start + 30)
+        engine.add(newRow(20.0, 4), self.start + 90)
+        engine.add(newRow(20.0, 0), self.start + 3600)
+
+    def test_minuteAggregates(self):
+        engine = RollupEngine()
+        self.fill(engine)
+        minutes = engine.get('minute')
+        self.assertEqual(3, len(minutes))
+        self.assertEqual({'count': 2, 'min': 19.0, 'max': 21.0, 'mean': 20.0}, minutes[0]['BeerTemp'])
+        self.assertFalse('RoomTemp' in minutes[0])
+
+    def test_hourAggregates(self):
+        engine = RollupEngine()
+        self.fill(engine)
+        hours = engine.get('hour')
+        self.assertEqual([self.start, self.start + 3600], [h['time'] for h in hours])
+        self.assertEqual(3, hours[0]['BeerTemp']['count'])
+        self.assertEqual({'0': 30, '4': 3570}, hours[0]['states'])
+
+    def test_dayAggregates(self):
+        engine = RollupEngine()
+        self.fill(engine)
+        days = engine.get('day', self.start - 86400, self.start)
+        self.assertEqual(1, len(days))
+        self.assertEqual(4, days[0]['FridgeTemp']['count'])
+
+    def test_longGapIsNotCountedForState(self):
+        engine = RollupEngine()
+        engine.add(newRow(19.0, 0), self.start)
+        engine.add(newRow(19.0, 0), self.start + 7200)
+        self.assertEqual({}, engine.get('hour')[0]['states'])
+
+    def test_saveAndLoad(self):
+        directory = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(directory, 'rollup.json')
+            engine = RollupEngine(fileName)
+            self.fill(engine)
+            engine.save()
+            loaded = RollupEngine(fileName)
+            self.assertEqual(engine.get('minute'), loaded.get('minute'))
+            loaded.add(newRow(20.0, 0), self.start + 3630)
+            self.assertEqual({'0': 30}, loaded.get('hour')[1]['states'])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
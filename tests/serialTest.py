@@ -0,0 +1,70 @@
+import select
+import time
+import unittest
+
+import serial
+
+from brewpiSerial import LineFramer, SerialReader
+
+
+class FakeSerial:
+    """
+    Serial port that returns the chunks it is given, like a port with a read timeout
+    """
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def inWaiting(self):
+        return len(self.chunks[0]) if self.chunks and not isinstance(self.chunks[0], Exception) else 0
+
+    def read(self, size=1):
+        if not self.chunks:
+            time.sleep(0.01)  # read timeout
+            return ''
+        if isinstance(self.chunks[0], Exception):
+            raise self.chunks.pop(0)
+        return self.chunks.pop(0)
+
+
+class LineFramerTestCase(unittest.TestCase):
+    def test_linesSplitOverChunks(self):
+        framer = LineFramer()
+        self.assertEqual([], framer.feed('T:{"Beer'))
+        self.assertEqual(['T:{"BeerTemp":20.0}', 'L:["a"]'], framer.feed('Temp":20.0}\r\nL:["a"]\n\nS:'))
+        self.assertEqual(['S:{}'], framer.feed('{}\n'))
+
+
+class SerialReaderTestCase(unittest.TestCase):
+    def receive(self, reader, count):
+        lines = []
+        startTime = time.time()
+        while len(lines) < count and time.time() - startTime < 1:
+            select.select([reader], [], [], 0.1)
+            lines += reader.receivedLines()
+        return lines
+
+    def test_linesAreQueued(self):
+        reader = SerialReader(FakeSerial(['L:["a"]\nS:', '{"mode":"b"}\n', 'T:{}\n']))
+        reader.start()
+        self.assertEqual(['L:["a"]', 'S:{"mode":"b"}', 'T:{}'], self.receive(reader, 3))
+        reader.stop()
+        self.assertFalse(reader.is_alive())
+
+    def test_readErrorIsRaisedInMainThread(self):
+        reader = SerialReader(FakeSerial(['N:{}\n', serial.SerialException("device disconnected")]))
+        reader.start()
+        self.assertRaises(serial.SerialException, self.receive, reader, 2)
+        reader.stop()
+
+    def test_linesBeforeReadErrorAreReturnedFirst(self):
+        reader = SerialReader(FakeSerial(['N:{}\n', 'T:{}\n', serial.SerialException("device disconnected")]))
+        reader.start()
+        reader.join(1)  # the thread stops after the error
+        self.assertEqual(['N:{}', 'T:{}'], reader.receivedLines())
+        self.assertEqual([reader], select.select([reader], [], [], 0)[0])  # the main loop wakes up for the error
+        self.assertRaises(serial.SerialException, reader.receivedLines)
+        reader.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+
+import simplejson as json
+from brewpiEventLoop import EventLoop
+from brewpiSocketServer import SocketServer, RawJson, DeferredReply
+
+
+class SocketServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.socketFile = os.path.join(self.tempDir, 'BEERSOCKET')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.socketFile)
+        self.loop = EventLoop()
+        self.messages = []
+        self.server = SocketServer(self.loop, listener, self.handle, timeout=0.1)
+        self.clients = []
+        self.deferred = []
+
+    def tearDown(self):
+        self.server.closeAll()
+        for client in self.clients:
+            client.close()
+        shutil.rmtree(self.tempDir)
+
+    def handle(self, conn, message):
+        self.messages.append(message)
+        if message == 'big':
+            return 'x' * 1000000
+        elif message == 'getObject':
+            return {'mode': 'b'}
+        elif message == 'getRaw':
+            return RawJson('[1, 2]')
+        elif message == 'wait':
+            reply = DeferredReply()
+            self.deferred.append(reply)
+            return reply
+        elif message != 'silent':
+            return 'reply to ' + message
+
+    def connect(self, message=None):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(self.socketFile)
+        if message is not None:
+            client.sendall(message)
+        self.clients.append(client)
+        return client
+
+    def runUntil(self, condition, seconds=1.0):
+        startTime = time.time()
+        while not condition() and time.time() - startTime < seconds:
+            self.loop.runOnce(0.01)
+
+    def receiveAll(self, client):
+        client.setblocking(0)
+        data = ''
+        while True:
+            self.loop.runOnce(0.01)
+            try:
+                chunk = client.recv(65536)
+            except socket.error:
+                continue
+            if not chunk:
+                return data  # closed by the server
+            data += chunk
+
+    def test_replyIsSentAndConnectionClosed(self):
+        client = self.connect('getMode')
+        self.assertEqual('reply to getMode', self.receiveAll(client))
+        self.assertEqual(['getMode'], self.messages)
+        self.assertEqual([], self.server.connections)
+
+    def test_objectsAreSentAsJson(self):
+        self.assertEqual({'mode': 'b'}, json.loads(self.receiveAll(self.connect('getObject'))))
+        self.assertEqual('[1, 2]', self.receiveAll(self.connect('getRaw')))
+
+    def test_connectionWithoutReplyIsClosed(self):
+        client = self.connect('silent')
+        self.assertEqual('', self.receiveAll(client))
+
+    def test_slowClientDoesNotBlockOthers(self):
+        self.connect('big')  # never reads its reply
+        self.runUntil(lambda: self.messages)
+        client = self.connect('lcd')
+        self.assertEqual('reply to lcd', self.receiveAll(client))
+
+    def test_idleConnectionsAreClosed(self):
+        self.connect()
+        self.runUntil(lambda: self.server.connections)
+        self.assertEqual(1, len(self.server.connections))
+        self.runUntil(lambda: not self.server.connections, 2.0)
+        self.assertEqual([], self.server.connections)
+
+    def receiveLines(self, client, count):
+        client.setblocking(0)
+        data = ''
+        startTime = time.time()
+        while data.count('\n') < count and time.time() - startTime < 1:
+            self.loop.runOnce(0.01)
+            try:
+                data += client.recv(65536)
+            except socket.error:
+                pass
+        return [json.loads(line) for line in data.splitlines()]
+
+    def test_sessionHandlesPipelinedRequests(self):
+        client = self.connect('{"id": 1, "cmd": "getMode"}\n{"id": 2, "cmd": "setBeer", "value": 20.5}\n'
+                              '{"id": 3, "cmd": "setParameters", "value": {"Kp": 5}}\n{"id": 4, "cmd": "getRaw"}\n'
+                              '{"id": 5, "cmd": "sil')
+        self.assertEqual([{'id': 1, 'result': 'reply to getMode'}, {'id': 2, 'result': 'reply to setBeer=20.5'},
+                          {'id': 3, 'result': 'reply to setParameters={"Kp": 5}'}, {'id': 4, 'result': [1, 2]}],
+                         self.receiveLines(client, 4))
+        client.sendall('ent"}\nnot json\n{"id": 6}\n')
+        self.assertEqual([{'id': 5, 'result': None}, {'id': None, 'error': 'Invalid JSON'},
+                          {'id': None, 'error': 'Request needs a cmd'}], self.receiveLines(client, 3))
+        self.assertEqual(1, len(self.server.connections))  # the session stays open
+
+    def test_requestsCanNameAChamber(self):
+        client = self.connect('{"id": 1, "chamber": "fridge2", "cmd": "setBeer", "value": 20}\n')
+        self.assertEqual([{'id': 1, 'result': 'reply to fridge2/setBeer=20'}], self.receiveLines(client, 1))
+
+    def test_deferredReplies(self):
+        client = self.connect('wait')
+        self.runUntil(lambda: self.deferred)
+        self.deferred[0].resolve({'status': 0})
+        self.assertEqual({'status': 0}, json.loads(self.receiveAll(client)))
+
+        session = self.connect('{"id": 1, "cmd": "wait"}\n{"id": 2, "cmd": "getMode"}\n')
+        self.assertEqual([{'id': 2, 'result': 'reply to getMode'}], self.receiveLines(session, 1))
+        self.deferred[1].resolve('done')
+        self.assertEqual([{'id': 1, 'result': 'done'}], self.receiveLines(session, 1))
+
+    def test_connectionWaitingForDeferredReplyIsNotIdle(self):
+        client = self.connect('wait')
+        self.runUntil(lambda: False, 1.5)  # longer than the timeout and the interval of the idle check
+        self.assertEqual(1, len(self.server.connections))
+        self.deferred[0].resolve('confirmed')
+        self.assertEqual('confirmed', self.receiveAll(client))
+
+    def test_publishedMessagesArePushedToSubscribers(self):
+        subscriber = self.connect('{"id": 1, "cmd": "getMode"}\n')
+        other = self.connect('{"id": 1, "cmd": "getMode"}\n')
+        self.receiveLines(subscriber, 1)
+        self.receiveLines(other, 1)
+        self.server.connections[0].subscribe(['lcd'])
+        self.assertTrue(self.server.subscribed('lcd'))
+        self.assertFalse(self.server.subscribed('temps'))
+
+        self.server.publish('lcd', ['line 1', 'line 2'])
+        self.server.publish('temps', {'BeerTemp': 20.0})
+        self.assertEqual([{'topic': 'lcd', 'data': ['line 1', 'line 2']}], self.receiveLines(subscriber, 1))
+        self.assertEqual([], self.receiveLines(other, 1))
+
+        self.server.connections[0].unsubscribe()
+        self.server.publish('lcd', ['line 3'])
+        self.assertEqual([], self.receiveLines(subscriber, 1))
+
+    def test_subscriberThatDoesNotReadIsClosed(self):
+        self.connect('{"id": 1, "cmd": "getMode"}\n')
+        self.runUntil(lambda: self.server.connections and self.server.connections[0].session)
+        self.server.connections[0].subscribe(['lcd'])
+        line = 'x' * 100000
+        for i in range(100):
+            self.server.publish('lcd', line)
+            self.loop.runOnce(0)
+        self.assertEqual([], self.server.connections)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from brewpiState import StateVersions, ResponseCache
+
+
+class StateVersionsTestCase(unittest.TestCase):
+    def test_changesIncreaseVersion(self):
+        versions = StateVersions(['lcd', 'cs'], start=10)
+        self.assertEqual(10, versions.version)
+        versions.changed('lcd')
+        versions.changed('cs')
+        self.assertEqual(12, versions.version)
+        self.assertEqual({'lcd': 11, 'cs': 12}, versions.versions)
+
+    def test_updateOnlyCountsChangedValues(self):
+        versions = StateVersions(['cs'], start=0)
+        self.assertFalse(versions.update('cs', {'mode': 'b'}, {'mode': 'b'}))
+        self.assertEqual(0, versions.version)
+        self.assertTrue(versions.update('cs', {'mode': 'b'}, {'mode': 'f'}))
+        self.assertEqual(1, versions.versions['cs'])
+
+    def test_changedSince(self):
+        versions = StateVersions(['lcd', 'cs', 'cc'], start=0)
+        versions.changed('lcd')
+        since = versions.version
+        versions.changed('cs')
+        self.assertEqual(['cs'], versions.changedSince(since))
+        self.assertEqual([], versions.changedSince(since, ['lcd', 'cc']))
+        self.assertEqual(['lcd', 'cc'], versions.changedSince(None, ['lcd', 'cc']))
+
+    def test_startsAfterEarlierRuns(self):
+        # versions of a restarted script are higher than those of the previous run, so clients see the changes
+        self.assertTrue(StateVersions(['lcd']).version > StateVersions(['lcd'], start=0).version + 1000000)
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def test_encodesOncePerVersion(self):
+        versions = StateVersions(['cs'], start=0)
+        cs = {'mode': 'b'}
+        encoded = []
+
+        def encode(value):
+            encoded.append(value)
+            return '{"mode": "%s"}' % value['mode']
+
+        cache = ResponseCache(versions, {'cs': lambda: cs}, encode)
+        self.assertEqual('{"mode": "b"}', cache.get('cs'))
+        self.assertEqual('{"mode": "b"}', cache.get('cs'))
+        self.assertEqual(1, len(encoded))
+
+        cs['mode'] = 'f'
+        versions.changed('cs')
+        self.assertEqual('{"mode": "f"}', cache.get('cs'))
+        self.assertEqual(2, len(encoded))
+
+
+if __name__ == '__main__':
+    unittest.main()
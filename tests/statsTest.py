@@ -0,0 +1,82 @@
+import time
+import unittest
+
+from brewpiStats import Histogram, LoopStats, SerialStats
+
+
+class HistogramTestCase(unittest.TestCase):
+    def test_percentilesAreBucketBounds(self):
+        histogram = Histogram()
+        for i in range(90):
+            histogram.add(0.001)
+        for i in range(10):
+            histogram.add(0.5)
+        self.assertEqual(100, histogram.count)
+        self.assertTrue(0.001 <= histogram.percentile(0.5) < 0.002)
+        self.assertTrue(0.001 <= histogram.percentile(0.9) < 0.002)
+        self.assertEqual(0.5, histogram.percentile(0.99))  # capped at the maximum
+        self.assertEqual({'count': 100, 'mean': 50.9, 'max': 500.0}, dict((key, value) for key, value in
+                                                                          histogram.asDict().items()
+                                                                          if key in ('count', 'mean', 'max')))
+
+    def test_durationsAboveTheLastBucketAreCounted(self):
+        histogram = Histogram()
+        histogram.add(1000.0)
+        self.assertEqual(1000.0, histogram.percentile(0.5))
+        self.assertEqual({'count': 0}, Histogram().asDict())
+
+
+class LoopStatsTestCase(unittest.TestCase):
+    def test_stagesAreTimed(self):
+        stats = LoopStats()
+        with stats.stage('serialRead'):
+            pass
+        timedSum = stats.timed('dispatch', lambda a, b: a + b)
+        self.assertEqual(3, timedSum(1, 2))
+        self.assertRaises(TypeError, timedSum, 1, None)
+        stats.add('wait', 0.25)
+        self.assertEqual(['serialRead', 'dispatch', 'wait'], stats.asDict()['stages'].keys())
+        self.assertEqual(2, stats.asDict()['stages']['dispatch']['count'])  # also counted when it raised
+        self.assertTrue('wait n=1 p50=250.00 p99=250.00 max=250.00' in stats.summary())
+
+        stats.reset()
+        self.assertEqual(0, stats.histograms['wait'].count)
+        self.assertEqual('', stats.summary())
+
+
+class SerialStatsTestCase(unittest.TestCase):
+    def test_linesAndBytesAreCountedPerType(self):
+        stats = SerialStats()
+        stats.written('t')
+        stats.written('j{beerSet:20}')
+        stats.received('T:{"BeerTemp":20.0}')
+        stats.received('L:["a","b","c","d"]')
+        stats.received('L:["a","b","c","e"]')
+        result = stats.asDict()
+        self.assertEqual(14, result['bytesWritten'])
+        self.assertEqual(['L', 'T'], result['lines'].keys())
+        self.assertEqual(2, result['lines']['L']['lines'])
+        self.assertEqual(2 * 20, result['lines']['L']['bytes'])
+        self.assertEqual(1, result['latency']['t']['count'])
+        self.assertEqual({'count': 0}, result['latency']['l'])  # no request was sent for these lines
+
+    def test_repliesAreMatchedToWaitingRequests(self):
+        stats = SerialStats(replyTimeout=0.05, maxWaiting=2)
+        stats.written('s')
+        time.sleep(0.06)
+        stats.written('s')
+        stats.received('S:{"mode":"b"}')
+        self.assertEqual({'s': 1}, stats.asDict()['unanswered'])
+        self.assertTrue(stats.latency['s'].max < 0.05)  # matched to the second request
+
+        for i in range(3):
+            stats.written('v')
+        self.assertEqual({'s': 1, 'v': 1}, stats.asDict()['unanswered'])
+
+        stats.reset()
+        self.assertEqual({}, stats.asDict()['unanswered'])
+        self.assertEqual(0, stats.asDict()['bytesWritten'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from brewpiEventLoop import EventLoop
+from brewpiSupervisor import Supervisor, Worker, createWorkers, layoutErrors
+
+runForever = [sys.executable, '-c', 'import time; time.sleep(30)']
+crash = [sys.executable, '-c', 'import sys; sys.exit(3)']
+
+
+class SupervisorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.loop = EventLoop()
+        self.supervisor = None
+
+    def tearDown(self):
+        if self.supervisor is not None:
+            self.supervisor.shutdown()
+        shutil.rmtree(self.tempDir)
+
+    def createSupervisor(self, *workers):
+        self.supervisor = Supervisor(self.loop, workers, minRestartDelay=0.02, maxRestartDelay=0.1, stopTimeout=1.0)
+        self.supervisor.start()
+        return self.supervisor
+
+    def runUntil(self, condition, seconds=2.0):
+        startTime = time.time()
+        while not condition() and time.time() - startTime < seconds:
+            self.loop.runOnce(0.01)
+
+    def test_crashedWorkerIsRestartedWithBackoff(self):
+        worker = Worker('fridge1', crash)
+        self.createSupervisor(worker)
+        self.runUntil(lambda: worker.restarts >= 4)
+        self.assertEqual(3, worker.exitCode)
+        self.assertTrue(worker.restarts >= 4)
+        self.assertEqual(0.1, worker.restartDelay)  # doubled up to maxRestartDelay
+
+    def test_workerIsStoppedAndStartedWithDontRunFile(self):
+        dontRunFile = os.path.join(self.tempDir, 'do_not_run_brewpi')
+        worker = Worker('fridge1', runForever, dontRunFile)
+        self.createSupervisor(worker)
+        self.assertTrue(worker.process is not None)
+        open(dontRunFile, 'w').close()
+        self.supervisor.checkDontRun()
+        self.runUntil(lambda: worker.process is None)
+        self.assertEqual(None, worker.process)
+        self.assertEqual(0, worker.restarts)
+
+        os.remove(dontRunFile)
+        self.supervisor.checkDontRun()
+        self.assertTrue(worker.process is not None)
+
+    def test_controlMessages(self):
+        dontRunFile = os.path.join(self.tempDir, 'do_not_run_brewpi')
+        fridge1 = Worker('fridge1', runForever, dontRunFile)
+        fridge2 = Worker('fridge2', runForever)
+        self.createSupervisor(fridge1, fridge2)
+        self.assertEqual(['fridge1', 'fridge2'], self.supervisor.handleMessage(None, 'status').keys())
+
+        self.assertEqual(0, self.supervisor.handleMessage(None, 'stop=fridge1')['status'])
+        self.assertTrue(os.path.exists(dontRunFile))
+        self.runUntil(lambda: fridge1.process is None)
+        self.assertEqual({'running': False, 'pid': None, 'uptime': None, 'restarts': 0, 'exitCode': fridge1.exitCode,
+                          'dontRun': True}, self.supervisor.handleMessage(None, 'status=fridge1')['fridge1'])
+        self.assertTrue(fridge2.process is not None)
+
+        self.supervisor.handleMessage(None, 'start=fridge1')
+        self.assertFalse(os.path.exists(dontRunFile))
+        self.assertTrue(fridge1.process is not None)
+
+        pid = fridge2.process.pid
+        self.supervisor.handleMessage(None, 'restart=fridge2')
+        self.runUntil(lambda: fridge2.process is not None and fridge2.process.pid != pid)
+        self.assertNotEqual(pid, fridge2.process.pid)
+        self.assertEqual(1, self.supervisor.handleMessage(None, 'start=fridge3')['status'])
+
+    def test_shutdownStopsAllWorkers(self):
+        workers = [Worker('fridge1', runForever), Worker('fridge2', runForever)]
+        self.createSupervisor(*workers)
+        processes = [worker.process for worker in workers]
+        self.supervisor.shutdown()
+        self.assertEqual([None, None], [worker.process for worker in workers])
+        self.assertTrue(all(process.returncode is not None for process in processes))
+
+
+class LayoutTestCase(unittest.TestCase):
+    def chamberConfig(self, name, scriptPath, wwwPath, port, **settings):
+        config = {'scriptPath': scriptPath, 'wwwPath': wwwPath, 'port': port}
+        config.update(settings)
+        return name, '/home/brewpi/settings/%s.cfg' % name, config
+
+    def test_separateChambersAreAccepted(self):
+        workerConfigs = [self.chamberConfig('fridge1', '/home/brewpi/fridge1', '/var/www/fridge1', '/dev/ttyACM0'),
+                         self.chamberConfig('fridge2', '/home/brewpi/fridge2', '/var/www/fridge2', '/dev/ttyACM1')]
+        self.assertEqual([], layoutErrors(workerConfigs))
+        workers = createWorkers(workerConfigs)
+        self.assertEqual(['--config', '/home/brewpi/settings/fridge2.cfg'], workers[1].command[-2:])
+        self.assertEqual('/var/www/fridge2/do_not_run_brewpi', workers[1].dontRunFile)
+
+    def test_sharedSettingsAreFound(self):
+        workerConfigs = [self.chamberConfig('fridge1', '/home/brewpi/', '/var/www', '/dev/ttyACM0',
+                                            useInternetSocket=True),
+                         self.chamberConfig('fridge2', '/home/brewpi', '/var/www/fridge2', '/dev/ttyACM0',
+                                            useInternetSocket=True)]
+        self.assertEqual(["Chambers 'fridge1' and 'fridge2' have the same scriptPath /home/brewpi",
+                          "Chambers 'fridge1' and 'fridge2' have the same port /dev/ttyACM0",
+                          "Chambers 'fridge1' and 'fridge2' have the same socket localhost:6332"],
+                         layoutErrors(workerConfigs))
+
+
+if __name__ == '__main__':
+    unittest.main()
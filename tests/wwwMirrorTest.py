@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import brewpiJson
+import brewpiMirror
+from chartFileWriterTest import newRow
+
+
+class WwwMirrorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.srcFileName = os.path.join(self.dir, 'src.json')
+        self.wwwFileName = os.path.join(self.dir, 'www.json')
+        brewpiJson.newEmptyFile(self.srcFileName)
+        self.writer = brewpiJson.ChartFileWriter(self.srcFileName)
+
+    def tearDown(self):
+        self.writer.close()
+        shutil.rmtree(self.dir)
+
+    def assertMirrored(self):
+        with open(self.srcFileName, 'rb') as src:
+            with open(self.wwwFileName, 'rb') as www:
+                self.assertEqual(src.read(), www.read())
+
+    def addRows(self, mirror, count):
+        for i in range(count):
+            offset, data = self.writer.addRow(newRow(19.0 + i))
+            mirror.write(offset, data)
+            mirror.publish()
+            self.assertMirrored()
+
+    def test_publishedFileFollowsSource(self):
+        mirror = brewpiMirror.WwwMirror(self.srcFileName, self.wwwFileName)
+        self.assertMirrored()
+        self.addRows(mirror, 5)
+        mirror.close()
+
+    def test_publishReplacesFileInsteadOfWritingIt(self):
+        mirror = brewpiMirror.WwwMirror(self.srcFileName, self.wwwFileName)
+        publishedBefore = os.stat(self.wwwFileName).st_ino
+        self.addRows(mirror, 1)
+        self.assertNotEqual(publishedBefore, os.stat(self.wwwFileName).st_ino)
+        mirror.close()
+
+    def test_closeRemovesBuffers(self):
+        mirror = brewpiMirror.WwwMirror(self.srcFileName, self.wwwFileName)
+        self.addRows(mirror, 2)
+        mirror.close()
+        self.assertMirrored()
+        self.assertEqual(['src.json', 'www.json'], sorted(os.listdir(self.dir)))
+
+    def test_copiesWithoutLinks(self):
+        mirror = brewpiMirror.WwwMirror(self.srcFileName, self.wwwFileName)
+        mirror.useLinks = False
+        mirror.removeBuffers()
+        self.addRows(mirror, 3)
+        mirror.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -89,7 +89,7 @@ rm /tmp/oldcron||warn
 #   scriptpath="/home/brewpi"
 #   entries="brewpi wifichecker"
 #   # entry:brewpi
-#   * * * * * brewpi python $scriptpath/brewpi.py --checkstartuponly --dontrunfile; [ $? != 0 ] && python -u $scriptpath/brewpi.py 1>$stdoutpath 2>>$stderrpath &
+#   * * * * * brewpi flock -n $scriptpath/settings/config.cfg.supervisor.lock true && python -u $scriptpath/brewpiSupervisor.py --log 2>>$stderrpath &
 #   # entry:wifichecker
 #   */10 * * * * $scriptpath/util/wifiChecker.sh 1>$stdoutpath 2>>$stderrpath &
 #
@@ -100,7 +100,11 @@ cronfile="/etc/cron.d/brewpi"
 # make sure it exists
 sudo touch "$cronfile"
 
-brewpicron='* * * * * brewpi python $scriptpath/brewpi.py --checkstartuponly --dontrunfile; [ $? != 0 ] && python -u $scriptpath/brewpi.py 1>$stdoutpath 2>>$stderrpath &'
+# The supervisor keeps brewpi.py running and restarts it when it exits. The running supervisor holds a lock on
+# settings/config.cfg.supervisor.lock, flock -n checks it without starting Python, so cron only starts the supervisor
+# when it is not running. With --log, brewpi.py writes its output to logs/stdout.txt itself and starts a new file each
+# time it is (re)started.
+brewpicron='* * * * * brewpi flock -n $scriptpath/settings/config.cfg.supervisor.lock true && python -u $scriptpath/brewpiSupervisor.py --log 2>>$stderrpath &'
 wificheckcron='*/10 * * * * root $scriptpath/utils/wifiChecker.sh 1>>$stdoutpath 2>>$stderrpath &'
 
 # get variables from old cron job. First grep gets the line, second one the sting, tr removes the quotes.